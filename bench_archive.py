@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: one file per page vs response_archive.
+
+    python bench_archive.py [response_dir ...] [--codec gzip|zstd]
+
+Recorded `resp_*.json` pages (or a synthetic page set, see bench_extract.py)
+are saved once as `resp_*.json` files, the way CDPResponseSaver used to, and
+once appended to a ResponseArchive. Reported per page: the time the capture
+path spends saving it (median and p99), and the file count and bytes on
+disk afterwards, with the archive sealed.
+"""
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from bench_decode import load_bodies
+from bench_extract import synthetic_page
+from response_archive import ArchiveReader, ResponseArchive, _disk_usage
+
+WINDOW_PAGES = 40  # pages per window directory
+
+
+def save_files(root: Path, bodies):
+    times = []
+    for i, body in enumerate(bodies):
+        start = time.perf_counter()
+        out_dir = root / "user" / f"window-{i // WINDOW_PAGES}"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with open(out_dir / f"resp_{i}.json", "wb") as f:
+            f.write(body)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def save_archive(root: Path, bodies, codec):
+    archive = ResponseArchive(root, codec=codec)
+    times = []
+    for i, body in enumerate(bodies):
+        start = time.perf_counter()
+        archive.append("user", f"window-{i // WINDOW_PAGES}", f"resp_{i}", body)
+        times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    archive.close()
+    return times, time.perf_counter() - start
+
+
+def report(name, times, root):
+    times = sorted(times)
+    files, size = _disk_usage(root)
+    print(f"  {name:<8} median {statistics.median(times) * 1e6:8.1f} µs  "
+          f"p99 {times[int(len(times) * 0.99)] * 1e6:8.1f} µs  {files:6d} files  {size / 1e6:8.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dirs", nargs="*")
+    parser.add_argument("--pages", type=int, default=1000, help="synthetic pages when no dirs are given")
+    parser.add_argument("--codec", choices=["gzip", "zstd"])
+    args = parser.parse_args()
+
+    bodies = load_bodies(args.dirs) if args.dirs else [json.dumps(synthetic_page(i)).encode() for i in range(args.pages)]
+    if not bodies:
+        raise SystemExit("no bodies found")
+    print(f"{len(bodies)} pages ({'recorded' if args.dirs else 'synthetic'}), "
+          f"{sum(map(len, bodies)) / len(bodies) / 1e3:.1f} kB on average")
+
+    with tempfile.TemporaryDirectory(dir=".") as tmp:
+        files_root, archive_root = Path(tmp) / "files", Path(tmp) / "archive"
+        report("files", save_files(files_root, bodies), files_root)
+        times, seal = save_archive(archive_root, bodies, args.codec)
+        report("archive", times, archive_root)
+        print(f"  sealing the last segment on close: {seal:.2f}s (earlier ones on a background thread)")
+
+        reader = ArchiveReader(archive_root)
+        keys = reader.keys()
+        start = time.perf_counter()
+        for key in keys:
+            reader.get(*key)
+        print(f"  random read: {(time.perf_counter() - start) / len(keys) * 1e6:.1f} µs/page")
+
+
+if __name__ == "__main__":
+    main()
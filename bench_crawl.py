@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+End-to-end crawl benchmark against fake_driver: no browser, no network.
+
+    python bench_crawl.py [--days 7] [--tweets-per-day 300] [--latency 0.05]
+                          [--requests-per-window 40] [--recorded tweet_responses]
+                          [--media-per-page 20 [--lean]] [--dom-cost 0.0002 [--no-prune]]
+                          [--parallel 2] [--tabs 4] [--capture-mode async] [--hosts 2]
+                          [--quiet-users 200 [--quiet-tweets-per-day 2] [--batch]]
+                          [--memory] [--json run.json] [--compare baseline.json]
+
+Stages, run in a temporary working directory:
+
+- crawl:   uc_cdp_listener_with_rotation.run_with_rotation for every user,
+           rotating over --profiles fake profiles (CAPTURE_MODE = "poll", or
+           "async" over the fake DevTools websockets with --capture-mode
+           async); with --parallel N and/or --tabs N the ParallelCrawler
+           instead, N browsers with N tabs each; --hosts N runs N of those
+           crawlers at once on one job queue (JOB_QUEUE), as separate hosts would;
+           --quiet-users adds a long tail of accounts that post
+           --quiet-tweets-per-day, and --batch packs them into multi-account
+           searches (BATCH_QUERIES) sized by their known volumes
+- mining:  tweet_mining.scrape_with_driver sessions with max_id resume after
+           a rate limit, the way its main loop runs them
+- decode, extract, archive: the per-page work of the capture pipeline, on
+           the pages the crawl stage captured
+
+Reported per stage: wall time, pages, tweets (crawl: timeline tweets;
+others: tweet objects, quoted and retweeted ones included), tweets/sec,
+per-page latency
+(crawl: loadingFinished -> page saved; mining: loadingFinished -> body
+read; others: the step itself) and, with --memory, the tracemalloc peak
+(which slows everything down, so compare throughput without it). --json
+saves the results; --compare exits with status 1 if a stage's tweets/sec is
+more than --tolerance below a saved run. With --media-per-page the fake pages
+also load images, videos and fonts; --lean blocks them the way lean browser
+mode does (the site stats show the bytes each stage downloaded). --dom-cost
+makes every tweet rendered in a tab slow the next page down; "drift" is the
+median scroll -> page latency of the last quarter of each browser's pages
+over the first quarter, which DOM pruning (off with --no-prune) and tab
+recycling (--heap-limit-mb) should keep near 1.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from fake_driver import FakeX, RecordedTimeline, SyntheticTimeline
+from id_index import TweetIdIndex
+from job_queue import JobQueue
+from lean_browser import block_heavy_resources
+from rate_budget import RateBudget
+
+USERS = ["bench_user_a", "bench_user_b"]
+
+
+class Stage:
+    def __init__(self, name: str, memory: bool):
+        self.name = name
+        self.memory = memory
+        self.pages = 0
+        self.tweets = 0
+        self.latencies = []
+        self.page_lags = []  # per browser: scroll -> page latencies in order
+        self.seconds = 0.0
+        self.peak = None
+
+    def __enter__(self):
+        if self.memory:
+            tracemalloc.start()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+        if self.memory:
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return False
+
+    def result(self) -> dict:
+        lat = sorted(self.latencies)
+        return {
+            "seconds": round(self.seconds, 3),
+            "pages": self.pages,
+            "tweets": self.tweets,
+            "tweets_per_sec": round(self.tweets / self.seconds, 1) if self.seconds else 0.0,
+            "p50_ms": round(lat[len(lat) // 2] * 1e3, 2) if lat else None,
+            "p95_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1e3, 2) if lat else None,
+            "peak_mb": round(self.peak / 1e6, 1) if self.peak is not None else None,
+            "drift": _drift(self.page_lags),
+        }
+
+
+def _drift(sequences):
+    early, late = [], []
+    for lags in sequences:
+        if len(lags) >= 8:
+            q = len(lags) // 4
+            early += lags[:q]
+            late += lags[-q:]
+    if not early:
+        return None
+    return round(statistics.median(late) / statistics.median(early), 2)
+
+
+def make_site(args, devtools: bool = False) -> FakeX:
+    rates = dict.fromkeys(quiet_users(args), args.quiet_tweets_per_day)
+    rates["default"] = args.tweets_per_day
+    timeline = RecordedTimeline(args.recorded) if args.recorded else SyntheticTimeline(rates)
+    return FakeX(timeline, latency=args.latency, jitter=args.jitter,
+                 requests_per_window=args.requests_per_window, rate_limit_reset=args.rate_limit_reset,
+                 rate_limit_headers=not args.hidden_rate_limit, media_per_page=args.media_per_page,
+                 dom_cost=args.dom_cost, devtools=devtools, performance_log=not devtools)
+
+
+def quiet_users(args) -> list:
+    return [f"quiet_user_{i}" for i in range(args.quiet_users)]
+
+
+def _quiet(verbose: bool):
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+
+# -------------------- Stages -------------------- #
+def crawl_stage(args, users, stage: Stage):
+    try:
+        import uc_cdp_listener_with_rotation as crawler
+    except ImportError as e:
+        print(f"  crawl: skipped ({e})")
+        return None
+    if not args.verbose:
+        logging.getLogger("tweet_crawler").setLevel(logging.WARNING)
+    site = make_site(args, devtools=args.capture_mode == "async")
+    crawler.CAPTURE_MODE = args.capture_mode
+    crawler.POLL_INTERVAL = args.poll_interval
+    crawler.SINCE_DATE, crawler.UNTIL_DATE = args.since, args.until
+    crawler.SCROLL_TIMEOUT, crawler.SCROLL_NUDGE = 2 + args.latency * 4, 0.2
+    crawler.FIRST_PAGE_TIMEOUT = 5 + args.latency * 4
+    crawler.ROTATE_DELAY = 0
+    crawler.ARCHIVE_DIR = Path("response_archive")  # the per-page stages read the crawl from it
+    crawler.ID_INDEX_DIR = Path("tweet_id_index")
+    crawler.LEAN_BROWSER = args.lean
+    crawler.DOM_PRUNE_EVERY = 0 if args.no_prune else crawler.DOM_PRUNE_EVERY
+    crawler.MEMORY_HEAP_LIMIT_MB = args.heap_limit_mb
+    drivers = []
+
+    def start_chrome(profile_dir, mode=None):
+        driver = site.launch(profile_dir)
+        drivers.append(driver)
+        if args.lean:
+            block_heavy_resources(driver)
+        return driver
+
+    crawler.start_chrome = start_chrome
+
+    savers = []
+    capture_window = crawler.capture_window
+
+    def recording_capture_window(*a, **kw):
+        status, saver = capture_window(*a, **kw)
+        savers.append(saver)
+        return status, saver
+
+    crawler.capture_window = recording_capture_window
+    crawler.TABS_PER_PROFILE = args.tabs
+    with stage:
+        if args.hosts:
+            hosts = [threading.Thread(target=crawler.ParallelCrawler(
+                         args.profiles, users, args.parallel or 1,
+                         jobs=JobQueue("crawl_jobs.sqlite", owner=f"bench-host-{i}")).run)
+                     for i in range(args.hosts)]
+            for host in hosts:
+                host.start()
+            for host in hosts:
+                host.join()
+            print(f"  crawl jobs: {JobQueue('crawl_jobs.sqlite').progress(users)}")
+        elif args.parallel or args.tabs > 1:
+            crawler.ParallelCrawler(args.profiles, users, args.parallel or 1).run()
+        else:
+            if args.batch:
+                crawler.ACCOUNT_TWEETS_PER_DAY = {u: args.quiet_tweets_per_day for u in quiet_users(args)}
+                crawler.ACCOUNT_TWEETS_PER_DAY.update(dict.fromkeys(USERS, args.tweets_per_day))
+                users = crawler.plan_batches(users)
+            for user in users:
+                crawler.run_with_rotation(args.profiles, user)
+        crawler.close_archive()
+        stage.pages = sum(s.content_pages for s in savers)
+        stage.tweets = sum(s.tweets_seen for s in savers)
+        stage.latencies = [lat for s in savers for lat in s.capture_latencies]
+        stage.page_lags = [d.page_lags for d in drivers]
+    return site
+
+
+def mining_stage(args, users, stage: Stage):
+    workdir = Path("mining")
+    workdir.mkdir()
+    os.chdir(workdir)
+    try:
+        try:
+            import tweet_mining
+        except ImportError as e:
+            print(f"  mining: skipped ({e})")
+            return None
+        site = make_site(args)
+        tweet_mining.LEAN_BROWSER = args.lean
+        tweet_mining.DOM_PRUNE_EVERY = 0 if args.no_prune else tweet_mining.DOM_PRUNE_EVERY
+        tweet_mining.MEMORY_HEAP_LIMIT_MB = args.heap_limit_mb
+        tweet_mining.SCROLL_TIMEOUT_SEC, tweet_mining.SCROLL_NUDGE_SEC = 2 + args.latency * 4, 0.2
+        tweet_mining.FIRST_PAGE_TIMEOUT_SEC = 5 + args.latency * 4
+        tweet_mining.since_date, tweet_mining.until_date = args.since, args.until
+        budget = RateBudget("rate_budget.json", reserve=tweet_mining.RATE_LIMIT_RESERVE)
+        seen_ids = TweetIdIndex("tweet_id_index")
+        drivers = []
+        with stage, _quiet(args.verbose):
+            for user in users:
+                tweet_mining.username = user
+                profile_idx, resume_max_id = budget.next_profile(args.profiles, len(args.profiles) - 1), None
+                while True:
+                    profile_dir = args.profiles[profile_idx]
+                    budget.wait_until_ready(profile_dir)
+                    driver = site.launch(profile_dir)
+                    drivers.append(driver)
+                    watchdog = tweet_mining.make_watchdog(driver, profile_dir)
+                    url = tweet_mining.build_search_url(args.until, resume_max_id)
+                    blocked, objs, oldest_id = tweet_mining.scrape_with_driver(driver, url, seen_ids, budget,
+                                                                               profile_dir, watchdog)
+                    driver.quit()
+                    seen_ids.add_many(tweet_mining.tweet_id(t) for t in objs)
+                    stage.tweets += len(objs)
+                    if not blocked and watchdog.needs_recycle and oldest_id:
+                        resume_max_id = oldest_id - 1  # fresh browser, same profile
+                        continue
+                    if not blocked:
+                        break
+                    if not budget.ready_at(profile_dir):
+                        budget.update(profile_dir, 429, {})
+                    if oldest_id:
+                        resume_max_id = oldest_id - 1
+                    profile_idx = budget.next_profile(args.profiles, profile_idx)
+            stage.pages = sum(d.stats["body_reads"] for d in drivers)
+            stage.latencies = [lag for d in drivers for lag in d.fetch_lags]
+            stage.page_lags = [d.page_lags for d in drivers]
+        seen_ids.close()
+        return site
+    finally:
+        os.chdir("..")
+
+
+def load_pages(args):
+    """Pages for the per-page stages: the crawl's archive, --recorded, or nothing."""
+    from response_archive import ArchiveReader, is_archive
+    source = Path("response_archive") if is_archive("response_archive") else args.recorded
+    if source is None:
+        return []
+    if is_archive(source):
+        reader = ArchiveReader(source)
+        return [reader.get(*k) for k in reader.keys()]
+    return [p.read_bytes() for p in sorted(Path(source).rglob("resp_*.json"))]
+
+
+def page_stages(pages, memory: bool):
+    import body_decode
+    from response_archive import ResponseArchive
+    from timeline import TweetExtractor
+
+    decoded = []
+    with Stage("decode", memory) as decode:
+        for body in pages:
+            start = time.perf_counter()
+            decoded.append(body_decode.decode_bytes(body))
+            decode.latencies.append(time.perf_counter() - start)
+
+    with Stage("extract", memory) as extract:
+        extractor = TweetExtractor()
+        for page in decoded:
+            start = time.perf_counter()
+            extract.tweets += len(extractor.extract(page.data)) if page.ok else 0
+            extract.latencies.append(time.perf_counter() - start)
+
+    with Stage("archive", memory) as archive_stage:
+        archive = ResponseArchive(Path("bench_archive"))
+        for i, body in enumerate(pages):
+            start = time.perf_counter()
+            archive.append("bench", "window", f"resp_{i}", body)
+            archive_stage.latencies.append(time.perf_counter() - start)
+        archive.close()
+
+    for stage in (decode, extract, archive_stage):
+        stage.pages, stage.tweets = len(pages), extract.tweets
+    return [decode, extract, archive_stage]
+
+
+# -------------------- Report -------------------- #
+def print_table(results: dict):
+    print(f"  {'stage':<8} {'seconds':>8} {'pages':>6} {'tweets':>7} {'tweets/s':>10} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'peak MB':>8} {'drift':>6}")
+    for name, r in results.items():
+        print(f"  {name:<8} {r['seconds']:8.2f} {r['pages']:6d} {r['tweets']:7d} {r['tweets_per_sec']:10.1f} "
+              f"{_fmt(r['p50_ms']):>8} {_fmt(r['p95_ms']):>8} {_fmt(r['peak_mb']):>8} {_fmt(r.get('drift')):>6}")
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def compare(results: dict, baseline_path, tolerance: float) -> bool:
+    """True if no stage's tweets/sec dropped more than `tolerance` below the baseline."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["stages"]
+    ok = True
+    for name, r in results.items():
+        base = baseline.get(name, {}).get("tweets_per_sec")
+        if not base:
+            continue
+        change = r["tweets_per_sec"] / base - 1
+        flag = "REGRESSION" if change < -tolerance else "ok"
+        ok &= flag == "ok"
+        print(f"  {name:<8} {base:10.1f} -> {r['tweets_per_sec']:10.1f} tweets/s ({change:+.0%}) {flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", default="2025-10-01")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--users", type=int, default=1, help=f"up to {len(USERS)}")
+    parser.add_argument("--profiles", type=int, default=3)
+    parser.add_argument("--tweets-per-day", type=int, default=300)
+    parser.add_argument("--recorded", help="serve recorded pages (tweet_responses dir or response archive) instead")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before a requested page arrives")
+    parser.add_argument("--jitter", type=float, default=0.02, help="up to this much more latency")
+    parser.add_argument("--requests-per-window", type=int, default=40, help="SearchTimeline requests per profile (0: no limit)")
+    parser.add_argument("--rate-limit-reset", type=float, default=3.0, help="seconds until an exhausted profile resets")
+    parser.add_argument("--hidden-rate-limit", action="store_true", help="no x-rate-limit-* headers, only 429s")
+    parser.add_argument("--media-per-page", type=int, default=0, help="images/videos/fonts each page loads")
+    parser.add_argument("--lean", action="store_true", help="block media like LEAN_BROWSER does")
+    parser.add_argument("--parallel", type=int, default=0, help="crawl with this many browsers at once")
+    parser.add_argument("--tabs", type=int, default=1, help="tabs per browser in the parallel crawl")
+    parser.add_argument("--hosts", type=int, default=0, help="crawlers sharing one job queue in the crawl stage")
+    parser.add_argument("--quiet-users", type=int, default=0, help="more accounts, posting --quiet-tweets-per-day")
+    parser.add_argument("--quiet-tweets-per-day", type=float, default=2)
+    parser.add_argument("--batch", action="store_true", help="search quiet accounts together (crawl stage)")
+    parser.add_argument("--dom-cost", type=float, default=0.0, help="seconds each rendered tweet adds to a page")
+    parser.add_argument("--no-prune", action="store_true", help="keep captured tweets in the DOM")
+    parser.add_argument("--heap-limit-mb", type=float, default=512, help="JS heap that recycles the tab/browser")
+    parser.add_argument("--capture-mode", choices=("poll", "async"), default="poll",
+                        help="how the crawl stage receives Network events")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="performance-log poll interval of the crawl stage")
+    parser.add_argument("--stages", default="crawl,mining,pages")
+    parser.add_argument("--memory", action="store_true", help="trace peak memory per stage")
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--compare", help="results of an earlier run to check against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--verbose", action="store_true", help="show crawler output")
+    args = parser.parse_args()
+
+    for name in ("recorded", "compare", "json"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    since = datetime.datetime.strptime(args.since, "%Y-%m-%d")
+    args.until = (since + datetime.timedelta(days=args.days)).strftime("%Y-%m-%d")
+    args.profiles = [f"fake_profile_{i}" for i in range(args.profiles)]
+    args.requests_per_window = args.requests_per_window or None
+    users = USERS[:args.users] + quiet_users(args)
+    stages = args.stages.split(",")
+
+    print(f"{len(users)} user(s), {args.since} → {args.until}, {len(args.profiles)} profiles, "
+          f"{'recorded pages' if args.recorded else f'{args.tweets_per_day} tweets/day'}, "
+          f"latency {args.latency}s, {args.requests_per_window or 'unlimited'} requests per profile window")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            if "crawl" in stages:
+                stage = Stage("crawl", args.memory)
+                site = crawl_stage(args, users, stage)
+                if site:
+                    results["crawl"] = stage.result()
+                    print(f"  crawl site: {site.stats}")
+            if "mining" in stages:
+                stage = Stage("mining", args.memory)
+                site = mining_stage(args, users, stage)
+                if site:
+                    results["mining"] = stage.result()
+                    print(f"  mining site: {site.stats}")
+            if "pages" in stages:
+                pages = load_pages(args)
+                if pages:
+                    results.update((s.name, s.result()) for s in page_stages(pages, args.memory))
+                else:
+                    print("  decode/extract/archive: skipped (no captured or recorded pages)")
+        finally:
+            os.chdir(cwd)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "profiles"}, "stages": results}, f, indent=2)
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
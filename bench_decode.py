@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: response-body decode, old try/except chain vs body_decode.
+
+    python bench_decode.py [response_dir ...] [--repeat N]
+
+Each recorded `resp_*.json` page (or a synthetic page set, see
+bench_extract.py) is fed in the three shapes getResponseBody can return:
+plain text, base64 of the JSON, and base64 of gzipped JSON. "old" is the
+gzip -> zlib -> raw fallback from on_finished followed by the lowercase
+1000-byte preview and a second decode for json.loads; "new" is
+body_decode.decode_cdp_body + is_rate_limited on the parsed result.
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import time
+import zlib
+from pathlib import Path
+
+import body_decode
+from bench_extract import synthetic_page
+
+
+def old_decode(body: str, base64_encoded: bool):
+    if base64_encoded:
+        raw = base64.b64decode(body)
+        for decompress in (
+            lambda x: gzip.decompress(x),
+            lambda x: zlib.decompress(x, 16 + zlib.MAX_WBITS),
+            lambda x: x,
+        ):
+            try:
+                body = decompress(raw).decode("utf-8")
+                break
+            except Exception:
+                pass
+    body_bytes = body.encode("utf-8", errors="ignore")
+    limited = "rate limit exceeded" in body_bytes[:1000].decode("utf-8", errors="ignore").lower()
+    return limited, json.loads(body_bytes.decode("utf-8", errors="ignore"))
+
+
+def new_decode(body: str, base64_encoded: bool):
+    decoded = body_decode.decode_cdp_body(body, base64_encoded)
+    return decoded.is_rate_limited(), decoded.data
+
+
+def load_bodies(dirs):
+    bodies = []
+    for d in dirs:
+        bodies.extend(p.read_bytes() for p in sorted(Path(d).rglob("resp_*.json")))
+    return bodies
+
+
+def bench(name, fn, inputs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body, b64 in inputs:
+            fn(body, b64)
+        best = min(best, time.perf_counter() - start)
+    per_body_us = best / len(inputs) * 1e6
+    print(f"  {name:<5} {per_body_us:10.1f} µs/body")
+    return per_body_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dirs", nargs="*")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=100, help="synthetic pages when no dirs are given")
+    args = parser.parse_args()
+
+    bodies = load_bodies(args.dirs) if args.dirs else [json.dumps(synthetic_page(i)).encode() for i in range(args.pages)]
+    if not bodies:
+        raise SystemExit("no bodies found")
+    print(f"{len(bodies)} bodies ({'recorded' if args.dirs else 'synthetic'}), "
+          f"JSON backend: {body_decode.JSON_BACKEND}, best of {args.repeat}")
+
+    shapes = {
+        "text": [(b.decode("utf-8"), False) for b in bodies],
+        "base64": [(base64.b64encode(b).decode(), True) for b in bodies],
+        "base64+gzip": [(base64.b64encode(gzip.compress(b)).decode(), True) for b in bodies],
+    }
+    for shape, inputs in shapes.items():
+        print(shape)
+        t_old = bench("old", old_decode, inputs, args.repeat)
+        t_new = bench("new", new_decode, inputs, args.repeat)
+        print(f"  speedup {t_old / t_new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-page tweet extraction, recursive walk vs TweetExtractor.
+
+    python bench_extract.py [response_dir ...] [--repeat N]
+
+With no directories a synthetic SearchTimeline page set is used (20 tweets
+per page with full author payloads, cards, quotes and retweets). Recorded
+`resp_*.json` pages from tweet_responses/<user>/<window>/ give real numbers.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from timeline import TweetExtractor, tweet_id, walk_tweets
+
+
+def synthetic_user(i: int) -> dict:
+    return {
+        "result": {
+            "__typename": "User",
+            "rest_id": str(1000 + i),
+            "legacy": {
+                "name": f"user {i}",
+                "screen_name": f"user{i}",
+                "description": "bio " * 40,
+                "entities": {"url": {"urls": [{"expanded_url": f"https://example.com/{i}"} for _ in range(3)]}},
+                "pinned_tweet_ids_str": [str(j) for j in range(5)],
+                "followers_count": 123456,
+                "profile_banner_url": "https://pbs.twimg.com/profile_banners/1/2",
+            },
+            "professional": {"category": [{"id": j, "name": "cat"} for j in range(5)]},
+            "affiliates_highlighted_label": {"label": {"badge": {"url": "x"}, "description": "d"}},
+        }
+    }
+
+
+def synthetic_tweet(tid: int, nested: bool = True) -> dict:
+    tweet = {
+        "__typename": "Tweet",
+        "rest_id": str(tid),
+        "core": {"user_results": synthetic_user(tid % 7)},
+        "card": {"legacy": {"binding_values": [{"key": f"k{j}", "value": {"string_value": "v" * 50}} for j in range(25)]}},
+        "views": {"count": "1000", "state": "EnabledWithCount"},
+        "legacy": {
+            "created_at": "Thu Mar 13 09:59:29 +0000 2025",
+            "full_text": "tweet text " * 20,
+            "entities": {"hashtags": [], "urls": [], "user_mentions": [{"id_str": str(j)} for j in range(5)]},
+            "favorite_count": 10,
+            "retweet_count": 2,
+        },
+    }
+    if nested and tid % 5 == 0:
+        tweet["quoted_status_result"] = {"result": synthetic_tweet(tid + 10_000_000, nested=False)}
+    if nested and tid % 7 == 0:
+        tweet["legacy"]["retweeted_status_result"] = {"result": synthetic_tweet(tid + 20_000_000, nested=False)}
+    if tid % 11 == 0:
+        tweet = {"__typename": "TweetWithVisibilityResults", "tweet": tweet}
+    return tweet
+
+
+def synthetic_page(page: int, per_page: int = 20) -> dict:
+    entries = [
+        {
+            "entryId": f"tweet-{page * per_page + k}",
+            "content": {
+                "entryType": "TimelineTimelineItem",
+                "itemContent": {
+                    "itemType": "TimelineTweet",
+                    "tweet_results": {"result": synthetic_tweet(page * per_page + k)},
+                },
+            },
+        }
+        for k in range(per_page)
+    ]
+    entries.append({"entryId": f"cursor-bottom-{page}", "content": {"entryType": "TimelineTimelineCursor", "value": f"c{page}", "cursorType": "Bottom"}})
+    return {"data": {"search_by_raw_query": {"search_timeline": {"timeline": {"instructions": [{"type": "TimelineAddEntries", "entries": entries}]}}}}}
+
+
+def load_pages(dirs):
+    pages = []
+    for d in dirs:
+        for path in sorted(Path(d).rglob("resp_*.json")):
+            try:
+                pages.append(json.loads(path.read_bytes()))
+            except ValueError:
+                continue
+    return pages
+
+
+def bench(name, fn, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            fn(page)
+        best = min(best, time.perf_counter() - start)
+    per_page_us = best / len(pages) * 1e6
+    print(f"{name:<22} {per_page_us:10.1f} µs/page")
+    return per_page_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dirs", nargs="*")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=200, help="synthetic pages when no dirs are given")
+    args = parser.parse_args()
+
+    pages = load_pages(args.dirs) if args.dirs else [synthetic_page(i) for i in range(args.pages)]
+    if not pages:
+        raise SystemExit("no pages found")
+    print(f"{len(pages)} pages ({'recorded' if args.dirs else 'synthetic'}), best of {args.repeat}")
+
+    extractor = TweetExtractor()
+    recursive_ids = {tweet_id(t) for p in pages for t in walk_tweets(p, [])}
+    schema_ids = {tweet_id(t) for p in pages for t in extractor.extract(p)}
+    if recursive_ids != schema_ids:
+        print(f"WARNING: id sets differ: {len(recursive_ids - schema_ids)} only recursive, "
+              f"{len(schema_ids - recursive_ids)} only schema")
+
+    t_rec = bench("recursive walk", lambda p: walk_tweets(p, []), pages, args.repeat)
+    extractor = TweetExtractor()
+    t_schema = bench("schema-directed", extractor.extract, pages, args.repeat)
+    print(f"speedup: {t_rec / t_schema:.1f}x, fallbacks: {dict(extractor.stats)}")
+
+
+if __name__ == "__main__":
+    main()
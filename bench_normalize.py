@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: full tweet objects vs the normalized store.
+
+    python bench_normalize.py [response_dir ...] [--pages 200] [--authors 1]
+
+Tweets are extracted from recorded `resp_*.json` pages, or from synthetic
+pages by `--authors` accounts (one by default, like a tweet_mining crawl;
+quoted and retweeted tweets come from 7 other accounts), and deduplicated the
+way tweet_mining does. Reported: the memory the kept tweets take after all
+pages were parsed (tracemalloc, pages themselves released), bytes on disk in
+an output_store vs a normalized_store, and the time to normalize and to
+rehydrate a tweet. Every rehydrated tweet is compared with its original.
+"""
+
+import argparse
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import body_decode
+from bench_decode import load_bodies
+from bench_extract import synthetic_page, synthetic_user
+from normalized_store import NormalizedReader, NormalizedSink, TweetNormalizer
+from output_store import TweetSink
+from timeline import TweetExtractor, tweet_id
+
+
+def single_author_page(page: int, authors: int) -> bytes:
+    data = synthetic_page(page)
+    for entry in data["data"]["search_by_raw_query"]["search_timeline"]["timeline"]["instructions"][0]["entries"]:
+        result = entry["content"].get("itemContent", {}).get("tweet_results", {}).get("result")
+        if result:
+            tweet = result.get("tweet", result)
+            tweet["core"]["user_results"] = synthetic_user(100 + int(tweet["rest_id"]) % authors)
+    return json.dumps(data).encode()
+
+
+def collect(bodies, normalizer=None):
+    """Tweets (or normalized records) of all pages, deduplicated by ID, as tweet_mining keeps them."""
+    extractor, seen, kept = TweetExtractor(), set(), []
+    for body in bodies:
+        for tweet in extractor.extract(body_decode.decode_bytes(body).data):
+            tid = tweet_id(tweet)
+            if not tid or tid in seen:
+                continue
+            seen.add(tid)
+            if normalizer is None:
+                kept.append(tweet)
+                continue
+            for record in normalizer.normalize(tweet):
+                seen.add(tweet_id(record))
+                kept.append(record)
+    return kept
+
+
+def retained(bodies, normalize: bool):
+    """(kept objects, normalizer, bytes they hold after parsing every page, seconds)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    normalizer = TweetNormalizer() if normalize else None
+    kept = collect(bodies, normalizer)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kept, normalizer, size, seconds
+
+
+def disk(root: Path) -> int:
+    return sum(p.stat().st_size for p in root.rglob("*.ndjson"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dirs", nargs="*")
+    parser.add_argument("--pages", type=int, default=200, help="synthetic pages when no dirs are given")
+    parser.add_argument("--authors", type=int, default=1, help="timeline authors of the synthetic pages")
+    args = parser.parse_args()
+
+    bodies = load_bodies(args.dirs) if args.dirs else [single_author_page(i, args.authors) for i in range(args.pages)]
+    if not bodies:
+        raise SystemExit("no bodies found")
+
+    tweets, _, full_mem, full_secs = retained(bodies, normalize=False)
+    records, normalizer, norm_mem, norm_secs = retained(bodies, normalize=True)
+    n = len(tweets)
+    print(f"{len(bodies)} pages ({'recorded' if args.dirs else f'synthetic, {args.authors} author(s)'}), "
+          f"{n} tweets, {normalizer.stats}")
+    print(f"  memory   full {full_mem / n:8.0f} B/tweet   normalized {norm_mem / n:8.0f} B/tweet "
+          f"({norm_mem / full_mem:.0%})")
+
+    with tempfile.TemporaryDirectory(dir=".") as tmp:
+        full_root, norm_root = Path(tmp) / "full", Path(tmp) / "normalized"
+        TweetSink(full_root, fsync=False).append(tweets)
+        sink = NormalizedSink(norm_root, fsync=False)
+        sink.normalizer = normalizer
+        sink.append(records)
+        print(f"  disk     full {disk(full_root) / n:8.0f} B/tweet   normalized {disk(norm_root) / n:8.0f} B/tweet "
+              f"({disk(norm_root) / disk(full_root):.0%})")
+
+        start = time.perf_counter()
+        reader = NormalizedReader(norm_root)
+        load_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        mismatches = sum(reader.get(tweet_id(t)) != t for t in tweets)
+        rehydrate_secs = time.perf_counter() - start
+    print(f"  time     collect full {full_secs / n * 1e6:.1f} µs/tweet, normalized {norm_secs / n * 1e6:.1f} µs/tweet; "
+          f"reader load {load_secs:.2f}s, rehydrate {rehydrate_secs / n * 1e6:.1f} µs/tweet")
+    print(f"  round trip: {n - mismatches}/{n} tweets identical after rehydration")
+
+
+if __name__ == "__main__":
+    main()
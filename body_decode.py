@@ -0,0 +1,121 @@
+"""
+Single decode stage for captured response bodies.
+
+`Network.getResponseBody` hands back `(body, base64Encoded)`. `decode_cdp_body`
+turns that into bytes, picks the decompressor from the leading magic bytes
+instead of trying gzip/zlib/raw in turn, and parses the JSON exactly once.
+The parsed object is kept on the result, so rate-limit detection, timeline
+checks and extraction all reuse it.
+
+The JSON backend is orjson or msgspec when installed, else the stdlib; set
+XSCRAPER_JSON=orjson|msgspec|json to force one.
+"""
+
+import base64
+import gzip
+import json
+import os
+import zlib
+from typing import Any, Optional
+
+
+# -------------------- JSON backend -------------------- #
+def _stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _select_backend(preferred: str):
+    for name in [preferred] if preferred else ["orjson", "msgspec"]:
+        try:
+            if name == "orjson":
+                import orjson
+                return name, orjson.loads, orjson.dumps
+            if name == "msgspec":
+                import msgspec
+                return name, msgspec.json.decode, msgspec.json.encode
+        except ImportError:
+            continue
+    return "json", json.loads, _stdlib_dumps
+
+
+JSON_BACKEND, _loads, _dumps = _select_backend(os.environ.get("XSCRAPER_JSON", ""))
+
+
+def loads(data) -> Any:
+    return _loads(data)
+
+
+def dumps(obj) -> bytes:
+    """Compact UTF-8 JSON bytes."""
+    return _dumps(obj)
+
+
+# -------------------- Decompression -------------------- #
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZLIB_HEADERS = (b"\x78\x01", b"\x78\x5e", b"\x78\x9c", b"\x78\xda")
+
+
+def sniff_encoding(raw: bytes) -> str:
+    """'gzip', 'zlib', 'zstd' or 'identity', from the first bytes only."""
+    head = raw[:4]
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head[:2] in ZLIB_HEADERS:
+        return "zlib"
+    if head == ZSTD_MAGIC:
+        return "zstd"
+    return "identity"
+
+
+def decompress(raw: bytes) -> bytes:
+    encoding = sniff_encoding(raw)
+    if encoding == "gzip":
+        return gzip.decompress(raw)
+    if encoding == "zlib":
+        return zlib.decompress(raw)
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    return raw
+
+
+# -------------------- Decoded body -------------------- #
+class DecodedBody:
+    """Raw bytes of a response plus its parsed JSON (None if it did not parse)."""
+
+    __slots__ = ("raw", "data", "error")
+
+    def __init__(self, raw: bytes, data: Any = None, error: Optional[Exception] = None):
+        self.raw = raw
+        self.data = data
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and isinstance(self.data, dict)
+
+    def is_rate_limited(self) -> bool:
+        """X answers with errors[].code 88 / "Rate limit exceeded" (or a plain-text page)."""
+        if self.ok:
+            for err in self.data.get("errors") or []:
+                if err.get("code") == 88 or "rate limit exceeded" in str(err.get("message", "")).lower():
+                    return True
+            return False
+        return b"rate limit exceeded" in self.raw[:1000].lower()
+
+
+def decode_bytes(raw: bytes) -> DecodedBody:
+    """Decompress (by magic bytes) and parse a response body once."""
+    try:
+        raw = decompress(raw)
+        return DecodedBody(raw, loads(raw))
+    except Exception as e:
+        return DecodedBody(raw, None, e)
+
+
+def decode_cdp_body(body: str, base64_encoded: bool) -> DecodedBody:
+    """Decode a `Network.getResponseBody` result."""
+    if base64_encoded:
+        return decode_bytes(base64.b64decode(body))
+    return decode_bytes(body.encode("utf-8", errors="ignore"))
@@ -0,0 +1,133 @@
+"""
+Warm browser pool for profile rotation.
+
+Starting Chrome with a profile and loading x.com takes several seconds. While
+one profile scrapes, `prefetch()` launches and warms the next profile of the
+rotation on a background thread, so a rate-limit switch only has to pick up
+a browser that is already running.
+
+`launch(profile_dir)` returns a driver; `warm(driver)` prepares it (Network
+enabled, x.com loaded). Drivers are closed with `driver.quit()`. Per profile
+the pool records:
+
+- startup: launch + warm-up seconds
+- idle:    seconds a warm browser waited before it was used
+- switch:  seconds `acquire()` blocked before returning a driver
+
+startup and switch also go to `metrics` as browser_start / rotation_wait.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from statistics import median
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger("tweet_crawler")
+
+
+class _Launch:
+    """One browser being started (or already started) on a background thread."""
+
+    def __init__(self, profile_dir: str):
+        self.profile_dir = profile_dir
+        self.done = threading.Event()
+        self.driver = None
+        self.error: Optional[BaseException] = None
+        self.ready_at = 0.0
+
+
+class WarmBrowserPool:
+    def __init__(self, launch: Callable[[str], Any], warm: Optional[Callable[[Any], None]] = None):
+        self.launch = launch
+        self.warm = warm
+        self.timings: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self._launches: Dict[str, _Launch] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, profile_dir: str, key: str, seconds: float):
+        with self._lock:
+            self.timings[profile_dir][key].append(seconds)
+        phase = {"startup": "browser_start", "switch": "rotation_wait"}.get(key)
+        if phase:
+            metrics.observe(phase, seconds, profile=profile_dir)
+
+    def _start(self, job: _Launch):
+        started = time.time()
+        try:
+            job.driver = self.launch(job.profile_dir)
+            if self.warm:
+                self.warm(job.driver)
+            job.ready_at = time.time()
+            self._record(job.profile_dir, "startup", job.ready_at - started)
+            logger.info(f"Browser for {job.profile_dir} ready in {job.ready_at - started:.1f}s")
+        except BaseException as e:
+            job.error = e
+            if job.driver is not None:
+                self._quit(job.profile_dir, job.driver)
+                job.driver = None
+        finally:
+            job.done.set()
+
+    def prefetch(self, profile_dir: str):
+        """Start launching `profile_dir` in the background unless it already is."""
+        with self._lock:
+            if profile_dir in self._launches:
+                return
+            job = self._launches[profile_dir] = _Launch(profile_dir)
+        threading.Thread(target=self._start, args=(job,), name=f"warm-{profile_dir}", daemon=True).start()
+
+    def acquire(self, profile_dir: str):
+        """Return a ready driver for `profile_dir`, launching it now if it was not prefetched."""
+        requested = time.time()
+        with self._lock:
+            job = self._launches.pop(profile_dir, None)
+        if job is None:
+            job = _Launch(profile_dir)
+            self._start(job)
+        else:
+            job.done.wait()
+            if job.error is not None:
+                logger.warning(f"Background launch of {profile_dir} failed ({job.error}), retrying")
+                job = _Launch(profile_dir)
+                self._start(job)
+        if job.error is not None:
+            raise job.error
+        acquired = time.time()
+        self._record(profile_dir, "idle", max(0.0, requested - job.ready_at))
+        self._record(profile_dir, "switch", acquired - requested)
+        logger.info(f"Switched to {profile_dir} in {acquired - requested:.1f}s")
+        return job.driver
+
+    def release(self, profile_dir: str, driver):
+        self._quit(profile_dir, driver)
+
+    def _quit(self, profile_dir: str, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Error closing browser for {profile_dir}: {e}")
+        logger.info(f"Closed browser for {profile_dir}")
+
+    def close(self):
+        """Quit browsers that were warmed but never acquired."""
+        with self._lock:
+            jobs, self._launches = list(self._launches.values()), {}
+        for job in jobs:
+            job.done.wait()
+            if job.driver is not None:
+                self._quit(job.profile_dir, job.driver)
+
+    def summary(self) -> Dict[str, dict]:
+        """Per profile: count and median seconds of each timing."""
+        with self._lock:
+            return {
+                profile_dir: {
+                    key: {"n": len(values), "median_s": round(median(values), 2)}
+                    for key, values in timings.items() if values
+                }
+                for profile_dir, timings in self.timings.items()
+            }
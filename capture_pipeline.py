@@ -0,0 +1,145 @@
+"""
+Bounded worker pipeline between CDP event callbacks and page processing.
+
+A CDP callback should return quickly so later network events keep flowing;
+it only calls `submit()` with the request ID (or with a body it already has).
+Worker threads then fetch the body, decode it once (see body_decode) and call
+the handler, which does extraction and persistence. The queue is bounded: when
+it is full `submit()` counts and logs a backpressure event and then waits for
+a free slot, so pages are delayed rather than dropped. Body reads and decoding
+are timed in `metrics` as get_body / decode, labelled with `labels`.
+
+With `ordered=True` bodies are still fetched and decoded in parallel, but
+`handle` is called in the order they were submitted, so a handler that stops
+at the last page of a timeline never sees it before the pages above it.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional, Tuple
+
+from body_decode import DecodedBody, decode_cdp_body
+from metrics import metrics
+
+logger = logging.getLogger("tweet_crawler")
+
+_STOP = object()
+
+
+class CapturePipeline:
+    """
+    `fetch(request_id) -> (body, base64_encoded)` reads a response body;
+    `handle(url, decoded, finished_ts)` consumes it. `handle` runs on several
+    worker threads at once and must do its own locking (unless `ordered`,
+    which runs one call at a time, in submission order).
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[str, DecodedBody, Optional[float]], None],
+        fetch: Optional[Callable[[str], Tuple[str, bool]]] = None,
+        workers: int = 2,
+        maxsize: int = 64,
+        name: str = "capture",
+        labels: Optional[dict] = None,
+        ordered: bool = False,
+    ):
+        self.handle = handle
+        self.fetch = fetch
+        self.labels = labels or {}
+        self.ordered = ordered
+        self.queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._submit_lock = threading.Lock()  # sequence numbers follow queue order
+        self._turn = threading.Condition()
+        self._next_seq = 0  # next sequence number to hand out
+        self._next_turn = 0  # ordered: sequence number whose `handle` runs next
+        self.stats = Counter()
+        self.max_depth = 0
+        self._stats_lock = threading.Lock()
+        self._last_warning = 0.0
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True) for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, url: str, request_id: Optional[str] = None, body: Optional[str] = None,
+               base64_encoded: bool = False, finished_ts: Optional[float] = None):
+        """Queue one response; pass `body` when it was already read, else `request_id`."""
+        self._count("submitted")
+        with self._submit_lock:
+            job = (self._next_seq, url, request_id, body, base64_encoded, finished_ts)
+            self._next_seq += 1
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                self._count("backpressure")
+                now = time.time()
+                if now - self._last_warning > 5:
+                    self._last_warning = now
+                    logger.warning(
+                        f"Capture queue full ({self.queue.maxsize}), event callback is waiting "
+                        f"({self.stats['backpressure']} times so far)"
+                    )
+                self.queue.put(job)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                self.queue.task_done()
+                return
+            seq, url, request_id, body, base64_encoded, finished_ts = job
+            try:
+                if body is None:
+                    try:
+                        with metrics.time("get_body", **self.labels):
+                            body, base64_encoded = self.fetch(request_id)
+                    except Exception as e:
+                        self._count("fetch_errors")
+                        logger.warning(f"Failed to read response body for {url}: {e}")
+                        continue
+                with metrics.time("decode", **self.labels):
+                    decoded = decode_cdp_body(body, base64_encoded)
+                self._wait_turn(seq)
+                self.handle(url, decoded, finished_ts)
+                self._count("processed")
+            except Exception as e:
+                self._count("errors")
+                logger.exception(f"Capture worker error: {e}")
+            finally:
+                self._end_turn(seq)
+                self.queue.task_done()
+
+    def _wait_turn(self, seq: int):
+        """Ordered: wait until every job submitted before `seq` was handled (or failed)."""
+        if self.ordered:
+            with self._turn:
+                self._turn.wait_for(lambda: self._next_turn >= seq)
+
+    def _end_turn(self, seq: int):
+        if self.ordered:
+            with self._turn:
+                self._turn.wait_for(lambda: self._next_turn >= seq)  # a failed fetch still takes its turn
+                self._next_turn = seq + 1
+                self._turn.notify_all()
+
+    def close(self, timeout: float = 30):
+        """Finish everything already queued, then stop the workers."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        deadline = time.time() + timeout
+        for t in self._threads:
+            t.join(timeout=max(0.0, deadline - time.time()))
+
+    def summary(self) -> dict:
+        with self._stats_lock:
+            return dict(self.stats, max_depth=self.max_depth)
@@ -0,0 +1,242 @@
+"""
+Asyncio DevTools client: many browsers and tabs on one event loop.
+
+Selenium's `execute_cdp_cmd` is one blocking HTTP round trip through
+chromedriver per command, and the "events" capture mode runs a trio loop in a
+thread per window. Here each Chrome gets one websocket to its browser
+endpoint (`/json/version` of its `debuggerAddress`); every tab is a flat
+session on that socket (`Target.attachToTarget`, `flatten: true`), so
+commands and events carry a `sessionId` and never mix between tabs.
+
+- `CDPConnection.send()` does not wait for earlier commands: any number of
+  them (e.g. `Network.getResponseBody` for every finished request) are in
+  flight at once and matched to their responses by id
+- `CDPHub` runs the event loop on one background thread ("cdp-hub") and
+  keeps one connection per browser, so one crawler process can follow
+  dozens of sessions without a thread each. `hub.run(coro)` and
+  `hub.execute(...)` are the blocking entry points for crawler threads
+
+Launch, stealth patches and navigation stay with UC / Selenium; this only
+talks to the browser they started. Needs `pip install websockets`.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import urllib.request
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("tweet_crawler")
+
+
+class CDPError(Exception):
+    """Error response to a DevTools command."""
+
+
+class CDPSession:
+    """One tab (target) on a CDPConnection."""
+
+    def __init__(self, connection: "CDPConnection", session_id: str, target_id: str):
+        self.connection = connection
+        self.session_id = session_id
+        self.target_id = target_id
+        self._handlers: Dict[str, List[Callable[[dict], None]]] = defaultdict(list)
+        self.detached = False
+
+    async def execute(self, method: str, params: Optional[dict] = None) -> dict:
+        return await self.connection.send(method, params, session_id=self.session_id)
+
+    def on(self, method: str, handler: Callable[[dict], None]):
+        """Call `handler(params)` on the event loop for every `method` event of this tab."""
+        self._handlers[method].append(handler)
+
+    def _dispatch(self, method: str, params: dict):
+        for handler in self._handlers.get(method, ()):
+            try:
+                handler(params)
+            except Exception as e:
+                logger.exception(f"CDP handler for {method} failed: {e}")
+
+    async def detach(self):
+        if self.detached:
+            return
+        self.detached = True
+        self._handlers.clear()
+        self.connection.sessions.pop(self.session_id, None)
+        try:
+            await self.connection.send("Target.detachFromTarget", {"sessionId": self.session_id})
+        except Exception:
+            pass  # the tab or browser is already gone
+
+
+class CDPConnection:
+    """A websocket to one browser's DevTools endpoint, shared by its tab sessions."""
+
+    def __init__(self, ws_url: str):
+        self.ws_url = ws_url
+        self.sessions: Dict[str, CDPSession] = {}
+        self._ids = itertools.count(1)
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self.closed = False
+
+    async def connect(self) -> "CDPConnection":
+        try:
+            import websockets
+        except ImportError as e:
+            raise ImportError("the async CDP client needs websockets: pip install websockets") from e
+        # Response bodies are larger than websockets' 1 MiB default message limit.
+        self._ws = await websockets.connect(self.ws_url, max_size=None, ping_interval=None)
+        self._reader = asyncio.ensure_future(self._read())
+        return self
+
+    async def send(self, method: str, params: Optional[dict] = None, session_id: Optional[str] = None) -> dict:
+        if self.closed:
+            raise CDPError(f"{method}: connection to {self.ws_url} is closed")
+        msg_id = next(self._ids)
+        message = {"id": msg_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[msg_id] = future
+        await self._ws.send(json.dumps(message))
+        return await future
+
+    async def attach(self, target_id: str) -> CDPSession:
+        result = await self.send("Target.attachToTarget", {"targetId": target_id, "flatten": True})
+        session = CDPSession(self, result["sessionId"], target_id)
+        self.sessions[session.session_id] = session
+        return session
+
+    async def _read(self):
+        try:
+            async for raw in self._ws:
+                msg = json.loads(raw)
+                if "id" in msg:
+                    future = self._waiting.pop(msg["id"], None)
+                    if future is None or future.done():
+                        continue
+                    if "error" in msg:
+                        future.set_exception(CDPError(msg["error"].get("message", str(msg["error"]))))
+                    else:
+                        future.set_result(msg.get("result", {}))
+                else:
+                    session = self.sessions.get(msg.get("sessionId"))
+                    if session is not None:
+                        session._dispatch(msg.get("method", ""), msg.get("params", {}))
+        except Exception as e:
+            if not self.closed:
+                logger.warning(f"DevTools connection {self.ws_url} lost: {e}")
+        finally:
+            self.closed = True
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(CDPError(f"connection to {self.ws_url} closed"))
+            self._waiting.clear()
+
+    async def close(self):
+        self.closed = True
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+
+def browser_ws_url(debugger_address: str) -> str:
+    with urllib.request.urlopen(f"http://{debugger_address}/json/version", timeout=10) as resp:
+        return json.loads(resp.read())["webSocketDebuggerUrl"]
+
+
+class CDPHub:
+    """One asyncio loop on a background thread, one CDPConnection per browser."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._connections: Dict[str, CDPConnection] = {}
+        self._connecting: Dict[str, asyncio.Future] = {}
+        self._thread = threading.Thread(target=self.loop.run_forever, name="cdp-hub", daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """Run `coro` on the hub loop and wait for its result (from any other thread)."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def submit(self, coro: Awaitable):
+        """Schedule `coro` on the hub loop without waiting; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def connection(self, debugger_address: str) -> CDPConnection:
+        """The browser's connection, opened on first use (concurrent callers share it)."""
+        conn = self._connections.get(debugger_address)
+        if conn is not None and not conn.closed:
+            return conn
+        pending = self._connecting.get(debugger_address)
+        if pending is None:
+            pending = self._connecting[debugger_address] = asyncio.ensure_future(self._connect(debugger_address))
+        try:
+            return await asyncio.shield(pending)
+        finally:
+            if pending.done():
+                self._connecting.pop(debugger_address, None)
+
+    async def _connect(self, debugger_address: str) -> CDPConnection:
+        ws_url = await self.loop.run_in_executor(None, browser_ws_url, debugger_address)
+        conn = await CDPConnection(ws_url).connect()
+        self._connections[debugger_address] = conn
+        logger.info(f"DevTools connection to {debugger_address} open")
+        return conn
+
+    def execute(self, debugger_address: str, target_id: str, method: str, params: Optional[dict] = None,
+                timeout: Optional[float] = 30) -> dict:
+        """Blocking one-off command on a tab, for callers outside the loop."""
+        async def call():
+            conn = await self.connection(debugger_address)
+            session = await conn.attach(target_id)
+            try:
+                return await session.execute(method, params)
+            finally:
+                await session.detach()
+        return self.run(call(), timeout)
+
+    def sessions(self) -> int:
+        return sum(len(c.sessions) for c in self._connections.values() if not c.closed)
+
+    async def disconnect(self, debugger_address: str):
+        conn = self._connections.pop(debugger_address, None)
+        if conn is not None:
+            await conn.close()
+
+    def close(self):
+        async def close_all():
+            for address in list(self._connections):
+                await self.disconnect(address)
+        try:
+            self.run(close_all(), timeout=10)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+
+
+_hub: Optional[CDPHub] = None
+_hub_lock = threading.Lock()
+
+
+def get_hub() -> CDPHub:
+    """The process-wide hub, started on first use."""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = CDPHub()
+        return _hub
+
+
+def close_hub():
+    global _hub
+    with _hub_lock:
+        hub, _hub = _hub, None
+    if hub is not None:
+        hub.close()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Columnar (Parquet) export of captured tweets.
+
+Tweets are flattened into one typed row each (IDs, author, created_at, text,
+engagement counts, reply/quote/retweet references, media) and written as a
+Hive-partitioned dataset, `<out>/user=<name>/month=<YYYY-MM>/part-*.parquet`,
+that pyarrow, DuckDB, Polars or Spark can scan by partition.
+
+A user's partitions hold that user's tweets only: from response pages the
+tweets the timeline entries are about (not the quoted or retweeted tweets
+nested in them, which are by other accounts), from tweet stores the tweets
+the user wrote. Tweet IDs written for a user are kept in a `TweetIdIndex`
+under `user=<name>/_ids` (scanners skip `_` paths), so a tweet captured
+again, by another window or a later crawl, is not written twice; the first
+capture is kept.
+
+Each run only reads inputs it has not exported before: response files (and
+archived pages, under the path they would have as files) are tracked by path
+and size, tweet stores by how many tweets were already read.
+Partitions that collect more than `compact_after` part files are rewritten
+into one file, without duplicate tweet IDs (datasets written before the ID
+index may still have some).
+
+    python columnar_export.py tweet_responses tweets_parquet
+    python columnar_export.py response_archive tweets_parquet
+    python columnar_export.py --store control_group_outputs/<store_dir> --user <name> tweets_parquet
+    python columnar_export.py --compact tweets_parquet
+
+Needs pyarrow (`pip install pyarrow`).
+"""
+
+import argparse
+import datetime
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import body_decode
+from id_index import TweetIdIndex
+from normalized_store import is_normalized, iter_normalized
+from output_store import iter_tweets
+from response_archive import ArchiveReader, is_archive
+from timeline import TweetExtractor, top_level_tweet_ids, tweet_id
+
+STATE_FILE = "_export_state.json"
+ID_INDEX = "_ids"  # per user, next to the month partitions
+CREATED_AT_FORMAT = "%a %b %d %H:%M:%S %z %Y"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("columnar export needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def tweet_schema():
+    pa = _pyarrow()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("conversation_id", pa.int64()),
+        ("author_id", pa.int64()),
+        ("author_screen_name", pa.string()),
+        ("created_at", pa.timestamp("s", tz="UTC")),
+        ("lang", pa.string()),
+        ("text", pa.string()),
+        ("reply_count", pa.int64()),
+        ("retweet_count", pa.int64()),
+        ("quote_count", pa.int64()),
+        ("favorite_count", pa.int64()),
+        ("bookmark_count", pa.int64()),
+        ("view_count", pa.int64()),
+        ("in_reply_to_status_id", pa.int64()),
+        ("in_reply_to_user_id", pa.int64()),
+        ("quoted_status_id", pa.int64()),
+        ("retweeted_status_id", pa.int64()),
+        ("hashtags", pa.list_(pa.string())),
+        ("media_types", pa.list_(pa.string())),
+        ("media_urls", pa.list_(pa.string())),
+    ])
+
+
+# -------------------- Flattening -------------------- #
+def _int(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _unwrap(result: Optional[dict]) -> dict:
+    result = result or {}
+    if result.get("__typename") == "TweetWithVisibilityResults":
+        return result.get("tweet", {})
+    return result
+
+
+def flatten_tweet(tweet: dict) -> Optional[dict]:
+    """One row for a tweet object; None if it has no ID or creation time."""
+    legacy = tweet.get("legacy", {})
+    tid = _int(tweet.get("rest_id") or legacy.get("id_str"))
+    if tid is None or not legacy.get("created_at"):
+        return None
+    user = (tweet.get("core", {}).get("user_results") or {}).get("result") or {}
+    screen_name = user.get("core", {}).get("screen_name") or user.get("legacy", {}).get("screen_name")
+    note = ((tweet.get("note_tweet") or {}).get("note_tweet_results") or {}).get("result") or {}
+    media = (legacy.get("extended_entities") or legacy.get("entities") or {}).get("media") or []
+    quoted = _unwrap((tweet.get("quoted_status_result") or {}).get("result"))
+    retweeted = _unwrap((legacy.get("retweeted_status_result") or {}).get("result"))
+    return {
+        "id": tid,
+        "conversation_id": _int(legacy.get("conversation_id_str")),
+        "author_id": _int(legacy.get("user_id_str") or user.get("rest_id")),
+        "author_screen_name": screen_name,
+        "created_at": datetime.datetime.strptime(legacy["created_at"], CREATED_AT_FORMAT),
+        "lang": legacy.get("lang"),
+        "text": note.get("text") or legacy.get("full_text"),
+        "reply_count": _int(legacy.get("reply_count")),
+        "retweet_count": _int(legacy.get("retweet_count")),
+        "quote_count": _int(legacy.get("quote_count")),
+        "favorite_count": _int(legacy.get("favorite_count")),
+        "bookmark_count": _int(legacy.get("bookmark_count")),
+        "view_count": _int((tweet.get("views") or {}).get("count")),
+        "in_reply_to_status_id": _int(legacy.get("in_reply_to_status_id_str")),
+        "in_reply_to_user_id": _int(legacy.get("in_reply_to_user_id_str")),
+        "quoted_status_id": _int(legacy.get("quoted_status_id_str") or quoted.get("rest_id")),
+        "retweeted_status_id": _int(retweeted.get("rest_id")),
+        "hashtags": [h.get("text") for h in (legacy.get("entities") or {}).get("hashtags", []) if h.get("text")],
+        "media_types": [m.get("type") for m in media],
+        "media_urls": [m.get("media_url_https") or m.get("media_url") for m in media],
+    }
+
+
+# -------------------- Exporter -------------------- #
+class ParquetExporter:
+    def __init__(self, out_dir, compact_after: int = 8, batch_rows: int = 200_000):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.compact_after = compact_after
+        self.batch_rows = batch_rows
+        self.extractor = TweetExtractor()
+        self.state = self._load_state()
+        self._rows: Dict[tuple, List[dict]] = defaultdict(list)
+        self._buffered = 0
+        self._pending_state: Dict[str, dict] = {"files": {}, "stores": {}}
+        self._indexes: Dict[str, TweetIdIndex] = {}
+        self._pending_ids: Dict[str, set] = defaultdict(set)
+        self.stats = {"files": 0, "tweets": 0, "parts": 0, "duplicates": 0, "other_authors": 0}
+
+    def _load_state(self) -> dict:
+        path = self.out_dir / STATE_FILE
+        if path.exists():
+            with open(path) as f:
+                return json.load(f)
+        return {"files": {}, "stores": {}}
+
+    def _save_state(self):
+        path = self.out_dir / STATE_FILE
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, path)
+
+    # ---- inputs ---- #
+    def export_responses(self, root):
+        """Export new `resp_*.json` pages under `root/<user>/<window>/`."""
+        root = Path(root)
+        for user_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+            for path in sorted(user_dir.glob("*/resp_*.json")):
+                key = str(path.relative_to(root))
+                size = path.stat().st_size
+                if self.state["files"].get(key) == size:
+                    continue
+                page = body_decode.decode_bytes(path.read_bytes())
+                if page.ok:
+                    self.add(user_dir.name, self.page_tweets(page.data))
+                self._pending_state["files"][key] = size
+                self.stats["files"] += 1
+                self._maybe_flush()
+        self.flush()
+
+    def export_archive(self, root):
+        """Export pages of a `response_archive` that were not exported before."""
+        reader = ArchiveReader(root)
+        for user, window, request in reader.keys():
+            key = str(Path(user) / window / f"{request}.json")
+            size = reader.entries[(user, window, request)][1]["size"]
+            if self.state["files"].get(key) == size:
+                continue
+            page = body_decode.decode_bytes(reader.get(user, window, request))
+            if page.ok:
+                self.add(user, self.page_tweets(page.data))
+            self._pending_state["files"][key] = size
+            self.stats["files"] += 1
+            self._maybe_flush()
+        self.flush()
+
+    def export_store(self, store, user: str):
+        """
+        Export tweets of an `output_store` or `normalized_store` directory (or
+        legacy JSON file) not exported yet. Stores keep the tweets nested in
+        `user`'s tweets as well; only those written by `user` are exported.
+        """
+        store = Path(store)
+        key = str(store.resolve())
+        done = self.state["stores"].get(key, 0)
+        if is_normalized(store):
+            tweets: Iterable[dict] = iter_normalized(store)
+        elif store.is_dir():
+            tweets = iter_tweets(store)
+        else:
+            with open(store, encoding="utf-8") as f:
+                tweets = json.load(f).get("tweets", [])
+        count = 0
+        batch = []
+        for tweet in tweets:
+            count += 1
+            if count > done:
+                batch.append(tweet)
+            if len(batch) >= 10_000:
+                self.add(user, batch, own_only=True)
+                batch = []
+                self._maybe_flush()
+        self.add(user, batch, own_only=True)
+        self._pending_state["stores"][key] = max(count, done)
+        self.flush()
+
+    def page_tweets(self, data: dict) -> List[dict]:
+        """The tweets a page's timeline entries are about, without the quoted / retweeted ones."""
+        top = set(top_level_tweet_ids(data))
+        return [t for t in self.extractor.extract(data) if tweet_id(t) in top]
+
+    def id_index(self, user: str) -> TweetIdIndex:
+        if user not in self._indexes:
+            self._indexes[user] = TweetIdIndex(self.out_dir / f"user={user}" / ID_INDEX, expected_ids=1_000_000)
+        return self._indexes[user]
+
+    def add(self, user: str, tweets: Iterable[dict], own_only: bool = False):
+        """Buffer rows for `user`'s partitions, skipping tweets already exported (`own_only`: and other authors')."""
+        index, pending = self.id_index(user), self._pending_ids[user]
+        for tweet in tweets:
+            row = flatten_tweet(tweet)
+            if row is None:
+                continue
+            name = row["author_screen_name"]
+            if own_only and name and name.lower() != user.lower():
+                self.stats["other_authors"] += 1
+                continue
+            if row["id"] in pending or row["id"] in index:
+                self.stats["duplicates"] += 1
+                continue
+            pending.add(row["id"])
+            self._rows[(user, row["created_at"].strftime("%Y-%m"))].append(row)
+            self._buffered += 1
+
+    def _maybe_flush(self):
+        if self._buffered >= self.batch_rows:
+            self.flush()
+
+    # ---- output ---- #
+    def partition_dir(self, user: str, month: str) -> Path:
+        return self.out_dir / f"user={user}" / f"month={month}"
+
+    def flush(self):
+        """Write buffered rows as one new part per partition, then record the inputs as done."""
+        pa = _pyarrow()
+        schema = tweet_schema()
+        touched = []
+        for (user, month), rows in self._rows.items():
+            part_dir = self.partition_dir(user, month)
+            part_dir.mkdir(parents=True, exist_ok=True)
+            path = part_dir / f"part-{time.time_ns()}.parquet"
+            _write_table(pa.Table.from_pylist(rows, schema=schema), path)
+            self.stats["tweets"] += len(rows)
+            self.stats["parts"] += 1
+            touched.append(part_dir)
+        for user, ids in self._pending_ids.items():
+            self.id_index(user).add_many(ids)
+        self._pending_ids.clear()
+        self._rows.clear()
+        self._buffered = 0
+        for kind, done in self._pending_state.items():
+            self.state[kind].update(done)
+            done.clear()
+        self._save_state()
+        for part_dir in touched:
+            if len(list(part_dir.glob("part-*.parquet"))) > self.compact_after:
+                compact_partition(part_dir)
+
+    def compact(self):
+        for part_dir in sorted(self.out_dir.glob("user=*/month=*")):
+            if len(list(part_dir.glob("part-*.parquet"))) > 1:
+                compact_partition(part_dir)
+
+    def close(self):
+        for index in self._indexes.values():
+            index.close()
+        self._indexes.clear()
+
+
+def _write_table(table, path: Path):
+    import pyarrow.parquet as pq
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def compact_partition(part_dir: Path):
+    """Rewrite a partition's part files as one, sorted by ID, keeping the last copy of each tweet."""
+    import pyarrow.parquet as pq
+    pa = _pyarrow()
+    parts = sorted(part_dir.glob("part-*.parquet"))
+    table = pa.concat_tables([pq.read_table(p, schema=tweet_schema()) for p in parts])
+    table = table.append_column("_row", pa.array(range(len(table)), pa.int64()))
+    last = table.group_by("id").aggregate([("_row", "max")]).column("_row_max")
+    table = table.take(last).drop_columns(["_row"]).sort_by("id")
+    _write_table(table, part_dir / f"part-{time.time_ns()}.parquet")
+    for p in parts:
+        p.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export captured tweets to a partitioned Parquet dataset.")
+    parser.add_argument("source", nargs="?", help="tweet_responses directory (user/window/resp_*.json) or response archive")
+    parser.add_argument("out", help="output dataset directory")
+    parser.add_argument("--store", help="output_store / normalized_store directory or legacy JSON file to export instead")
+    parser.add_argument("--user", help="username for --store")
+    parser.add_argument("--compact", action="store_true", help="only merge part files of every partition")
+    args = parser.parse_args()
+
+    exporter = ParquetExporter(args.out)
+    started = time.time()
+    try:
+        if args.compact:
+            exporter.compact()
+        elif args.store:
+            if not args.user:
+                parser.error("--store needs --user")
+            exporter.export_store(args.store, args.user)
+        elif args.source and is_archive(args.source):
+            exporter.export_archive(args.source)
+        elif args.source:
+            exporter.export_responses(args.source)
+        else:
+            parser.error("give a source directory, --store or --compact")
+    finally:
+        exporter.close()
+    print(f"{exporter.stats} in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,660 @@
+"""
+Offline stand-in for a logged-in Chrome driver on x.com.
+
+`FakeX` plays the site: it answers search navigations and scrolls with
+SearchTimeline pages and keeps an x-rate-limit budget per profile.
+`FakeX.launch(profile_dir)` returns a `FakeDriver` that can be used wherever
+the crawlers expect a UC / SeleniumBase driver (`start_chrome`,
+`WarmBrowserPool`, `scrape_with_driver`):
+
+- `get(url)` of an x.com search starts the query's timeline and serves page 1
+- `execute_script("window.scrollTo(...)")` serves the next page once the
+  previous one has finished; `refresh()` serves a page that never came again
+- every page emits Network.requestWillBeSent / responseReceived /
+  loadingFinished, to `add_cdp_listener` callbacks and to the
+  `get_log("performance")` buffer, after `latency` (+ up to `jitter`) seconds
+- `execute_cdp_cmd("Network.getResponseBody", ...)` returns the page body
+
+Pages come from a timeline: `SyntheticTimeline` makes `tweets_per_day`
+tweets per user with snowflake IDs inside the searched range (so
+`since_id:`/`max_id:` bounds, splits and resumes behave as on X), and
+`RecordedTimeline` serves pages captured before, from a tweet_responses
+directory or a response archive. A `(from:a OR from:b …)` search gets the
+accounts' timelines merged newest first; every fake account's tweets carry
+its own stable author ID (`author_id`). A profile that has used up
+`requests_per_window` gets HTTP 429 with X's rate-limit body and the
+"Something went wrong" banner until `rate_limit_reset` seconds have passed;
+with `rate_limit_headers=False` responses carry no x-rate-limit-* headers, so
+the limit is only noticed when it hits.
+
+With `media_per_page`, every page also loads that many images, video segments
+and fonts of `media_bytes` each, unless `Network.setBlockedURLs` patterns
+(lean mode) match them: those requests fail with a blockedReason, and so
+would a SearchTimeline request that a pattern matched by mistake.
+
+Each tab models its memory for `Performance.getMetrics`: every page served
+renders `per_page` tweet cells into the DOM and grows the JS heap (partly
+kept across navigations, as a long-lived renderer does); the DOM pruning
+script of memory_watchdog hides cells above the viewport, and a new tab
+(`switch_to.new_window`) starts from scratch. With `dom_cost`, each rendered
+cell adds that many seconds to the next page's latency, the way a long
+timeline slows scrolling down.
+
+With `devtools=True` every driver also serves a DevTools endpoint on
+127.0.0.1 (`capabilities["goog:chromeOptions"]["debuggerAddress"]`):
+`/json/version` and a browser websocket that takes flat sessions
+(`Target.attachToTarget`), pushes each tab's Network events to the sessions
+attached to it and answers `Network.getResponseBody`, enough for the
+crawler's CAPTURE_MODE = "async" (needs `pip install websockets`). The
+"events" mode's Selenium/trio client is not simulated; use "poll" or "async".
+"""
+
+import asyncio
+import datetime
+import fnmatch
+import itertools
+import json
+import re
+import threading
+import time
+import urllib.parse
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+from bench_extract import synthetic_tweet
+from response_archive import ArchiveReader, is_archive
+from window_planner import format_bound, snowflake_at, snowflake_time
+
+SEARCH_URL = "https://x.com/i/api/graphql/fake/SearchTimeline"
+RATE_LIMIT_BODY = b'{"errors":[{"code":88,"message":"Rate limit exceeded."}]}'
+MEDIA_URLS = (
+    "https://pbs.twimg.com/media/fake{n}?format=jpg&name=small",
+    "https://pbs.twimg.com/profile_images/{n}/fake_normal.jpg",
+    "https://video.twimg.com/ext_tw_video/{n}/pu/vid/avc1/0/3000/480x270/fake.m4s",
+    "https://abs.twimg.com/responsive-web/client-web/chirp-{n}.woff2",
+)
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+# -------------------- Search queries -------------------- #
+def parse_search(url: str) -> Optional[Tuple[Union[str, Tuple[str, ...]], int, int]]:
+    """
+    (username, lowest ID, highest ID) a search URL asks for, both inclusive;
+    a tuple of usernames for `(from:a OR from:b …)`. None if it is no search.
+    """
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query).get("q")
+    if not query:
+        return None
+    users = tuple(re.findall(r"from:(\w+)", query[0]))
+    terms = dict(re.findall(r"(\w+):([\w-]+)", query[0]))
+    if not users:
+        return None
+    lo, hi = 0, (1 << 63) - 1
+    if "since" in terms:
+        lo = snowflake_at(datetime.datetime.strptime(terms["since"], "%Y-%m-%d"))
+    if "until" in terms:
+        hi = snowflake_at(datetime.datetime.strptime(terms["until"], "%Y-%m-%d")) - 1
+    if "since_id" in terms:
+        lo = max(lo, int(terms["since_id"]) + 1)
+    if "max_id" in terms:
+        hi = min(hi, int(terms["max_id"]))
+    return users[0] if len(users) == 1 else users, lo, hi
+
+
+def window_name(lo: int, hi: int) -> str:
+    """`<since>_<until>` of an ID range, as used for capture directories and archive keys."""
+    return f"{format_bound(snowflake_time(lo))}_{format_bound(snowflake_time(hi + 1))}"
+
+
+def timeline_page(tweets: List[dict], cursor: Optional[str]) -> bytes:
+    entries = [
+        {
+            "entryId": f"tweet-{t.get('rest_id') or t['tweet']['rest_id']}",
+            "content": {
+                "entryType": "TimelineTimelineItem",
+                "itemContent": {"itemType": "TimelineTweet", "tweet_results": {"result": t}},
+            },
+        }
+        for t in tweets
+    ]
+    entries.append({"entryId": "cursor-top-0", "content": {
+        "entryType": "TimelineTimelineCursor", "value": "top", "cursorType": "Top"}})
+    if cursor:
+        entries.append({"entryId": f"cursor-bottom-{cursor}", "content": {
+            "entryType": "TimelineTimelineCursor", "value": cursor, "cursorType": "Bottom"}})
+    data = {"data": {"search_by_raw_query": {"search_timeline": {"timeline": {
+        "instructions": [{"type": "TimelineAddEntries", "entries": entries}]}}}}}
+    return json.dumps(data).encode()
+
+
+# -------------------- Timelines -------------------- #
+class SyntheticTimeline:
+    """
+    `tweets_per_day` tweets per user (a number, or a dict by username with
+    `default` for the rest), evenly spread over the day, served newest first
+    `per_page` at a time. A range without tweets gets one empty page.
+    """
+
+    def __init__(self, tweets_per_day: Union[int, Dict[str, int]] = 200, per_page: int = 20):
+        self.tweets_per_day = tweets_per_day
+        self.per_page = per_page
+
+    def rate(self, username: str) -> int:
+        if isinstance(self.tweets_per_day, dict):
+            return self.tweets_per_day.get(username, self.tweets_per_day.get("default", 0))
+        return self.tweets_per_day
+
+    def tweet_ids(self, username: str, lo: int, hi: int) -> List[int]:
+        rate = self.rate(username)
+        if not rate:
+            return []
+        interval = 86400 / rate
+        salt = zlib.crc32(username.encode()) % (1 << 22)  # low snowflake bits: distinct IDs per user
+        start = (snowflake_time(lo) - _EPOCH).total_seconds()
+        stop = (snowflake_time(hi) - _EPOCH).total_seconds()
+        ids = []
+        for k in range(int(start // interval), int(stop // interval) + 1):
+            tid = snowflake_at(_EPOCH + datetime.timedelta(seconds=(k + 0.5) * interval)) + salt
+            if lo <= tid <= hi:
+                ids.append(tid)
+        return ids[::-1]
+
+    def pages(self, username: Union[str, Tuple[str, ...]], lo: int, hi: int) -> List[Callable[[], bytes]]:
+        users = (username,) if isinstance(username, str) else username
+        ids = sorted(((tid, user) for user in users for tid in self.tweet_ids(user, lo, hi)), reverse=True)
+        chunks = [ids[i:i + self.per_page] for i in range(0, len(ids), self.per_page)]
+        name = "+".join(users)
+        pages = [lambda c=c, n=n: timeline_page([_tweet(tid, user) for tid, user in c], f"fake-{name}-{c[-1][0]}-{n}")
+                 for n, c in enumerate(chunks)]
+        pages.append(lambda: timeline_page([], None))  # X ends a timeline with a page of cursors only
+        return pages
+
+
+def _tweet(tid: int, username: str) -> dict:
+    tweet = synthetic_tweet(tid)
+    inner = tweet.get("tweet", tweet)
+    inner["legacy"]["created_at"] = snowflake_time(tid).strftime("%a %b %d %H:%M:%S +0000 %Y")
+    author = inner["core"]["user_results"]["result"]
+    author["rest_id"] = author_id(username)
+    author["legacy"]["screen_name"] = username
+    return tweet
+
+
+def author_id(username: str) -> str:
+    """The stable user ID of a fake account."""
+    return str(10 ** 9 + zlib.crc32(username.encode()))
+
+
+class RecordedTimeline:
+    """
+    Pages captured before (tweet_responses directory or response archive),
+    served for the window they were captured in; other windows are empty.
+    """
+
+    def __init__(self, source):
+        self.windows: Dict[Tuple[str, str], List[Callable[[], bytes]]] = {}
+        source = Path(source)
+        if is_archive(source):
+            reader = ArchiveReader(source)
+            for user, window, request in sorted(reader.keys(), key=_request_order):
+                self.windows.setdefault((user, window), []).append(
+                    lambda k=(user, window, request): reader.get(*k))
+        else:
+            for path in sorted(source.glob("*/*/resp_*.json"), key=lambda p: _request_order(
+                    (p.parent.parent.name, p.parent.name, p.stem))):
+                self.windows.setdefault((path.parent.parent.name, path.parent.name), []).append(path.read_bytes)
+
+    def pages(self, username: Union[str, Tuple[str, ...]], lo: int, hi: int) -> List[Callable[[], bytes]]:
+        users = (username,) if isinstance(username, str) else username
+        pages = [page for user in users for page in self.windows.get((user, window_name(lo, hi)), [])]
+        return pages or [lambda: timeline_page([], None)]
+
+
+def _request_order(key: Tuple[str, str, str]):
+    user, window, request = key
+    return user, window, [int(n) for n in re.findall(r"\d+", request)]
+
+
+# -------------------- Site -------------------- #
+class FakeX:
+    def __init__(self, timeline=None, latency: float = 0.05, jitter: float = 0.0,
+                 requests_per_window: Optional[int] = None, rate_limit_reset: float = 15 * 60,
+                 rate_limit_headers: bool = True, startup: float = 0.0, performance_log: bool = True,
+                 media_per_page: int = 0, media_bytes: int = 60_000, dom_cost: float = 0.0,
+                 devtools: bool = False):
+        self.timeline = timeline or SyntheticTimeline()
+        self.latency = latency
+        self.jitter = jitter
+        self.requests_per_window = requests_per_window
+        self.rate_limit_reset = rate_limit_reset
+        self.rate_limit_headers = rate_limit_headers
+        self.startup = startup
+        self.performance_log = performance_log
+        self.media_per_page = media_per_page
+        self.media_bytes = media_bytes
+        self.dom_cost = dom_cost
+        self.devtools = devtools
+        self.stats = {"launches": 0, "navigations": 0, "pages": 0, "rate_limited": 0,
+                      "media": 0, "blocked": 0, "bytes": 0}
+        self._windows: Dict[str, Tuple[float, int]] = {}  # profile -> (reset epoch, requests used)
+        self._lock = threading.Lock()
+        self._jitter = itertools.cycle([0.0, 0.5, 0.25, 1.0, 0.75])
+
+    def launch(self, profile_dir: str) -> "FakeDriver":
+        time.sleep(self.startup)
+        with self._lock:
+            self.stats["launches"] += 1
+        return FakeDriver(self, profile_dir)
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + self.jitter * next(self._jitter)
+
+    def request(self, profile: str) -> Tuple[int, Dict[str, str]]:
+        """Count one SearchTimeline request of `profile`; returns (status, rate-limit headers)."""
+        with self._lock:
+            self.stats["pages"] += 1
+            if self.requests_per_window is None:
+                return 200, {}
+            now = time.time()
+            reset, used = self._windows.get(profile, (0.0, 0))
+            if reset <= now:
+                reset, used = now + self.rate_limit_reset, 0
+            used += 1
+            self._windows[profile] = (reset, used)
+            remaining = max(0, self.requests_per_window - used)
+            headers = {"x-rate-limit-limit": str(self.requests_per_window),
+                       "x-rate-limit-remaining": str(remaining), "x-rate-limit-reset": str(int(reset))}
+            if not self.rate_limit_headers:
+                headers = {}
+            if used > self.requests_per_window:
+                self.stats["rate_limited"] += 1
+                return 429, headers
+            return 200, headers
+
+    def is_limited(self, profile: str) -> bool:
+        with self._lock:
+            reset, used = self._windows.get(profile, (0.0, 0))
+            return self.requests_per_window is not None and reset > time.time() and used > self.requests_per_window
+
+
+class _Element:
+    text = "Something went wrong. Try reloading."
+
+
+class _SwitchTo:
+    def __init__(self, driver: "FakeDriver"):
+        self.driver = driver
+
+    def new_window(self, kind: str = "tab"):
+        self.driver.current_window_handle = self.driver._open_tab()
+
+    def window(self, handle: str):
+        if handle not in self.driver.window_handles:
+            raise LookupError(f"no such window: {handle}")
+        self.driver.current_window_handle = handle
+
+
+CELLS_KEPT = 15     # cells above the viewport the pruning script leaves (3 screens)
+HEAP_BASE_MB = 40   # JS heap of a freshly loaded x.com tab
+HEAP_PER_PAGE = 1.5  # MB per page in the current document
+HEAP_KEPT = 0.1     # share of a document's heap still held after navigating away
+
+
+class _Tab:
+    """Page state of one tab (CDP target)."""
+
+    def __init__(self, handle: str):
+        self.handle = handle
+        self.url = "about:blank"
+        self.pages: List[Callable[[], bytes]] = []
+        self.next = 0  # next page of the current search
+        self.in_flight = False
+        self.bodies: Dict[str, bytes] = {}  # getResponseBody only answers for the tab's own requests
+        self.blocked_urls: List[str] = []   # Network.setBlockedURLs patterns
+        self.dom_cells = 0      # tweet cells with content in the current document
+        self.doc_pages = 0      # pages rendered by the current document
+        self.leaked_mb = 0.0    # heap the tab kept from earlier documents
+
+
+class FakeDriver:
+    """
+    The parts of a Chrome driver the crawlers use, backed by `FakeX`. Tabs
+    (`Target.createTarget`, `switch_to`) have their own page, memory and
+    response bodies; performance log entries carry their tab's handle as
+    "webview", like chromedriver's.
+    """
+
+    def __init__(self, site: FakeX, profile_dir: str):
+        self.site = site
+        self.profile_dir = profile_dir
+        self.capabilities: dict = {}
+        self.switch_to = _SwitchTo(self)
+        self._tab_ids = itertools.count(1)
+        self._tabs: Dict[str, _Tab] = {"fake-page": _Tab("fake-page")}
+        self.current_window_handle = "fake-page"
+        self.listeners: Dict[str, List[Callable[[dict], None]]] = {}
+        self._log: List[dict] = []
+        self._finished: Dict[str, float] = {}  # request ID -> loadingFinished (monotonic)
+        self._request_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"requests": 0, "scrolls": 0, "body_reads": 0}
+        self.fetch_lags: List[float] = []  # loadingFinished -> getResponseBody, seconds
+        self.page_lags: List[float] = []   # navigation/scroll -> loadingFinished, seconds, in order
+        self.devtools = _DevTools(self) if site.devtools else None
+        if self.devtools:
+            self.capabilities["goog:chromeOptions"] = {"debuggerAddress": self.devtools.address}
+
+    @property
+    def _tab(self) -> _Tab:
+        tab = self._tabs.get(self.current_window_handle)
+        if tab is None:
+            raise LookupError(f"no such window: {self.current_window_handle}")
+        return tab
+
+    @property
+    def window_handles(self) -> List[str]:
+        return list(self._tabs)
+
+    @property
+    def current_url(self) -> str:
+        return self._tab.url
+
+    # ---- navigation ---- #
+    def get(self, url: str):
+        tab = self._tab
+        tab.url = url
+        search = parse_search(url)
+        with self._lock:
+            tab.pages, tab.next, tab.in_flight = [], 0, False
+            tab.leaked_mb += tab.doc_pages * HEAP_PER_PAGE * HEAP_KEPT
+            tab.dom_cells = tab.doc_pages = 0
+        if search is None:
+            return
+        with self.site._lock:
+            self.site.stats["navigations"] += 1
+        pages = self.site.timeline.pages(*search)
+        with self._lock:
+            tab.pages = pages
+        self._request_next(tab)
+
+    def refresh(self):
+        tab = self._tab
+        with self._lock:
+            stalled = tab.pages and not tab.in_flight and tab.next == 0
+        if stalled:
+            self._request_next(tab)
+
+    def execute_script(self, script: str, *args):
+        tab = self._tab
+        if "cellInnerDiv" in script:  # memory_watchdog.PRUNE_SCRIPT
+            with self._lock:
+                pruned = max(0, tab.dom_cells - CELLS_KEPT)
+                tab.dom_cells -= pruned
+            return pruned
+        if "scroll" in script:
+            self.stats["scrolls"] += 1
+            self._request_next(tab)
+        return None
+
+    def _request_next(self, tab: _Tab):
+        with self._lock:
+            if self._closed or tab.in_flight or tab.next >= len(tab.pages):
+                return
+            page = tab.pages[tab.next]
+            tab.next += 1
+            tab.in_flight = True
+            request_id = f"fake.{next(self._request_ids)}"
+            render_lag = tab.dom_cells * self.site.dom_cost
+        threading.Timer(self.site.delay() + render_lag, self._serve,
+                        args=(tab, request_id, page, time.monotonic())).start()
+
+    def _serve(self, tab: _Tab, request_id: str, page: Callable[[], bytes], requested: float):
+        url = f"{SEARCH_URL}?variables=%7B%7D&request={request_id}"
+        if self._request_blocked(tab, request_id, url, "XHR"):
+            with self._lock:
+                tab.in_flight = False
+            return
+        status, headers = self.site.request(self.profile_dir)
+        body = page() if status == 200 else RATE_LIMIT_BODY
+        self.stats["requests"] += 1
+        with self.site._lock:
+            self.site.stats["bytes"] += len(body)
+        with self._lock:
+            tab.bodies[request_id] = body
+        wall, mono = time.time(), time.monotonic()
+        self._emit(tab, "Network.requestWillBeSent", {
+            "requestId": request_id, "timestamp": mono, "wallTime": wall,
+            "request": {"url": url, "method": "GET", "headers": {"x-fake": "1"}},
+        })
+        self._emit(tab, "Network.responseReceived", {
+            "requestId": request_id, "timestamp": mono, "type": "XHR",
+            "response": {"url": url, "status": status, "headers": headers, "mimeType": "application/json"},
+        })
+        with self._lock:
+            tab.in_flight = False
+            self._finished[request_id] = time.monotonic()
+            tab.doc_pages += 1
+            tab.dom_cells += getattr(self.site.timeline, "per_page", 20)
+            self.page_lags.append(time.monotonic() - requested)
+        self._emit(tab, "Network.loadingFinished", {
+            "requestId": request_id, "timestamp": time.monotonic(), "encodedDataLength": len(body),
+        })
+        self._load_media(tab, request_id)
+
+    def _request_blocked(self, tab: _Tab, request_id: str, url: str, kind: str) -> bool:
+        """Emit a blocked request if a setBlockedURLs pattern matches `url`."""
+        if not any(fnmatch.fnmatchcase(url, pattern) for pattern in tab.blocked_urls):
+            return False
+        with self.site._lock:
+            self.site.stats["blocked"] += 1
+        self._emit(tab, "Network.requestWillBeSent", {
+            "requestId": request_id, "timestamp": time.monotonic(), "wallTime": time.time(),
+            "request": {"url": url, "method": "GET", "headers": {}},
+        })
+        self._emit(tab, "Network.loadingFailed", {
+            "requestId": request_id, "timestamp": time.monotonic(), "type": kind,
+            "errorText": "net::ERR_BLOCKED_BY_CLIENT", "canceled": False, "blockedReason": "inspector",
+        })
+        return True
+
+    def _load_media(self, tab: _Tab, page_request_id: str):
+        """The images, videos and fonts the rendered tweets of a page would pull in."""
+        for i in range(self.site.media_per_page):
+            request_id = f"{page_request_id}.media{i}"
+            url = MEDIA_URLS[i % len(MEDIA_URLS)].format(n=f"{page_request_id.split('.')[-1]}{i}")
+            if self._request_blocked(tab, request_id, url, "Image"):
+                continue
+            with self.site._lock:
+                self.site.stats["media"] += 1
+                self.site.stats["bytes"] += self.site.media_bytes
+            self._emit(tab, "Network.requestWillBeSent", {
+                "requestId": request_id, "timestamp": time.monotonic(), "wallTime": time.time(),
+                "request": {"url": url, "method": "GET", "headers": {}},
+            })
+            self._emit(tab, "Network.responseReceived", {
+                "requestId": request_id, "timestamp": time.monotonic(), "type": "Image",
+                "response": {"url": url, "status": 200, "headers": {}, "mimeType": "image/jpeg"},
+            })
+            self._emit(tab, "Network.loadingFinished", {
+                "requestId": request_id, "timestamp": time.monotonic(), "encodedDataLength": self.site.media_bytes,
+            })
+
+    def _emit(self, tab: _Tab, method: str, params: dict):
+        event = {"method": method, "params": params}
+        if self.site.performance_log:
+            with self._lock:
+                self._log.append({"level": "INFO", "timestamp": int(time.time() * 1000),
+                                  "message": json.dumps({"message": event, "webview": tab.handle})})
+        for callback in self.listeners.get(method, []) + self.listeners.get("*", []):
+            callback(event)
+        if self.devtools:
+            self.devtools.emit(tab.handle, event)
+
+    # ---- CDP ---- #
+    def add_cdp_listener(self, event: str, callback: Callable[[dict], None]):
+        self.listeners.setdefault(event, []).append(callback)
+
+    def execute_cdp_cmd(self, cmd: str, params: Mapping) -> dict:
+        if cmd == "Target.createTarget":
+            return {"targetId": self._open_tab()}
+        if cmd == "Target.closeTarget":
+            with self._lock:
+                return {"success": self._tabs.pop(params["targetId"], None) is not None}
+        tab = self._tab
+        if cmd == "Page.navigate":
+            self.get(params["url"])
+            return {"frameId": tab.handle}
+        if cmd == "Page.reload":
+            self.refresh()
+            return {}
+        if cmd == "Network.setBlockedURLs":
+            tab.blocked_urls = list(params["urls"])
+            return {}
+        if cmd == "Performance.getMetrics":
+            with self._lock:
+                heap = HEAP_BASE_MB + tab.leaked_mb + tab.doc_pages * HEAP_PER_PAGE
+                nodes = 1500 + 60 * tab.dom_cells
+            return {"metrics": [{"name": "JSHeapUsedSize", "value": heap * 1e6},
+                                {"name": "Nodes", "value": nodes},
+                                {"name": "JSEventListeners", "value": nodes // 4}]}
+        if cmd == "Network.getResponseBody":
+            return self._response_body(tab, params["requestId"])
+        return {}
+
+    def _response_body(self, tab: _Tab, request_id: str) -> dict:
+        with self._lock:
+            body = tab.bodies.pop(request_id, None)
+            finished = self._finished.pop(request_id, None) if body is not None else None
+            if finished is not None:
+                self.fetch_lags.append(time.monotonic() - finished)
+            self.stats["body_reads"] += 1
+        if body is None:
+            raise KeyError(f"No resource with given identifier found: {request_id}")
+        return {"body": body.decode("utf-8"), "base64Encoded": False}
+
+    def get_log(self, kind: str) -> List[dict]:
+        with self._lock:
+            entries, self._log = self._log, []
+        return entries
+
+    # ---- page ---- #
+    def find_element(self, by: str, value: str):
+        if "Something went wrong" in value and self.site.is_limited(self.profile_dir):
+            return _Element()
+        raise LookupError(f"no such element: {value}")
+
+    def get_cookies(self) -> List[dict]:
+        return [{"name": "ct0", "value": "fake"}, {"name": "auth_token", "value": "fake"}]
+
+    def _open_tab(self) -> str:
+        handle = f"fake-page-{next(self._tab_ids)}"
+        with self._lock:
+            self._tabs[handle] = _Tab(handle)
+        return handle
+
+    def close(self):
+        """Close the current tab; switch to another one before the next command."""
+        with self._lock:
+            self._tabs.pop(self.current_window_handle, None)
+
+    def quit(self):
+        with self._lock:
+            self._closed = True
+        if self.devtools:
+            self.devtools.close()
+
+
+class _DevTools:
+    """A FakeDriver's DevTools endpoint: one asyncio loop thread and websocket server per browser."""
+
+    def __init__(self, driver: FakeDriver):
+        try:
+            from websockets.asyncio.server import serve
+        except ImportError as e:
+            raise ImportError("fake_driver's DevTools endpoint needs websockets: pip install websockets") from e
+        self.driver = driver
+        self.loop = asyncio.new_event_loop()
+        self._session_ids = itertools.count(1)
+        self._sessions: Dict[str, Tuple[str, asyncio.Queue]] = {}  # session ID -> (tab handle, outbox)
+        threading.Thread(target=self.loop.run_forever, name="fake-devtools", daemon=True).start()
+
+        async def start():
+            return await serve(self._connection, "127.0.0.1", 0, process_request=self._http, max_size=None)
+
+        self.server = asyncio.run_coroutine_threadsafe(start(), self.loop).result(10)
+        port = self.server.sockets[0].getsockname()[1]
+        self.address = f"127.0.0.1:{port}"
+
+    def _http(self, connection, request):
+        if request.path == "/json/version":
+            return connection.respond(200, json.dumps({
+                "Browser": "Chrome/140.0.0.0", "Protocol-Version": "1.3",
+                "webSocketDebuggerUrl": f"ws://{self.address}/devtools/browser/fake"}))
+        return None
+
+    async def _connection(self, ws):
+        outbox: asyncio.Queue = asyncio.Queue()
+        writer = asyncio.ensure_future(self._write(ws, outbox))
+        sessions: List[str] = []
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                reply = {"id": msg["id"]}
+                if msg.get("sessionId"):
+                    reply["sessionId"] = msg["sessionId"]
+                try:
+                    reply["result"] = self._command(msg, outbox, sessions)
+                except Exception as e:
+                    reply["error"] = {"code": -32000, "message": str(e)}
+                outbox.put_nowait(reply)
+        except Exception:
+            pass  # the client went away
+        finally:
+            for session_id in sessions:
+                self._sessions.pop(session_id, None)
+            writer.cancel()
+
+    async def _write(self, ws, outbox: asyncio.Queue):
+        # one writer per socket keeps events and replies in the order they were produced
+        while True:
+            await ws.send(json.dumps(await outbox.get()))
+
+    def _command(self, msg: dict, outbox: asyncio.Queue, sessions: List[str]) -> dict:
+        method, params = msg["method"], msg.get("params", {})
+        if method == "Target.attachToTarget":
+            if params["targetId"] not in self.driver._tabs:
+                raise LookupError(f"No target with given id found: {params['targetId']}")
+            session_id = f"fake-session-{next(self._session_ids)}"
+            self._sessions[session_id] = (params["targetId"], outbox)
+            sessions.append(session_id)
+            return {"sessionId": session_id}
+        if method == "Target.detachFromTarget":
+            self._sessions.pop(params.get("sessionId"), None)
+            return {}
+        session = self._sessions.get(msg.get("sessionId"))
+        if session is None:
+            return {}  # browser-level commands
+        tab = self.driver._tabs.get(session[0])
+        if tab is None:
+            raise LookupError("Target closed")
+        if method == "Network.getResponseBody":
+            return self.driver._response_body(tab, params["requestId"])
+        return {}  # Network.enable and other switches
+
+    def emit(self, handle: str, event: dict):
+        """Push an event (from any thread) to the sessions attached to tab `handle`."""
+        for session_id, (target, outbox) in list(self._sessions.items()):
+            if target == handle:
+                self.loop.call_soon_threadsafe(outbox.put_nowait, {**event, "sessionId": session_id})
+
+    def close(self):
+        async def stop():
+            self.server.close()
+            await self.server.wait_closed()
+        try:
+            asyncio.run_coroutine_threadsafe(stop(), self.loop).result(5)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,40 @@
+"""
+Advisory file locks between crawler processes on one host.
+
+Several crawlers (see job_queue.py) may share the response archive, the tweet
+ID index and rate_budget.json. These helpers wrap `fcntl.flock`: locks are
+held by an open file and vanish with the process that held them, so a lock
+that can be taken means its previous owner is gone. Without `fcntl`
+(Windows) they do nothing, and those files must not be shared.
+"""
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def try_lock(f) -> bool:
+    """Take an exclusive lock on the open file `f` without waiting; False if another process holds it."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+@contextmanager
+def locked(path):
+    """Hold an exclusive lock on the lock file `path` (created if missing), waiting for it if needed."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # closing the descriptor releases the lock
@@ -0,0 +1,172 @@
+"""
+Cursor-paginated replay of X's SearchTimeline GraphQL endpoint.
+
+The browser only bootstraps the crawl: once it has issued the first
+SearchTimeline request, its URL (variables/features) and headers are reused
+here and later pages are requested directly with the page's bottom cursor
+over one keep-alive HTTP connection, so no scrolling or render waits are
+involved.
+
+`serve_recorded_pages` starts a local stand-in server that answers with
+previously captured `resp_*.json` pages, chained by their bottom cursors, and
+optionally runs out of requests like X does (HTTP 429).
+"""
+
+import http.client
+import json
+import logging
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from body_decode import DecodedBody, decode_bytes, decompress
+from timeline import bottom_cursor
+
+logger = logging.getLogger("tweet_crawler")
+
+# Headers Chrome reports that must not be replayed verbatim.
+_DROP_HEADERS = {"host", "content-length", "connection", "accept-encoding", "cookie"}
+
+
+# -------------------- Helpers -------------------- #
+def cookie_header(cookies: List[dict]) -> str:
+    """Build a Cookie header from `driver.get_cookies()` output."""
+    return "; ".join(f"{c['name']}={c['value']}" for c in cookies if "name" in c and "value" in c)
+
+
+# -------------------- Replayer -------------------- #
+class TimelineReplayer:
+    """
+    Re-issues a captured SearchTimeline request with a different cursor.
+
+    `request_url` and `headers` come from the browser's own request
+    (`Network.requestWillBeSent`); `cookies` is the Cookie header value.
+    """
+
+    def __init__(self, request_url: str, headers: Dict[str, str], cookies: str = "", timeout: float = 30):
+        parts = urllib.parse.urlsplit(request_url)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.path = parts.path
+        self.params = dict(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+        self.variables = json.loads(self.params.get("variables", "{}"))
+        self.headers = {k: v for k, v in headers.items() if not k.startswith(":") and k.lower() not in _DROP_HEADERS}
+        self.headers["accept-encoding"] = "gzip"
+        if cookies:
+            self.headers["cookie"] = cookies
+        self.timeout = timeout
+        self.last_headers: Dict[str, str] = {}  # of the latest response (x-rate-limit-* etc.)
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def page_path(self, cursor: Optional[str]) -> str:
+        variables = dict(self.variables)
+        if cursor:
+            variables["cursor"] = cursor
+        else:
+            variables.pop("cursor", None)
+        params = dict(self.params, variables=json.dumps(variables, separators=(",", ":")))
+        return self.path + "?" + urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            self._conn = cls(self.netloc, timeout=self.timeout)
+        return self._conn
+
+    def fetch(self, cursor: Optional[str]) -> Tuple[int, bytes]:
+        """GET one page; the connection is reused and reopened once if the server dropped it."""
+        path = self.page_path(cursor)
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("GET", path, headers=self.headers)
+                resp = conn.getresponse()
+                self.last_headers = dict(resp.getheaders())
+                return resp.status, decompress(resp.read())
+            except (http.client.HTTPException, ConnectionError, OSError):
+                self.close()
+                if attempt:
+                    raise
+        raise RuntimeError("unreachable")
+
+    def iter_pages(self, cursor: Optional[str], max_pages: int) -> Iterator[Tuple[int, DecodedBody]]:
+        """
+        Yield (status, decoded body) for up to `max_pages` pages starting at `cursor`.
+        Stops on a non-200 status, an unparsable page, or a cursor that does not advance.
+        """
+        for _ in range(max_pages):
+            status, raw = self.fetch(cursor)
+            page = decode_bytes(raw)
+            yield status, page
+            if status != 200 or not page.ok:
+                return
+            next_cursor = bottom_cursor(page.data)
+            if not next_cursor or next_cursor == cursor:
+                return
+            cursor = next_cursor
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# -------------------- Local stub server -------------------- #
+def serve_recorded_pages(directory, host: str = "127.0.0.1", port: int = 0,
+                         rate_limit_after: Optional[int] = None):
+    """
+    Serve recorded SearchTimeline pages from `directory` (sorted `resp_*.json`).
+    A request without a cursor gets the first page; a request whose cursor is
+    page N's bottom cursor gets page N+1, an unknown cursor a 404. With
+    `rate_limit_after`, requests after that many pages get X's 429 answer.
+    Returns (server, base_url); the server runs on a daemon thread until
+    `server.shutdown()`.
+    """
+    pages = [p.read_bytes() for p in sorted(Path(directory).glob("resp_*.json"))]
+    by_cursor = {}
+    for i, body in enumerate(pages[:-1]):
+        cursor = bottom_cursor(json.loads(body))
+        if cursor:
+            by_cursor[cursor] = pages[i + 1]
+
+    served = []
+    served_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            variables = json.loads(query.get("variables", ["{}"])[0])
+            cursor = variables.get("cursor")
+            body = pages[0] if not cursor else by_cursor.get(cursor)
+            with served_lock:
+                limited = rate_limit_after is not None and len(served) >= rate_limit_after
+                if body is not None and not limited:
+                    served.append(cursor)
+            if limited:
+                self.send_response(429)
+                self.send_header("x-rate-limit-remaining", "0")
+                self.send_header("x-rate-limit-reset", str(int(time.time()) + 900))
+                body = b'{"errors":[{"code":88,"message":"Rate limit exceeded"}]}'
+            elif body is None:
+                self.send_response(404)
+                body = b"{}"
+            else:
+                self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            logger.debug("stub server: " + fmt % args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.served = served  # cursors of the pages answered, in order
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/i/api/graphql/stub/SearchTimeline"
+    return server, base_url
@@ -0,0 +1,363 @@
+"""
+Persistent tweet ID index used to drop tweets that were already captured.
+
+Layout of an index directory:
+
+- `ids.u64`   sorted uint64 snowflake IDs, memory-mapped and binary-searched
+- `ids.log`   uint64 IDs added since the last compaction (loaded into a set)
+- `bloom.bin` Bloom filter over both, so most lookups of new IDs never touch
+              the sorted file
+- `index.lock` `file_lock` taken to append to the log and to swap in a compaction
+
+Memory use is the Bloom filter (~1.2 bytes per ID at 1% false positives) plus
+the not-yet-compacted log, not a Python set of every ID. The filter is sized
+for `expected_ids` and rebuilt twice as large only once it holds more IDs
+than it was sized for. The log is merged into `ids.u64` every `compact_every`
+additions: the streaming merge runs without blocking lookups and additions,
+which are only held up for the atomic replace. One `TweetIdIndex` may be
+shared by threads of one process, and crawler processes on one host may
+share the directory: each picks up the IDs the others appended (and their
+compactions) whenever it adds IDs or calls `refresh()`.
+"""
+
+import heapq
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from file_lock import locked
+from timeline import entry_tweet_ids, timeline_instructions
+
+_MASK = (1 << 64) - 1
+_ITEM = array("Q").itemsize
+_BLOOM_HEADER = struct.Struct("<QQQQ")  # bits, hashes, ids covered, capacity
+
+
+def _mix(x: int) -> int:
+    """splitmix64 finaliser; spreads sequential snowflake IDs over the filter."""
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK
+    return x ^ (x >> 31)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.m = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, x: int):
+        h = _mix(x)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, x: int):
+        bits = self.bits
+        for pos in self._positions(x):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, x: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(x))
+
+    def save(self, path: Path, covered: int):
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_BLOOM_HEADER.pack(self.m, self.k, covered, self.capacity))
+            f.write(self.bits)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path):
+        """Return (filter, ids covered) or (None, -1) if missing/corrupt."""
+        try:
+            with open(path, "rb") as f:
+                m, k, covered, capacity = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+                bits = bytearray(f.read())
+        except (OSError, struct.error):
+            return None, -1
+        if len(bits) != (m + 7) // 8:
+            return None, -1
+        bloom = cls.__new__(cls)
+        bloom.m, bloom.k, bloom.bits, bloom.capacity = m, k, bits, capacity
+        return bloom, covered
+
+
+class TweetIdIndex:
+    def __init__(self, root, expected_ids: int = 10_000_000, compact_every: int = 1_000_000):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.base_path = self.root / "ids.u64"
+        self.log_path = self.root / "ids.log"
+        self.bloom_path = self.root / "bloom.bin"
+        self.lock_path = self.root / "index.lock"
+        self.expected_ids = expected_ids
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._compacting = False
+        self._mm = None
+        self._base = memoryview(b"").cast("Q")
+        with locked(self.lock_path):
+            self._open_base()
+            self._recent = self._read_log()
+            self._log = open(self.log_path, "ab")
+            self._open_bloom()
+
+    # ---- loading ---- #
+    def _open_base(self):
+        self._base_stamp = _stamp(self.base_path)
+        if self._mm is not None:
+            self._base.release()
+            self._mm.close()
+            self._mm = None
+            self._base = memoryview(b"").cast("Q")
+        if self.base_path.exists() and self.base_path.stat().st_size >= _ITEM:
+            with open(self.base_path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._base = memoryview(self._mm).cast("Q")
+
+    def _read_log(self) -> set:
+        self._log_size = 0
+        if not self.log_path.exists():
+            return set()
+        size = self.log_path.stat().st_size
+        if size % _ITEM:
+            with open(self.log_path, "r+b") as f:  # torn final record
+                f.truncate(size - size % _ITEM)
+        ids = array("Q")
+        with open(self.log_path, "rb") as f:
+            ids.frombytes(f.read())
+        self._log_size = len(ids) * _ITEM
+        return set(ids)
+
+    def _sync(self):
+        """Pick up what other processes did since the last sync; needs both locks."""
+        if _stamp(self.base_path) != self._base_stamp:  # another process compacted
+            self._open_base()
+            self._recent = self._read_log()
+            bloom, _ = BloomFilter.load(self.bloom_path)  # saved by that process, covers the new base
+            if bloom is None or len(self) > bloom.capacity:
+                self._open_bloom()
+                return
+            for x in self._recent:
+                bloom.add(x)
+            self._bloom = bloom
+            return
+        size = self.log_path.stat().st_size
+        if size <= self._log_size:
+            return
+        ids = array("Q")
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_size)
+            ids.frombytes(f.read(size - self._log_size))
+        self._log_size = size
+        self._recent.update(ids)
+        for x in ids:
+            self._bloom.add(x)
+
+    def refresh(self):
+        """Learn the IDs other processes added to the directory since the last call."""
+        with self._lock, locked(self.lock_path):
+            self._sync()
+
+    def _open_bloom(self):
+        total = len(self._base) + len(self._recent)
+        bloom, covered = BloomFilter.load(self.bloom_path)
+        if bloom is None or covered != total or total > bloom.capacity:
+            bloom = BloomFilter(max(self.expected_ids, total * 2))
+            for x in self._base:
+                bloom.add(x)
+            for x in self._recent:
+                bloom.add(x)
+            bloom.save(self.bloom_path, total)
+        self._bloom = bloom
+
+    # ---- lookups ---- #
+    def __len__(self) -> int:
+        return len(self._base) + len(self._recent)
+
+    def _in_base(self, x: int) -> bool:
+        i = bisect_left(self._base, x)
+        return i < len(self._base) and self._base[i] == x
+
+    def _known(self, x: int) -> bool:
+        if x not in self._bloom:
+            return False
+        return x in self._recent or self._in_base(x)
+
+    def __contains__(self, tweet_id) -> bool:
+        try:
+            x = int(tweet_id)
+        except (TypeError, ValueError):
+            return False
+        with self._lock:
+            return self._known(x)
+
+    def add(self, tweet_id) -> bool:
+        """Record `tweet_id`; True if it was not in the index before."""
+        return bool(self.add_many([tweet_id]))
+
+    def add_many(self, tweet_ids: Iterable) -> List:
+        """Record IDs and return those that were new, in input order."""
+        new, fresh = [], array("Q")
+        with self._lock, locked(self.lock_path):
+            self._sync()
+            for tid in tweet_ids:
+                try:
+                    x = int(tid)
+                except (TypeError, ValueError):
+                    continue
+                if self._known(x):
+                    continue
+                self._recent.add(x)
+                self._bloom.add(x)
+                fresh.append(x)
+                new.append(tid)
+            if fresh:
+                fresh.tofile(self._log)
+                self._log.flush()
+                self._log_size += len(fresh) * _ITEM
+            compact = len(self._recent) >= self.compact_every and not self._compacting
+        if compact:
+            self.compact()
+        return new
+
+    # ---- maintenance ---- #
+    def compact(self):
+        """
+        Merge the log into `ids.u64`. The merge works on a snapshot of the log
+        outside the locks; IDs added meanwhile (by any process) stay in the
+        log. A filter that outgrew its capacity is rebuilt alongside. If
+        another process compacted first, this merge is dropped.
+        """
+        with self._lock:
+            if self._compacting or not self._recent:
+                return
+            with locked(self.lock_path):
+                self._sync()
+            self._compacting = True
+            snapshot = sorted(self._recent)
+            logged, stamp = self._log_size, self._base_stamp
+            bloom = self._bloom
+        tmp = self.base_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            total = self._merge(snapshot, tmp)
+            if total > bloom.capacity:
+                bloom = BloomFilter(max(self.expected_ids, total * 2))
+                for x in _read_ids(tmp):
+                    bloom.add(x)
+            with self._lock, locked(self.lock_path):
+                if _stamp(self.base_path) != stamp:
+                    tmp.unlink()
+                    self._sync()
+                    return
+                os.replace(tmp, self.base_path)
+                self._log.close()
+                with open(self.log_path, "r+b") as f:  # keep only what was added during the merge
+                    f.seek(logged)
+                    tail = array("Q")
+                    tail.frombytes(f.read())
+                    f.seek(0)
+                    tail.tofile(f)
+                    f.truncate()
+                self._log = open(self.log_path, "ab")
+                self._log_size = len(tail) * _ITEM
+                self._recent = set(tail)
+                if bloom is not self._bloom:
+                    self._bloom = bloom
+                for x in tail:
+                    self._bloom.add(x)
+                self._open_base()
+                self._bloom.save(self.bloom_path, len(self._base) + len(self._recent))
+        finally:
+            self._compacting = False
+
+    def _merge(self, snapshot: List[int], tmp: Path) -> int:
+        """Write `ids.u64` merged with the sorted `snapshot` to `tmp`; returns the number of IDs."""
+        count = 0
+        with open(tmp, "wb") as f:
+            chunk, prev = array("Q"), None
+            for x in heapq.merge(_read_ids(self.base_path), snapshot):
+                if x == prev:  # log left over from a compaction interrupted after the replace
+                    continue
+                prev = x
+                chunk.append(x)
+                if len(chunk) >= 1 << 16:
+                    chunk.tofile(f)
+                    count += len(chunk)
+                    chunk = array("Q")
+            chunk.tofile(f)
+            count += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        return count
+
+    def close(self):
+        with self._lock, locked(self.lock_path):
+            self._sync()  # the saved filter must cover the current base
+            self._log.close()
+            self._bloom.save(self.bloom_path, len(self._base) + len(self._recent))
+            self._base.release()
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+
+
+def _stamp(path: Path) -> Optional[Tuple[int, int, int]]:
+    """Identity of a file version: a compaction replaces `ids.u64` with a new file."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _read_ids(path: Path) -> Iterator[int]:
+    """The IDs of a uint64 file, read in chunks (nothing if it does not exist)."""
+    if not path.exists():
+        return
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(_ITEM << 16)
+            if not data:
+                return
+            chunk = array("Q")
+            chunk.frombytes(data)
+            yield from chunk
+
+
+# -------------------- Page filtering -------------------- #
+def drop_seen_entries(data: dict, index: TweetIdIndex) -> Tuple[list, int]:
+    """
+    Remove TimelineAddEntries entries whose tweets are all in `index`, in place.
+    Only the tweets an entry is about count, not the tweets they quote or
+    retweet: a new tweet quoting a captured one is kept, and the quoted tweet
+    is not recorded as seen. Entries without tweets (cursors etc.) are kept.
+    Returns (IDs of the tweets that are new, number of entries dropped); the
+    caller adds the new IDs to the index once the page is safely stored.
+    """
+    index.refresh()
+    new_ids, dropped = {}, 0
+    for inst in timeline_instructions(data):
+        if inst.get("type") != "TimelineAddEntries":
+            continue
+        kept = []
+        for entry in inst.get("entries", []):
+            ids = entry_tweet_ids(entry)
+            fresh = [i for i in ids if i and i not in new_ids and i not in index]
+            if ids and not fresh:
+                dropped += 1
+                continue
+            new_ids.update(dict.fromkeys(fresh))
+            kept.append(entry)
+        inst["entries"] = kept
+    return list(new_ids), dropped
@@ -0,0 +1,317 @@
+"""
+Leased crawl jobs and profiles in one SQLite database, shared by crawler hosts.
+
+The per-user crawl_state_<user>.json files only work for one crawler process.
+A `JobQueue` keeps every (user, since, until) window as a row with its status,
+the tweets and pages it captured and its resume checkpoint (oldest tweet ID,
+last cursor), next to a lease table for profiles:
+
+- `claim()` hands a pending window to one worker for `lease_seconds`; a
+  window whose lease ran out (crashed or disconnected host) is pending again
+  and is resumed below its checkpoint by whoever claims it next
+- `checkpoint()` records progress and extends the lease (the crawler renews
+  its profile lease at the same time), `finish()` marks a
+  window done and queues its follow-up windows (split or rate-limited
+  remainder) in the same transaction, `release()` gives it back untouched,
+  `fail()` parks a window that cannot be captured (no response, or over the
+  page cap and too short to split) until `retry_failed()`
+- `lease_profile()` / `release_profile()` keep two hosts from logging in
+  with the same profile at once and carry its rate-limit rest between them
+- `progress()` answers "what's left" per user from the index, without
+  scanning output directories
+
+The database runs in WAL mode, and every state change is a short
+`BEGIN IMMEDIATE` transaction, so any number of threads and processes can use
+it. Hosts on other machines need the file on storage with working locks
+(a local disk or a proper network file system, not SMB or NFS without
+locking). Run `python job_queue.py crawl_jobs.sqlite` for a status report.
+"""
+
+import argparse
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("tweet_crawler")
+
+Window = Tuple[str, str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    user TEXT NOT NULL,
+    since TEXT NOT NULL,
+    until TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending, leased, done, failed
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    tweets INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0,
+    oldest_id TEXT,
+    cursor TEXT,
+    updated REAL,
+    PRIMARY KEY (user, since, until)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, lease_expires);
+CREATE TABLE IF NOT EXISTS profiles (
+    profile TEXT PRIMARY KEY,
+    owner TEXT,
+    lease_expires REAL,
+    ready_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Job:
+    """One claimed window; `oldest_id` / `cursor` are set when an earlier lease got part of it."""
+
+    __slots__ = ("user", "since", "until", "owner", "attempts", "oldest_id", "cursor")
+
+    def __init__(self, user: str, since: str, until: str, owner: str, attempts: int,
+                 oldest_id: Optional[str] = None, cursor: Optional[str] = None):
+        self.user = user
+        self.since = since
+        self.until = until
+        self.owner = owner
+        self.attempts = attempts
+        self.oldest_id = int(oldest_id) if oldest_id else None
+        self.cursor = cursor
+
+    @property
+    def window(self) -> Window:
+        return self.since, self.until
+
+    def __repr__(self):
+        return f"Job({self.user} {self.since} → {self.until}, attempt {self.attempts})"
+
+
+class JobQueue:
+    def __init__(self, path="crawl_jobs.sqlite", lease_seconds: float = 10 * 60, owner: Optional[str] = None):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.owner = owner or default_owner()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    @contextmanager
+    def _write(self):
+        """One short write transaction; BEGIN IMMEDIATE takes the lock up front, so claims never race."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # ---- jobs ---- #
+    def has_user(self, user: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM jobs WHERE user = ? LIMIT 1", (user,)).fetchone() is not None
+
+    def add(self, user: str, windows: Iterable[Window]) -> int:
+        """Queue windows of `user`; windows already in the queue (in any state) are left alone."""
+        now = time.time()
+        with self._write() as db:
+            before = db.total_changes
+            db.executemany("INSERT OR IGNORE INTO jobs (user, since, until, updated) VALUES (?, ?, ?, ?)",
+                           [(user, since, until, now) for since, until in windows])
+            return db.total_changes - before
+
+    def claim(self, users: Optional[Sequence[str]] = None) -> Optional[Job]:
+        """
+        Lease the next pending window (newest first per user, users in name
+        order), or one whose lease has expired; None if nothing is claimable.
+        """
+        now = time.time()
+        user_filter, args = "", [now]
+        if users:
+            user_filter = f" AND user IN ({','.join('?' * len(users))})"
+            args += list(users)
+        with self._write() as db:
+            row = db.execute(
+                "SELECT user, since, until, status, owner, attempts, oldest_id, cursor FROM jobs"
+                " WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?))" + user_filter +
+                " ORDER BY user, until DESC LIMIT 1", args).fetchone()
+            if row is None:
+                return None
+            user, since, until, status, previous, attempts, oldest_id, cursor = row
+            db.execute("UPDATE jobs SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1,"
+                       " updated = ? WHERE user = ? AND since = ? AND until = ?",
+                       (self.owner, now + self.lease_seconds, now, user, since, until))
+        if status == "leased":
+            logger.warning(f"Lease of {user} {since} → {until} held by {previous} expired, taking it over")
+        return Job(user, since, until, self.owner, attempts + 1, oldest_id, cursor)
+
+    def checkpoint(self, job: Job, oldest_id: Optional[int], cursor: Optional[str]) -> bool:
+        """Record how far `job` got and extend its lease; False if the lease was lost to another worker."""
+        now = time.time()
+        with self._write() as db:
+            changed = db.execute(
+                "UPDATE jobs SET oldest_id = ?, cursor = ?, lease_expires = ?, updated = ?"
+                " WHERE user = ? AND since = ? AND until = ? AND status = 'leased' AND owner = ?",
+                (str(oldest_id) if oldest_id else None, cursor, now + self.lease_seconds, now,
+                 job.user, job.since, job.until, job.owner)).rowcount
+        if not changed:
+            logger.warning(f"Lost the lease of {job}")
+        return bool(changed)
+
+    def finish(self, job: Job, tweets: int = 0, pages: int = 0, follow_up: Iterable[Window] = ()) -> bool:
+        """
+        Mark `job` done with what it captured and queue the windows still to do
+        in its range; False (and nothing changed) if the lease was lost to
+        another worker, which now owns the window.
+        """
+        now = time.time()
+        with self._write() as db:
+            changed = db.execute(
+                "UPDATE jobs SET status = 'done', owner = NULL, lease_expires = NULL,"
+                " tweets = tweets + ?, pages = pages + ?, updated = ?"
+                " WHERE user = ? AND since = ? AND until = ? AND status = 'leased' AND owner = ?",
+                (tweets, pages, now, job.user, job.since, job.until, job.owner)).rowcount
+            if changed:
+                db.executemany("INSERT OR IGNORE INTO jobs (user, since, until, updated) VALUES (?, ?, ?, ?)",
+                               [(job.user, since, until, now) for since, until in follow_up])
+        if not changed:
+            logger.warning(f"Lost the lease of {job} before it finished; leaving the window to its new owner")
+        return bool(changed)
+
+    def release(self, job: Job):
+        """Give a job back as it is, e.g. after an error or on shutdown."""
+        with self._write() as db:
+            db.execute("UPDATE jobs SET status = 'pending', owner = NULL, lease_expires = NULL, updated = ?"
+                       " WHERE user = ? AND since = ? AND until = ? AND status = 'leased' AND owner = ?",
+                       (time.time(), job.user, job.since, job.until, job.owner))
+
+    def fail(self, job: Job, reason: str):
+        """Park `job` as failed; it is not claimed again until `retry_failed()`."""
+        with self._write() as db:
+            db.execute("UPDATE jobs SET status = 'failed', owner = NULL, lease_expires = NULL, updated = ?"
+                       " WHERE user = ? AND since = ? AND until = ? AND status = 'leased' AND owner = ?",
+                       (time.time(), job.user, job.since, job.until, job.owner))
+        logger.warning(f"{job} failed: {reason}")
+
+    def retry_failed(self) -> int:
+        """Put every failed window back to pending; returns how many."""
+        with self._write() as db:
+            return db.execute("UPDATE jobs SET status = 'pending', updated = ? WHERE status = 'failed'",
+                              (time.time(),)).rowcount
+
+    def recover(self) -> int:
+        """Put every window with an expired lease back to pending; returns how many."""
+        now = time.time()
+        with self._write() as db:
+            return db.execute("UPDATE jobs SET status = 'pending', owner = NULL, lease_expires = NULL, updated = ?"
+                              " WHERE status = 'leased' AND lease_expires < ?", (now, now)).rowcount
+
+    def done_windows(self, user: str) -> List[Window]:
+        with self._lock:
+            return self._db.execute("SELECT since, until FROM jobs WHERE user = ? AND status = 'done'",
+                                    (user,)).fetchall()
+
+    def progress(self, users: Optional[Sequence[str]] = None) -> Dict[str, dict]:
+        """Per user: windows pending / leased / done / failed, tweets and pages captured."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT user, status, COUNT(*), SUM(tweets), SUM(pages) FROM jobs GROUP BY user, status").fetchall()
+        out: Dict[str, dict] = {}
+        for user, status, count, tweets, pages in rows:
+            if users and user not in users:
+                continue
+            entry = out.setdefault(user, {"pending": 0, "leased": 0, "done": 0, "failed": 0,
+                                          "tweets": 0, "pages": 0})
+            entry[status] = count
+            entry["tweets"] += tweets or 0
+            entry["pages"] += pages or 0
+        return out
+
+    def remaining(self, users: Optional[Sequence[str]] = None) -> int:
+        """Windows still to capture, leased ones included (failed ones are not)."""
+        return sum(p["pending"] + p["leased"] for p in self.progress(users).values())
+
+    # ---- profiles ---- #
+    def lease_profile(self, candidates: Sequence[str]) -> Optional[str]:
+        """
+        Lease the candidate that has rested longest and is neither rate limited
+        nor leased by another worker; None if none is available right now.
+        """
+        now = time.time()
+        with self._write() as db:
+            db.executemany("INSERT OR IGNORE INTO profiles (profile) VALUES (?)", [(p,) for p in candidates])
+            row = db.execute(
+                f"SELECT profile FROM profiles WHERE profile IN ({','.join('?' * len(candidates))})"
+                " AND ready_at <= ? AND (owner IS NULL OR lease_expires < ?) ORDER BY ready_at LIMIT 1",
+                [*candidates, now, now]).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE profiles SET owner = ?, lease_expires = ? WHERE profile = ?",
+                       (self.owner, now + self.lease_seconds, row[0]))
+        return row[0]
+
+    def renew_profile(self, profile: str) -> bool:
+        """Extend our lease of `profile`; False if we do not hold it (any more)."""
+        with self._write() as db:
+            return bool(db.execute("UPDATE profiles SET lease_expires = ? WHERE profile = ? AND owner = ?",
+                                   (time.time() + self.lease_seconds, profile, self.owner)).rowcount)
+
+    def release_profile(self, profile: str, ready_at: float = 0.0):
+        """Hand a profile back; other workers leave it alone until `ready_at` (its rate-limit reset)."""
+        with self._write() as db:
+            db.execute("UPDATE profiles SET owner = NULL, lease_expires = NULL, ready_at = ?"
+                       " WHERE profile = ? AND owner = ?", (ready_at, profile, self.owner))
+
+    def profile_ready_at(self, profiles: Sequence[str]) -> float:
+        """Earliest time one of `profiles` may become available (now if one is free)."""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT ready_at, owner, lease_expires FROM profiles WHERE profile IN ({','.join('?' * len(profiles))})",
+                list(profiles)).fetchall()
+        if len(rows) < len(profiles):
+            return now
+        return min(max(ready, lease if owner else 0.0) for ready, owner, lease in rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the state of a crawl job queue.")
+    parser.add_argument("path", nargs="?", default="crawl_jobs.sqlite")
+    parser.add_argument("--recover", action="store_true", help="return windows with expired leases to pending")
+    parser.add_argument("--retry-failed", action="store_true", help="return failed windows to pending")
+    args = parser.parse_args()
+
+    jobs = JobQueue(args.path)
+    if args.recover:
+        print(f"{jobs.recover()} expired leases recovered")
+    if args.retry_failed:
+        print(f"{jobs.retry_failed()} failed windows queued again")
+    print(f"{'user':24} {'pending':>8} {'leased':>8} {'done':>8} {'failed':>8} {'tweets':>10} {'pages':>8}")
+    for user, p in sorted(jobs.progress().items()):
+        print(f"{user:24} {p['pending']:8} {p['leased']:8} {p['done']:8} {p['failed']:8} {p['tweets']:10} {p['pages']:8}")
+    now = time.time()
+    for profile, owner, expires, ready_at in jobs._db.execute("SELECT * FROM profiles ORDER BY profile"):
+        state = f"leased by {owner}" if owner and expires and expires > now else "free"
+        if ready_at > now:
+            state += f", resting {ready_at - now:.0f}s"
+        print(f"profile {profile}: {state}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Lean capture mode: a Chrome that only loads what the SearchTimeline needs.
+
+The crawlers keep GraphQL JSON and nothing else, but a full browser scrolling
+x.com also downloads every image, avatar, video segment and web font. In lean
+mode
+
+- `chrome_args()` trims the launch flags: a small window instead of a
+  maximized one, no GPU, extensions, autoplay or background networking,
+  images off in Blink. Headless is left to the driver (`uc.Chrome(headless=)`,
+  SeleniumBase `headless2=`), which also hides "HeadlessChrome" in the UA
+- `block_heavy_resources(driver)` makes the page's network stack refuse media,
+  image and font URLs (`Network.setBlockedURLs`) before they are requested
+
+The x.com app, its scripts and the GraphQL calls (SearchTimeline included)
+are untouched, so scrolling still produces timeline pages. The HTTP cache
+stays on: `Network.setCacheDisabled` would only make every session download
+the app bundles again.
+"""
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("tweet_crawler")
+
+# Wildcard patterns for Network.setBlockedURLs. Images and videos are served
+# from twimg hosts without file extensions, so hosts are blocked as a whole;
+# abs.twimg.com (app scripts and styles) is not in the list.
+BLOCKED_URL_PATTERNS = (
+    "*://pbs.twimg.com/*",    # tweet images, avatars, banners, card thumbnails
+    "*://video.twimg.com/*",  # video and GIF segments
+    "*://ton.twimg.com/*",    # DM and ad media
+    "*://abs.twimg.com/emoji/*",
+    "*://abs.twimg.com/sticky/*",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.ico",
+    "*.mp4", "*.webm", "*.m3u8", "*.m4s", "*.mp3",
+)
+
+LEAN_FLAGS = (
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-background-networking",
+    "--autoplay-policy=user-gesture-required",
+    "--mute-audio",
+    "--blink-settings=imagesEnabled=false",
+    "--disable-features=MediaRouter,Translate,OptimizationHints",
+    "--no-first-run",
+)
+
+
+def chrome_args(window_size: Optional[Tuple[int, int]] = (800, 900)) -> List[str]:
+    """Launch flags for a lean browser (instead of --start-maximized)."""
+    args = list(LEAN_FLAGS)
+    if window_size:
+        args.append(f"--window-size={window_size[0]},{window_size[1]}")
+    return args
+
+
+def block_heavy_resources(driver, patterns: Sequence[str] = BLOCKED_URL_PATTERNS):
+    """Block media, image and font URLs for the driver's page. Needs Network.enable first."""
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+    logger.info(f"Blocking {len(patterns)} media/image/font URL patterns")
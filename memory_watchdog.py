@@ -0,0 +1,139 @@
+"""
+Browser memory watchdog for long infinite-scroll sessions.
+
+A search tab that scrolls for hundreds of pages keeps every rendered tweet in
+its DOM and every loaded tweet in the app's JS heap, so later scrolls get
+slower and Chrome's memory climbs. `MemoryWatchdog` is told about every
+scroll (`after_scroll()`) and
+
+- every `prune_every` scrolls hides the tweets more than `keep_screens`
+  screen heights above the viewport. Their pages were captured before they
+  were rendered; the cells keep their height so the timeline does not jump,
+  and the nodes stay in place for X's React code, which still owns them
+- every `sample_every` scrolls reads `Performance.getMetrics` (JS heap used,
+  DOM nodes, event listeners) into `metrics` gauges
+
+Once the heap or node count crosses its limit, `needs_recycle` is set. The
+crawler then replaces the tab (`recycle_tab()`) or the browser at the next
+window boundary; a window in progress is not interrupted.
+"""
+
+import logging
+from typing import Callable, Dict, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger("tweet_crawler")
+
+# Timeline cells are in document order, top first. Cells far above the
+# viewport keep their height but their <article> is no longer laid out or
+# painted, and the cell skips rendering while off screen. Nodes are hidden,
+# not removed: removing nodes React renders breaks its reconciliation when it
+# recycles or updates the cell. Returns the number of cells hidden this time.
+PRUNE_SCRIPT = """
+const limit = -arguments[0] * window.innerHeight;
+let pruned = 0;
+for (const cell of document.querySelectorAll('[data-testid="cellInnerDiv"]')) {
+    const rect = cell.getBoundingClientRect();
+    if (rect.bottom >= limit) break;
+    const article = cell.querySelector('article');
+    if (!article || article.style.display === 'none') continue;
+    try {
+        cell.style.minHeight = rect.height + 'px';
+        cell.style.contentVisibility = 'auto';
+        cell.style.containIntrinsicSize = 'auto ' + rect.height + 'px';
+        article.style.display = 'none';
+        pruned++;
+    } catch (e) {}
+}
+return pruned;
+"""
+
+SAMPLED = {"JSHeapUsedSize": "heap_mb", "JSHeapTotalSize": "heap_total_mb",
+           "Nodes": "dom_nodes", "JSEventListeners": "listeners"}
+
+
+class MemoryWatchdog:
+    def __init__(self, driver, heap_limit_mb: float = 512, node_limit: int = 150_000,
+                 prune_every: int = 20, keep_screens: int = 3, sample_every: int = 10,
+                 labels: Optional[Dict[str, str]] = None):
+        self.driver = driver
+        self.heap_limit_mb = heap_limit_mb
+        self.node_limit = node_limit
+        self.prune_every = prune_every
+        self.keep_screens = keep_screens
+        self.sample_every = sample_every
+        self.labels = labels or {}
+        self.scrolls = 0
+        self.pruned = 0
+        self.last: Dict[str, float] = {}
+        self.peak: Dict[str, float] = {}
+        self.needs_recycle = False
+        self._enabled = False
+
+    def after_scroll(self):
+        self.scrolls += 1
+        if self.prune_every and self.scrolls % self.prune_every == 0:
+            self.prune()
+        if self.sample_every and self.scrolls % self.sample_every == 0:
+            self.sample()
+
+    def prune(self) -> int:
+        """Hide tweets far above the viewport; returns how many were hidden."""
+        try:
+            pruned = self.driver.execute_script(PRUNE_SCRIPT, self.keep_screens) or 0
+        except Exception as e:
+            logger.debug(f"DOM pruning failed: {e}")
+            return 0
+        self.pruned += pruned
+        metrics.inc("dom_pruned", pruned, **self.labels)
+        return pruned
+
+    def sample(self) -> Dict[str, float]:
+        """Read the tab's memory metrics and check them against the limits."""
+        try:
+            if not self._enabled:
+                self.driver.execute_cdp_cmd("Performance.enable", {})
+                self._enabled = True
+            raw = self.driver.execute_cdp_cmd("Performance.getMetrics", {}).get("metrics", [])
+        except Exception as e:
+            logger.debug(f"Performance.getMetrics failed: {e}")
+            return {}
+        values = {}
+        for m in raw:
+            name = SAMPLED.get(m.get("name"))
+            if name:
+                values[name] = m["value"] / 1e6 if name.endswith("_mb") else m["value"]
+        for name, value in values.items():
+            metrics.set(f"browser_{name}", round(value, 1), **self.labels)
+            self.peak[name] = max(value, self.peak.get(name, value))
+        self.last = values
+        if not self.needs_recycle and (values.get("heap_mb", 0) > self.heap_limit_mb
+                                       or values.get("dom_nodes", 0) > self.node_limit):
+            self.needs_recycle = True
+            logger.warning(f"Browser memory over its limit after {self.scrolls} scrolls "
+                           f"(heap {values.get('heap_mb', 0):.0f} MB, {values.get('dom_nodes', 0):.0f} nodes), "
+                           f"recycling at the next window boundary")
+        return values
+
+    def summary(self) -> dict:
+        return {"scrolls": self.scrolls, "pruned": self.pruned,
+                **{f"peak_{k}": round(v, 1) for k, v in self.peak.items()}}
+
+
+def recycle_tab(driver, prepare: Optional[Callable[[object], None]] = None):
+    """
+    Replace the driver's tab with a fresh one in the same browser (same
+    profile and cookies, new renderer); `prepare(driver)` re-applies per-tab
+    CDP settings such as Network.enable.
+    """
+    old = driver.current_window_handle
+    driver.switch_to.new_window("tab")
+    new = driver.current_window_handle
+    driver.switch_to.window(old)
+    driver.close()
+    driver.switch_to.window(new)
+    if prepare:
+        prepare(driver)
+    metrics.inc("tabs_recycled")
+    logger.info("Recycled the browser tab")
@@ -0,0 +1,306 @@
+"""
+Crawler metrics: counters, gauges and latency histograms per phase, profile and user.
+
+Phases timed by the crawlers:
+
+- browser_start: launch + warm-up of a profile's browser
+- rotation_wait: waiting for a profile (rate-limit reset, rotate delay, browser switch)
+- navigate:      `driver.get()` of a search URL
+- first_page:    navigation until the first SearchTimeline page was processed
+- scroll_wait:   one scroll until the next page was processed (or the timeout)
+- get_body:      `Network.getResponseBody`
+- decode:        decompress + JSON parse of a body
+- extract:       tweet IDs / objects from a parsed page, duplicate filtering
+- save:          writing a page (or a session's tweets) to disk
+- window:        one whole date window (one session in tweet_mining)
+
+`metrics` is the process-wide registry. It renders Prometheus text
+(`serve(port)` answers /metrics and /metrics.json on localhost) or writes a
+JSON snapshot every few seconds (`start_snapshots(path)`). tweets/min per
+profile is tweets captured over the time that profile spent in windows.
+
+`SamplingProfiler` is an opt-in stack sampler for all threads; it writes
+folded stacks ("thread;outer;inner count" per line) that flamegraph.pl,
+inferno or speedscope turn into a flame graph.
+"""
+
+import bisect
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("tweet_crawler")
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+LABELS = ("profile", "user")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Optional[str]]) -> LabelKey:
+    return tuple((k, str(labels[k])) for k in LABELS if labels.get(k) is not None)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def merge(self, other: "_Histogram"):
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+    def summary(self) -> dict:
+        return {"count": self.count, "sum_s": round(self.sum, 3),
+                "p50_s": self.quantile(0.5), "p95_s": self.quantile(0.95)}
+
+
+class Metrics:
+    def __init__(self, prefix: str = "xscraper"):
+        self.prefix = prefix
+        self.started = time.time()
+        self._phases: Dict[Tuple[str, LabelKey], _Histogram] = defaultdict(_Histogram)
+        self._counters: Counter = Counter()  # (name, labels) -> value
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}  # (name, labels) -> last value
+        self._lock = threading.Lock()
+
+    # ---- recording ---- #
+    def observe(self, phase: str, seconds: float, **labels):
+        with self._lock:
+            self._phases[(phase, _label_key(labels))].observe(seconds)
+
+    @contextmanager
+    def time(self, phase: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started, **labels)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    # ---- reading ---- #
+    def _by(self, label: str) -> Dict[str, dict]:
+        phases: Dict[str, Dict[str, _Histogram]] = defaultdict(lambda: defaultdict(_Histogram))
+        counters: Dict[str, Counter] = defaultdict(Counter)
+        gauges: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for (name, labels), value in self._gauges.items():
+            key = dict(labels).get(label)
+            if key is not None:
+                gauges[key][name] = max(value, gauges[key].get(name, value))
+        for (phase, labels), hist in self._phases.items():
+            value = dict(labels).get(label)
+            if value is not None:
+                phases[value][phase].merge(hist)
+        for (name, labels), n in self._counters.items():
+            value = dict(labels).get(label)
+            if value is not None:
+                counters[value][name] += n
+        out = {}
+        for value in sorted(set(phases) | set(counters) | set(gauges)):
+            entry = {"phases": {p: h.summary() for p, h in sorted(phases[value].items())},
+                     "counters": dict(counters[value]), "gauges": gauges[value]}
+            window = phases[value].get("window")
+            if window is not None and window.sum:
+                entry["tweets_per_min"] = round(counters[value]["tweets"] / window.sum * 60, 1)
+            out[value] = entry
+        return out
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            totals: Dict[str, _Histogram] = defaultdict(_Histogram)
+            for (phase, _), hist in self._phases.items():
+                totals[phase].merge(hist)
+            counters: Counter = Counter()
+            for (name, _), n in self._counters.items():
+                counters[name] += n
+            gauges: Dict[str, float] = {}
+            for (name, _), value in self._gauges.items():
+                gauges[name] = max(value, gauges.get(name, value))
+            return {
+                "time": round(time.time(), 3),
+                "uptime_s": round(time.time() - self.started, 1),
+                "phases": {p: h.summary() for p, h in sorted(totals.items())},
+                "counters": dict(counters),
+                "gauges": gauges,  # highest current value over all labels
+                "profiles": self._by("profile"),
+                "users": self._by("user"),
+            }
+
+    def summary(self) -> str:
+        """One line per phase: count, total and p95, slowest total first."""
+        snap = self.snapshot()
+        lines = [f"{phase:<14} n={s['count']:<6} total={s['sum_s']:.1f}s p95<={s['p95_s']}s"
+                 for phase, s in sorted(snap["phases"].items(), key=lambda kv: -kv[1]["sum_s"])]
+        lines += [f"{profile}: {p.get('tweets_per_min', 0)} tweets/min" for profile, p in snap["profiles"].items()]
+        return "\n".join(lines)
+
+    def render_prometheus(self) -> str:
+        p = self.prefix
+        out = [f"# HELP {p}_phase_seconds Time spent per crawl phase.",
+               f"# TYPE {p}_phase_seconds histogram"]
+        with self._lock:
+            for (phase, labels), hist in sorted(self._phases.items()):
+                base = [("phase", phase)] + list(labels)
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), hist.buckets):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    out.append(f"{p}_phase_seconds_bucket{_fmt_labels(base + [('le', le)])} {cumulative}")
+                out.append(f"{p}_phase_seconds_sum{_fmt_labels(base)} {hist.sum:.6f}")
+                out.append(f"{p}_phase_seconds_count{_fmt_labels(base)} {hist.count}")
+            names = sorted({name for name, _ in self._counters})
+            for name in names:
+                out.append(f"# TYPE {p}_{name}_total counter")
+                for (n, labels), value in sorted(self._counters.items()):
+                    if n == name:
+                        out.append(f"{p}_{name}_total{_fmt_labels(list(labels))} {value:g}")
+            for name in sorted({name for name, _ in self._gauges}):
+                out.append(f"# TYPE {p}_{name} gauge")
+                for (n, labels), value in sorted(self._gauges.items()):
+                    if n == name:
+                        out.append(f"{p}_{name}{_fmt_labels(list(labels))} {value:g}")
+        out.append(f"# TYPE {p}_uptime_seconds gauge")
+        out.append(f"{p}_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(out) + "\n"
+
+    # ---- export ---- #
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread; returns the server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, kind = json.dumps(registry.snapshot()).encode(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, kind = registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("content-type", kind)
+                self.send_header("content-length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+    def write_snapshot(self, path):
+        path = Path(path)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(tmp, path)
+
+    def start_snapshots(self, path, interval: float = 30) -> threading.Event:
+        """Rewrite `path` every `interval` seconds until the returned event is set."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.write_snapshot(path)
+                except OSError as e:
+                    logger.warning(f"Could not write metrics snapshot {path}: {e}")
+
+        threading.Thread(target=loop, name="metrics-snapshot", daemon=True).start()
+        return stop
+
+
+def _fmt_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
+
+
+# -------------------- Sampling profiler -------------------- #
+class SamplingProfiler:
+    """Samples the stacks of all other threads every `interval` seconds while running."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: re.sub(r"[-_]?\d+$", "", t.name) for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        """Folded stacks, heaviest first."""
+        with open(path, "w") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+        logger.info(f"Wrote {sum(self.samples.values())} profiler samples to {path}")
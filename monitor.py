@@ -0,0 +1,169 @@
+"""
+High-water marks and poll schedule for continuous monitoring.
+
+A backfill crawls fixed date ranges once. To keep accounts current, the
+monitor keeps one entry per user in a small JSON file (like rate_budget):
+
+- `high_water`: the newest tweet ID known to be captured with nothing missing
+  below it; a poll searches only from there on
+- `ceiling` / `ceiling_newest`: when a poll is cut short (rate limit, page
+  cap) everything from its oldest captured tweet up to `ceiling_newest` is
+  in, so the next poll only fills the gap from `high_water` up to `ceiling`
+  and then moves the mark to `ceiling_newest`
+- `rate`: tweets per hour, an exponentially weighted average over polls
+- `next_poll`: when the account is due again
+
+An account is polled about when `target_tweets` new tweets are expected
+(one timeline page by default), never more often than `min_interval` and
+never less often than `max_interval`, so a quiet account costs one empty
+search every few hours and a busy one is kept to a page or two per poll.
+"""
+
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from window_planner import format_bound, snowflake_time
+
+logger = logging.getLogger("tweet_crawler")
+
+
+def _utc(epoch: float) -> datetime.datetime:
+    """Naive UTC second of an epoch time, the way window bounds are kept."""
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=int(epoch))
+
+
+def _bound_at(tweet_id: int, after: bool = False) -> str:
+    """Window bound at the second of `tweet_id` (the next second with `after`)."""
+    moment = snowflake_time(tweet_id).replace(microsecond=0)
+    return format_bound(moment + datetime.timedelta(seconds=1) if after else moment)
+
+
+class MonitorState:
+    def __init__(self, path="monitor_state.json", min_interval: float = 5 * 60, max_interval: float = 6 * 3600,
+                 target_tweets: int = 20, smoothing: float = 0.3, bootstrap_days: float = 1.0):
+        self.path = Path(path)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_tweets = target_tweets
+        self.smoothing = smoothing
+        self.bootstrap_days = bootstrap_days
+        self._lock = threading.Lock()
+        self.users: Dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.users = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read monitor state {self.path}: {e}")
+
+    def _save(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.users, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def track(self, usernames: List[str]):
+        """Start following `usernames`; new ones are due now."""
+        with self._lock:
+            for username in usernames:
+                self.users.setdefault(username, {"high_water": None, "rate": None, "next_poll": 0.0})
+            self._save()
+
+    def due(self, usernames: Optional[List[str]] = None, now: Optional[float] = None) -> List[str]:
+        """Accounts whose poll is due, most overdue first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [(u["next_poll"], name) for name, u in self.users.items()
+                   if u["next_poll"] <= now and (usernames is None or name in usernames)]
+        return [name for _, name in sorted(due)]
+
+    def next_due(self, usernames: Optional[List[str]] = None) -> float:
+        with self._lock:
+            return min((u["next_poll"] for name, u in self.users.items()
+                        if usernames is None or name in usernames), default=time.time() + self.max_interval)
+
+    def expected_tweets(self, username: str, now: Optional[float] = None) -> Optional[float]:
+        """New tweets the next poll of `username` should find at its rate; None while the rate is unknown."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self.users.get(username, {})
+            if entry.get("rate") is None:
+                return None
+            last = entry.get("last_complete") or entry.get("last_poll") or now
+            return entry["rate"] * max(0.0, now - last) / 3600
+
+    def window(self, username: str, now: Optional[float] = None) -> Tuple[str, str]:
+        """(since, until) of the next poll: from the high-water mark up to a gap's ceiling or now."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = dict(self.users[username])
+        if entry["high_water"]:
+            since = _bound_at(int(entry["high_water"]))
+        else:
+            since = format_bound(_utc(now - self.bootstrap_days * 86400))
+        if entry.get("ceiling"):
+            until = _bound_at(int(entry["ceiling"]), after=True)
+        else:
+            until = format_bound(_utc(now + 60))
+        return since, until
+
+    def record(self, username: str, complete: bool, tweets: int, oldest_id: Optional[int],
+               newest_id: Optional[int], now: Optional[float] = None) -> dict:
+        """
+        Feed back one poll: `tweets` is how many were newer than the mark.
+        `complete` means the search reached its end, so everything up to
+        `newest_id` is captured; otherwise the part below `oldest_id` is
+        still missing. Returns the updated entry.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self.users.setdefault(username, {"high_water": None, "rate": None, "next_poll": 0.0})
+            newest = max([int(i) for i in (newest_id, entry.get("ceiling_newest")) if i] or [0]) or None
+            if complete:
+                if newest:
+                    entry["high_water"] = str(max(newest, int(entry["high_water"] or 0)))
+                entry.pop("ceiling", None)
+                entry.pop("ceiling_newest", None)
+                self._update_rate(entry, tweets + entry.pop("gap_tweets", 0), now)
+                entry["next_poll"] = now + self.interval(entry)
+            else:
+                if oldest_id:
+                    entry["ceiling"] = str(oldest_id)
+                    entry["ceiling_newest"] = str(newest) if newest else None
+                entry["gap_tweets"] = entry.get("gap_tweets", 0) + tweets
+                entry["next_poll"] = now  # fill the gap as soon as a profile is free
+            entry["polls"] = entry.get("polls", 0) + 1
+            entry["tweets"] = entry.get("tweets", 0) + tweets
+            entry["last_poll"] = now
+            self._save()
+            return dict(entry)
+
+    def _update_rate(self, entry: dict, tweets: int, now: float):
+        last = entry.get("last_complete")
+        entry["last_complete"] = now
+        # the first poll covers the bootstrap range
+        hours = self.bootstrap_days * 24 if last is None else max((now - last) / 3600, 1e-6)
+        observed = tweets / hours
+        rate = entry.get("rate")
+        entry["rate"] = round(observed if rate is None else self.smoothing * observed + (1 - self.smoothing) * rate, 3)
+
+    def interval(self, entry: dict) -> float:
+        """Seconds until `target_tweets` new tweets are expected, within the limits."""
+        rate = entry.get("rate")
+        if rate is None:
+            return self.min_interval
+        if rate <= 0:
+            return self.max_interval
+        return min(self.max_interval, max(self.min_interval, self.target_tweets / rate * 3600))
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: {"high_water": u["high_water"], "rate": u.get("rate"),
+                           "next_poll_in": round(max(0.0, u["next_poll"] - time.time())), "polls": u.get("polls", 0)}
+                    for name, u in self.users.items()}
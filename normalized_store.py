@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Normalized tweet store: tweets, interned users and tweet references.
+
+Every tweet object X returns carries its author's full `core.user_results`
+payload, and quoted / retweeted tweets are nested in full. A single-author
+crawl therefore stores the same user blob once per tweet. `TweetNormalizer`
+splits each tweet object into
+
+- a tweet record: the object with its author replaced by `{"$user": [id, v]}`
+  and nested quoted / retweeted tweets by `{"$tweet": id}`, plus `$refs`
+  (`quote`, `retweet`, `reply` tweet IDs) for lookups without rehydrating
+- user versions `{"id", "v", "user"}`: a user's payload is stored again only
+  when it changed (new bio, follower count ...), as version `v + 1`
+- records of nested tweets the store does not have yet, so every reference
+  resolves inside the same store
+
+`NormalizedSink` keeps both in `output_store` segment stores under
+`<root>/users` and `<root>/tweets` (users are committed first, so a tweet
+never points at a user version that was lost in a crash), and
+`NormalizedReader` rebuilds the original nested objects on demand; a
+reference it cannot resolve is left in place, with a warning:
+
+    python normalized_store.py stats <store_dir>
+    python normalized_store.py export <store_dir> <out.json>
+"""
+
+import hashlib
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from output_store import MANIFEST, TweetSink, iter_tweets
+
+logger = logging.getLogger("tweet_crawler")
+
+USER_REF = "$user"
+TWEET_REF = "$tweet"
+REFS = "$refs"
+
+
+def is_normalized(root) -> bool:
+    root = Path(root)
+    return (root / "tweets").is_dir() and (root / "users").is_dir()
+
+
+def _tweet_id(tweet: dict) -> Optional[str]:
+    return tweet.get("rest_id") or tweet.get("legacy", {}).get("id_str")
+
+
+def _fingerprint(user: dict) -> str:
+    return hashlib.blake2b(json.dumps(user, sort_keys=True, separators=(",", ":")).encode(),
+                           digest_size=16).hexdigest()
+
+
+# -------------------- Normalizing -------------------- #
+class TweetNormalizer:
+    """
+    Turns tweet objects into tweet records and new user versions. It remembers
+    which tweets and user versions exist (`known_tweets`, fingerprints per
+    user), not the payloads; user versions wait in `pending_users` until
+    `take_users()` hands them to the writer.
+
+    Tweets and user versions normalized since the last commit are staged: the
+    writer calls `commit_users()` / `commit_tweets()` once they are stored and
+    `rollback()` when storing failed, so a tweet that never reached the store
+    is not skipped as known later, and no later record points at a user
+    version that was never written.
+    """
+
+    def __init__(self):
+        self.known_tweets: Set[str] = set()
+        self._versions: Dict[str, Dict[str, int]] = {}  # user ID -> fingerprint -> version
+        self._latest: Dict[str, Tuple[dict, int]] = {}  # user ID -> last payload seen and its version
+        self.pending_users: List[dict] = []
+        self._staged_tweets: Set[str] = set()
+        self._staged_versions: List[Tuple[str, str]] = []  # (user ID, fingerprint)
+        self.stats = {"tweets": 0, "nested": 0, "user_refs": 0, "user_versions": 0}
+
+    def load(self, user_records, tweet_records):
+        """Learn what an existing store already holds."""
+        for record in user_records:
+            self._versions.setdefault(record["id"], {})[_fingerprint(record["user"])] = record["v"]
+        for record in tweet_records:
+            tid = _tweet_id(record)
+            if tid:
+                self.known_tweets.add(tid)
+
+    def normalize(self, tweet: dict) -> List[dict]:
+        """
+        Records for `tweet` and for the tweets nested in it that are not known
+        yet, nested ones first; [] if `tweet` itself is known already. A
+        `TweetWithVisibilityResults` is stored as the tweet it wraps, the way
+        `timeline.TweetExtractor` returns it.
+        """
+        if tweet.get("__typename") == "TweetWithVisibilityResults":
+            tweet = tweet.get("tweet") or {}
+        tid = _tweet_id(tweet)
+        if tid and tid in self.known_tweets:
+            return []
+        out: List[dict] = []
+        self._record(tweet, out)
+        return out
+
+    def take_users(self) -> List[dict]:
+        users, self.pending_users = self.pending_users, []
+        return users
+
+    def commit_users(self):
+        """The user versions handed out by `take_users()` are stored."""
+        self._staged_versions.clear()
+
+    def commit_tweets(self):
+        """The tweet records normalized so far are stored."""
+        self._staged_tweets.clear()
+
+    def rollback(self):
+        """Forget the tweets and user versions normalized since the last commit."""
+        self.known_tweets -= self._staged_tweets
+        self._staged_tweets.clear()
+        for uid, fingerprint in reversed(self._staged_versions):
+            self._versions[uid].pop(fingerprint, None)
+            self._latest.pop(uid, None)
+        self._staged_versions.clear()
+        self.pending_users.clear()
+
+    def _record(self, tweet: dict, out: List[dict]) -> dict:
+        record = dict(tweet)
+        refs = {}
+        core = record.get("core")
+        if isinstance(core, dict) and isinstance(core.get("user_results"), dict):
+            ref = self._intern_user(core["user_results"].get("result"))
+            if ref is not None:
+                record["core"] = dict(core, user_results=dict(core["user_results"], result={USER_REF: ref}))
+        quoted = self._detach(record.get("quoted_status_result"), out)
+        if quoted is not None:
+            record["quoted_status_result"], refs["quote"] = quoted
+        legacy = record.get("legacy")
+        if isinstance(legacy, dict):
+            retweeted = self._detach(legacy.get("retweeted_status_result"), out)
+            if retweeted is not None:
+                record["legacy"] = legacy = dict(legacy)
+                legacy["retweeted_status_result"], refs["retweet"] = retweeted
+            if legacy.get("in_reply_to_status_id_str"):
+                refs["reply"] = legacy["in_reply_to_status_id_str"]
+        if refs:
+            record[REFS] = refs
+        tid = _tweet_id(tweet)
+        if tid:
+            self.known_tweets.add(tid)
+            self._staged_tweets.add(tid)
+        self.stats["tweets"] += 1
+        out.append(record)
+        return record
+
+    def _detach(self, holder, out: List[dict]) -> Optional[Tuple[dict, str]]:
+        """Replace the tweet in a `{"result": ...}` holder by a reference; None if it holds no tweet."""
+        if not isinstance(holder, dict) or not isinstance(holder.get("result"), dict):
+            return None
+        result = holder["result"]
+        wrapper = None
+        if result.get("__typename") == "TweetWithVisibilityResults":
+            wrapper, result = result, result.get("tweet") or {}
+        tid = _tweet_id(result)
+        if not tid or not result.get("legacy"):
+            return None  # tombstones and unavailable tweets stay inline
+        if tid not in self.known_tweets:
+            self.stats["nested"] += 1
+            self._record(result, out)
+        ref = {TWEET_REF: tid}
+        return dict(holder, result=dict(wrapper, tweet=ref) if wrapper is not None else ref), tid
+
+    def _intern_user(self, user) -> Optional[list]:
+        if not isinstance(user, dict) or not user.get("rest_id"):
+            return None  # UserUnavailable and the like stay inline
+        uid = user["rest_id"]
+        self.stats["user_refs"] += 1
+        latest = self._latest.get(uid)
+        if latest is not None and latest[0] == user:
+            return [uid, latest[1]]  # the common case; no need to hash the payload
+        versions = self._versions.setdefault(uid, {})
+        fingerprint = _fingerprint(user)
+        version = versions.get(fingerprint)
+        if version is None:
+            version = versions[fingerprint] = len(versions) + 1
+            self._staged_versions.append((uid, fingerprint))
+            self.pending_users.append({"id": uid, "v": version, "user": user})
+            self.stats["user_versions"] += 1
+        self._latest[uid] = (user, version)
+        return [uid, version]
+
+
+# -------------------- Store -------------------- #
+class NormalizedSink:
+    """
+    Normalized counterpart of `output_store.TweetSink`: `append()` takes tweet
+    records from `normalizer` (or raw tweet objects, which it normalizes) and
+    commits the user versions they need before them. What `normalizer` staged
+    is committed as each store write succeeds and rolled back if one fails.
+    """
+
+    def __init__(self, root, fsync: bool = True):
+        self.root = Path(root)
+        self.users = TweetSink(self.root / "users", fsync=fsync)
+        self.tweets = TweetSink(self.root / "tweets", fsync=fsync)
+        self.normalizer = TweetNormalizer()
+        if self.tweets.count or self.users.count:
+            self.normalizer.load(iter_tweets(self.users.root), iter_tweets(self.tweets.root))
+
+    @property
+    def count(self) -> int:
+        return self.tweets.count
+
+    @property
+    def last_saved_tweet_date(self) -> Optional[str]:
+        return self.tweets.last_saved_tweet_date
+
+    def append(self, records: List[dict], normalized: bool = True) -> int:
+        """Append tweet records (`normalized=False`: tweet objects); returns how many tweets were written."""
+        if not normalized:
+            records = [r for tweet in records for r in self.normalizer.normalize(tweet)]
+        try:
+            self.users.append(self.normalizer.take_users())
+            self.normalizer.commit_users()
+            written = self.tweets.append(records)
+        except Exception:
+            self.normalizer.rollback()
+            raise
+        self.normalizer.commit_tweets()
+        return written
+
+
+class NormalizedReader:
+    """
+    Rehydrates tweets of a normalized store. User versions and the (small)
+    tweet records are loaded once; nested objects are rebuilt per call.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.users: Dict[Tuple[str, int], dict] = {
+            (u["id"], u["v"]): u["user"] for u in iter_tweets(self.root / "users")}
+        self.records: Dict[str, dict] = {}
+        self.order: List[str] = []
+        for record in iter_tweets(self.root / "tweets"):
+            tid = _tweet_id(record)
+            if tid not in self.records:
+                self.order.append(tid)
+            self.records[tid] = record
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def record(self, tweet_id) -> Optional[dict]:
+        """The stored record (references not resolved)."""
+        return self.records.get(str(tweet_id))
+
+    def get(self, tweet_id) -> Optional[dict]:
+        """The tweet in its original nested shape, or None if the store does not have it."""
+        record = self.records.get(str(tweet_id))
+        return None if record is None else self.rehydrate(record)
+
+    def rehydrate(self, record: dict) -> dict:
+        tweet = {k: v for k, v in record.items() if k != REFS}
+        core = tweet.get("core")
+        if isinstance(core, dict):
+            result = (core.get("user_results") or {}).get("result")
+            if isinstance(result, dict) and USER_REF in result:
+                uid, version = result[USER_REF]
+                user = self.users.get((uid, version))
+                if user is None:
+                    logger.warning(f"Tweet {_tweet_id(tweet)}: user {uid} version {version} is not in the store")
+                else:
+                    tweet["core"] = dict(core, user_results=dict(core["user_results"], result=user))
+        if "quoted_status_result" in tweet:
+            tweet["quoted_status_result"] = self._attach(tweet["quoted_status_result"])
+        legacy = tweet.get("legacy")
+        if isinstance(legacy, dict) and "retweeted_status_result" in legacy:
+            tweet["legacy"] = dict(legacy, retweeted_status_result=self._attach(legacy["retweeted_status_result"]))
+        return tweet
+
+    def _attach(self, holder):
+        """The holder with its referenced tweet rehydrated; unchanged if the store does not have it."""
+        result = holder.get("result") if isinstance(holder, dict) else None
+        if not isinstance(result, dict):
+            return holder
+        if TWEET_REF in result:
+            tweet = self._nested(result[TWEET_REF])
+            return holder if tweet is None else dict(holder, result=tweet)
+        inner = result.get("tweet")
+        if isinstance(inner, dict) and TWEET_REF in inner:
+            tweet = self._nested(inner[TWEET_REF])
+            return holder if tweet is None else dict(holder, result=dict(result, tweet=tweet))
+        return holder
+
+    def _nested(self, tweet_id) -> Optional[dict]:
+        tweet = self.get(tweet_id)
+        if tweet is None:
+            logger.warning(f"Nested tweet {tweet_id} is not in the store")
+        return tweet
+
+    def iter_tweets(self) -> Iterator[dict]:
+        """Every stored tweet, rehydrated, in the order it was first stored."""
+        for tid in self.order:
+            yield self.get(tid)
+
+    def stats(self) -> dict:
+        refs = [r.get(REFS, {}) for r in self.records.values()]
+        return {
+            "tweets": len(self.order),
+            "users": len({uid for uid, _ in self.users}),
+            "user_versions": len(self.users),
+            "quotes": sum("quote" in r for r in refs),
+            "retweets": sum("retweet" in r for r in refs),
+            "replies": sum("reply" in r for r in refs),
+            "bytes": sum(p.stat().st_size for p in self.root.rglob("*.ndjson")),
+        }
+
+
+def iter_normalized(root) -> Iterator[dict]:
+    """Rehydrated tweets of a normalized store, like `output_store.iter_tweets` for a plain one."""
+    return NormalizedReader(root).iter_tweets()
+
+
+def export_json(root, out_path):
+    """Write the legacy `{"last_saved_tweet_date", "tweets"}` document with full tweet objects."""
+    with open(Path(root) / "tweets" / MANIFEST, encoding="utf-8") as f:
+        last_saved = json.load(f)["last_saved_tweet_date"]
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"last_saved_tweet_date": last_saved, "tweets": list(iter_normalized(root))},
+                  f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "stats":
+        print(json.dumps(NormalizedReader(sys.argv[2]).stats(), indent=2))
+    elif len(sys.argv) == 4 and sys.argv[1] == "export":
+        export_json(sys.argv[2], sys.argv[3])
+    else:
+        sys.exit("usage: python normalized_store.py stats <store_dir> | export <store_dir> <out.json>")
@@ -0,0 +1,155 @@
+"""
+Append-only tweet output store.
+
+A store is a directory of NDJSON segments (one tweet object per line) plus a
+small `manifest.json` holding per-segment committed byte lengths, the total
+count and `last_saved_tweet_date`. Appending writes only the new lines and
+rewrites the manifest, so cost per tweet does not depend on how much is
+already stored. The manifest is replaced atomically after the segment data is
+fsynced; bytes past a segment's committed length (a torn write from a crash)
+are ignored by readers and truncated on the next open, and a segment the
+manifest does not list yet is removed then.
+
+`read_output` rebuilds the old single-file shape,
+`{"last_saved_tweet_date": ..., "tweets": [...]}`, when it is needed.
+
+    python output_store.py export <store_dir> <out.json>
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+MANIFEST = "manifest.json"
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _fsync_dir(path: Path):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _load_manifest(root: Path) -> dict:
+    path = root / MANIFEST
+    if not path.exists():
+        return {"count": 0, "last_saved_tweet_date": None, "segments": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class TweetSink:
+    """Appends tweet objects to an NDJSON segment store at `root`."""
+
+    def __init__(self, root, segment_max_bytes: int = SEGMENT_MAX_BYTES, fsync: bool = True):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+        self.manifest = _load_manifest(self.root)
+        self._repair()
+
+    @property
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    @property
+    def last_saved_tweet_date(self) -> Optional[str]:
+        return self.manifest["last_saved_tweet_date"]
+
+    def _repair(self):
+        """Drop uncommitted data left by a crash between write and manifest update."""
+        listed = set()
+        for seg in self.manifest["segments"]:
+            listed.add(seg["name"])
+            path = self.root / seg["name"]
+            if path.exists() and path.stat().st_size > seg["bytes"]:
+                with open(path, "r+b") as f:
+                    f.truncate(seg["bytes"])
+        for path in self.root.glob("segment-*.ndjson"):
+            if path.name not in listed:  # its first batch was never committed
+                path.unlink()
+
+    def _segment_for_write(self) -> dict:
+        segments = self.manifest["segments"]
+        if not segments or segments[-1]["bytes"] >= self.segment_max_bytes:
+            segments.append({"name": f"segment-{len(segments) + 1:05d}.ndjson", "count": 0, "bytes": 0})
+        return segments[-1]
+
+    def append(self, tweets: Iterable[dict]) -> int:
+        """Append `tweets` and commit them; returns how many were written."""
+        lines = [json.dumps(t, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n" for t in tweets]
+        if not lines:
+            return 0
+        seg = self._segment_for_write()
+        data = b"".join(lines)
+        # A new segment starts empty, whatever a crashed writer left under its name
+        with open(self.root / seg["name"], "ab" if seg["bytes"] else "wb") as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+        last = json.loads(lines[-1])
+        seg["count"] += len(lines)
+        seg["bytes"] += len(data)
+        self.manifest["count"] += len(lines)
+        self.manifest["last_saved_tweet_date"] = (
+            last.get("legacy", {}).get("created_at") or self.manifest["last_saved_tweet_date"]
+        )
+        self._write_manifest()
+        return len(lines)
+
+    def _write_manifest(self):
+        tmp = self.root / (MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.root / MANIFEST)
+        if self.fsync:
+            _fsync_dir(self.root)
+
+    def import_json(self, path) -> int:
+        """One-off import of a legacy `{"last_saved_tweet_date", "tweets"}` file."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return self.append(data.get("tweets", []))
+
+
+# -------------------- Readers -------------------- #
+def iter_tweets(root) -> Iterator[dict]:
+    """Yield committed tweet objects of a store in append order."""
+    root = Path(root)
+    for seg in _load_manifest(root)["segments"]:
+        remaining = seg["bytes"]
+        with open(root / seg["name"], "rb") as f:
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= len(line)
+                if remaining >= 0:
+                    yield json.loads(line)
+
+
+def read_output(root) -> dict:
+    """Rebuild the legacy `{"last_saved_tweet_date", "tweets"}` document."""
+    manifest = _load_manifest(Path(root))
+    return {"last_saved_tweet_date": manifest["last_saved_tweet_date"], "tweets": list(iter_tweets(root))}
+
+
+def export_json(root, out_path):
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(read_output(root), f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "export":
+        sys.exit("usage: python output_store.py export <store_dir> <out.json>")
+    export_json(sys.argv[2], sys.argv[3])
@@ -0,0 +1,138 @@
+"""
+Per-profile request budget from X's rate-limit response headers.
+
+Every SearchTimeline response carries `x-rate-limit-limit`,
+`x-rate-limit-remaining` and `x-rate-limit-reset` (epoch seconds). The
+budget keeps the latest values per profile in a small JSON file, so a
+restart knows which profiles are still resting. A profile is stopped once
+`remaining` drops to `reserve`, before X starts answering with errors, and
+is not used again until its reset time; a 429 response counts as exhausted.
+
+Crawler processes on one host may share the file: updates are read-modify-
+write under a `file_lock`, and lookups reload the file when another process
+changed it.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional
+
+from file_lock import locked
+
+logger = logging.getLogger("tweet_crawler")
+
+DEFAULT_RESET = 15 * 60  # X rate-limit windows are 15 minutes
+
+
+def _header(headers: Mapping, name: str) -> Optional[str]:
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class RateBudget:
+    def __init__(self, path="rate_budget.json", reserve: int = 2):
+        self.path = Path(path)
+        self.reserve = reserve
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock = threading.Lock()
+        self.profiles: Dict[str, dict] = {}
+        self._stamp = None
+        self._reload()
+
+    def _reload(self):
+        """Read the file again if another process (or nobody yet) wrote it since we last did."""
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        try:
+            with open(self.path) as f:
+                self.profiles = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read rate budget {self.path}: {e}")
+
+    def update(self, profile: str, status: int, headers: Mapping) -> bool:
+        """Record one response; True if the profile should stop now."""
+        remaining = _header(headers, "x-rate-limit-remaining")
+        reset = _header(headers, "x-rate-limit-reset")
+        limit = _header(headers, "x-rate-limit-limit")
+        if remaining is None and status != 429:
+            return False
+        now = time.time()
+        with self._lock, locked(self.lock_path):
+            self._reload()
+            entry = self.profiles.setdefault(profile, {})
+            try:
+                if remaining is not None:
+                    entry["remaining"] = int(remaining)
+                if limit is not None:
+                    entry["limit"] = int(limit)
+                entry["reset"] = float(reset) if reset is not None else max(entry.get("reset", 0), now + DEFAULT_RESET)
+            except ValueError:
+                return False
+            if status == 429:
+                entry["remaining"] = 0
+            entry["updated"] = now
+            self._save()
+            return entry["remaining"] <= self.reserve
+
+    def _save(self):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.profiles, f)
+        os.replace(tmp, self.path)
+        st = self.path.stat()
+        self._stamp = (st.st_ino, st.st_mtime_ns)
+
+    def remaining(self, profile: str) -> Optional[int]:
+        with self._lock:
+            self._reload()
+            entry = self.profiles.get(profile)
+            if not entry or entry.get("reset", 0) <= time.time():
+                return None  # unknown, or the window has reset
+            return entry.get("remaining")
+
+    def ready_at(self, profile: str) -> float:
+        """Epoch time from which `profile` may be used again (0 if it is usable now)."""
+        with self._lock:
+            self._reload()
+            entry = self.profiles.get(profile)
+            if not entry or entry.get("reset", 0) <= time.time():
+                return 0.0
+            return entry["reset"] if entry.get("remaining", 0) <= self.reserve else 0.0
+
+    def next_profile(self, directories: List[str], after: int) -> int:
+        """
+        Index of the first profile after `after` (in rotation order) that has
+        budget left; if none has, the one whose budget resets first.
+        """
+        order = [(after + i) % len(directories) for i in range(1, len(directories) + 1)]
+        ready = {i: self.ready_at(directories[i]) for i in order}
+        for i in order:
+            if not ready[i]:
+                return i
+        return min(order, key=ready.get)
+
+    def wait_until_ready(self, profile: str, stop: Optional[threading.Event] = None):
+        """Sleep until `profile`'s budget has reset."""
+        wait = self.ready_at(profile) - time.time()
+        if wait > 0:
+            logger.info(f"All profiles are out of requests, waiting {wait:.0f}s for {profile} to reset")
+            if stop is not None:
+                stop.wait(wait)
+            else:
+                time.sleep(wait)
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            return {p: dict(e) for p, e in self.profiles.items()}
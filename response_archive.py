@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Packed archive of raw SearchTimeline responses.
+
+Instead of one `resp_*.json` file per page, pages are appended to a few large
+segment files under one directory, each with an NDJSON index of
+`{"user", "window", "request", "offset", "length", "size"}` records:
+
+    response_archive/
+    ├── archive.json                # codec
+    ├── segment-00001.gz            # sealed: every page compressed on its own
+    ├── segment-00001.idx
+    ├── segment-00002.open          # active: pages appended as they arrive
+    └── segment-00002.open.idx
+
+Capture only appends the raw bytes to the active segment (no file is created
+per page, no compression on the capture path). Once the active segment holds
+`segment_max_bytes`, or when the archive is closed, it is sealed on a
+background thread: each page is compressed separately (zstd when the
+`zstandard` package is installed, gzip otherwise) into the final segment, so
+any page can still be read with one seek. A crash leaves the `.open` segment
+behind; the next writer drops bytes past its last indexed page and seals it.
+
+Crawler processes on one host can share an archive directory: each writer
+holds a `file_lock` on its active segment until that segment is sealed, new
+segment numbers are taken under `archive.lock`, and recovery only seals
+`.open` segments nobody holds a lock on (their writer is gone).
+
+    python response_archive.py convert tweet_responses response_archive [--delete]
+    python response_archive.py ls response_archive [user] [window]
+    python response_archive.py cat response_archive <user> <window> <request> > page.json
+    python response_archive.py unpack response_archive tweet_responses
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import body_decode
+from file_lock import locked, try_lock
+
+logger = logging.getLogger("tweet_crawler")
+
+META = "archive.json"
+LOCK = "archive.lock"  # held while numbering new segments and recovering crashed ones
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024  # raw bytes per segment before it is sealed
+OPEN_SUFFIX = ".open"
+INDEX_SUFFIX = ".idx"
+CODEC_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+DEFAULT_LEVELS = {"zstd": 9, "gzip": 6}
+
+Key = Tuple[str, str, str]  # (user, window, request)
+
+
+def default_codec() -> str:
+    try:
+        import zstandard  # noqa: F401
+        return "zstd"
+    except ImportError:
+        return "gzip"
+
+
+def _compressor(codec: str, level: int):
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compress
+    if codec == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=level, mtime=0)
+    raise ValueError(f"unknown archive codec: {codec}")
+
+
+def _read_index(path: Path) -> List[dict]:
+    """Complete records of an index file (a torn last line is skipped)."""
+    entries = []
+    if not path.exists():
+        return entries
+    with open(path, "rb") as f:
+        for line in f:
+            if line.endswith(b"\n"):
+                entries.append(json.loads(line))
+    return entries
+
+
+def is_archive(path) -> bool:
+    return (Path(path) / META).exists()
+
+
+# -------------------- Writer -------------------- #
+class ResponseArchive:
+    """Appends response pages to the archive at `root`; safe to share between threads and processes."""
+
+    def __init__(self, root, codec: Optional[str] = None, level: Optional[int] = None,
+                 segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        meta_path = self.root / META
+        with locked(self.root / LOCK):
+            if meta_path.exists():
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            else:
+                meta = {"codec": codec or default_codec()}
+                with open(meta_path, "w") as f:
+                    json.dump(meta, f)
+        self.codec = codec or meta["codec"]
+        self.level = level if level is not None else DEFAULT_LEVELS[self.codec]
+        self.segment_max_bytes = segment_max_bytes
+        self.stats = {"pages": 0, "raw_bytes": 0, "sealed_segments": 0, "sealed_bytes": 0}
+        self._lock = threading.Lock()
+        self._sealers: List[threading.Thread] = []
+        self._segment: Optional[Path] = None
+        self._data = None
+        self._index = None
+        self._offset = 0
+        self._recover()
+
+    def _segment_names(self) -> List[str]:
+        names = set()
+        for p in self.root.glob("segment-*"):
+            names.add(p.name.split(".")[0])
+        return sorted(names)
+
+    def _recover(self):
+        """
+        Seal `.open` segments left behind by a crash (after dropping their torn
+        tail). Segments another live writer holds a lock on are left alone.
+        """
+        orphans = []
+        with locked(self.root / LOCK):
+            for name in self._segment_names():
+                segment = self.root / (name + OPEN_SUFFIX)
+                index = self.root / (name + OPEN_SUFFIX + INDEX_SUFFIX)
+                if not segment.exists():
+                    if index.exists() and (self.root / (name + INDEX_SUFFIX)).exists():
+                        index.unlink()  # sealed, crash before cleanup
+                    continue
+                holder = open(segment, "r+b")
+                if not try_lock(holder):
+                    holder.close()  # another writer's active or sealing segment
+                    continue
+                if (self.root / (name + INDEX_SUFFIX)).exists():
+                    for leftover in (segment, index):  # sealed already, crash before cleanup
+                        if leftover.exists():
+                            leftover.unlink()
+                    holder.close()
+                    continue
+                entries = _read_index(index)
+                holder.truncate(max((e["offset"] + e["length"] for e in entries), default=0))
+                with open(index, "wb") as f:
+                    f.writelines(json.dumps(e).encode() + b"\n" for e in entries)
+                orphans.append((segment, index, holder, len(entries)))
+        for segment, index, holder, pages in orphans:
+            logger.info(f"Sealing {segment} left open by an interrupted run ({pages} pages)")
+            self._seal(segment, index, holder)
+
+    def _next_segment(self) -> Path:
+        names = self._segment_names()
+        number = int(names[-1].split("-")[1]) + 1 if names else 1
+        return self.root / f"segment-{number:05d}{OPEN_SUFFIX}"
+
+    def _open_segment(self):
+        with locked(self.root / LOCK):
+            self._segment = self._next_segment()
+            self._data = open(self._segment, "xb")
+            try_lock(self._data)  # ours until sealed; recovery in other processes skips it
+        self._index = open(self._segment.with_name(self._segment.name + INDEX_SUFFIX), "ab")
+        self._offset = 0
+
+    def append(self, user: str, window: str, request: str, body: bytes) -> dict:
+        """Append one raw page; returns its index record."""
+        with self._lock:
+            if self._data is None:
+                self._open_segment()
+            entry = {"user": user, "window": window, "request": request,
+                     "offset": self._offset, "length": len(body), "size": len(body)}
+            self._data.write(body)
+            self._data.flush()
+            self._index.write(json.dumps(entry).encode() + b"\n")
+            self._index.flush()
+            self._offset += len(body)
+            self.stats["pages"] += 1
+            self.stats["raw_bytes"] += len(body)
+            if self._offset >= self.segment_max_bytes:
+                sealer = threading.Thread(target=self._seal, args=self._detach(), daemon=True)
+                self._sealers.append(sealer)
+                sealer.start()
+        return entry
+
+    def _detach(self) -> Tuple[Path, Path, object]:
+        """
+        Stop appending to the active segment; returns it, its index and the
+        still open data file, whose lock the sealer holds until it is done.
+        """
+        segment, holder = self._segment, self._data
+        self._index.close()
+        self._data = self._index = self._segment = None
+        return segment, segment.with_name(segment.name + INDEX_SUFFIX), holder
+
+    def _seal(self, segment: Path, index: Path, holder=None):
+        """Compress an open segment page by page into its final file and index, then drop `holder`'s lock."""
+        try:
+            self._compress_segment(segment, index)
+        finally:
+            if holder is not None:
+                holder.close()
+
+    def _compress_segment(self, segment: Path, index: Path):
+        name = segment.name[: -len(OPEN_SUFFIX)]
+        final = self.root / (name + CODEC_SUFFIXES[self.codec])
+        final_index = self.root / (name + INDEX_SUFFIX)
+        compress = _compressor(self.codec, self.level)
+        entries, offset = [], 0
+        try:
+            tmp = final.with_name(final.name + ".tmp")
+            with open(segment, "rb") as src, open(tmp, "wb") as dst:
+                for entry in _read_index(index):
+                    src.seek(entry["offset"])
+                    packed = compress(src.read(entry["length"]))
+                    dst.write(packed)
+                    entries.append(dict(entry, offset=offset, length=len(packed)))
+                    offset += len(packed)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp, final)
+            tmp_index = final_index.with_name(final_index.name + ".tmp")
+            with open(tmp_index, "wb") as f:
+                f.writelines(json.dumps(e).encode() + b"\n" for e in entries)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_index, final_index)  # the sealed segment is live from here on
+            segment.unlink()
+            index.unlink()
+        except Exception as e:
+            logger.error(f"Sealing {segment} failed, it stays readable uncompressed: {e}")
+            return
+        with self._lock:
+            self.stats["sealed_segments"] += 1
+            self.stats["sealed_bytes"] += offset
+        logger.info(f"Sealed {final.name}: {len(entries)} pages, {offset / 1e6:.1f} MB")
+
+    def close(self):
+        """Seal the active segment and wait for background sealing to finish."""
+        with self._lock:
+            active = self._detach() if self._data is not None else None
+            sealers, self._sealers = self._sealers, []
+        if active:
+            self._seal(*active)
+        for sealer in sealers:
+            sealer.join()
+
+
+# -------------------- Reader -------------------- #
+class ArchiveReader:
+    """
+    Random access to archived pages by (user, window, request). The index is
+    read when the reader is created; pages appended later need a new reader.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.entries: Dict[Key, Tuple[str, dict]] = {}
+        for index in sorted(self.root.glob(f"segment-*{INDEX_SUFFIX}")):
+            name = index.name[: -len(INDEX_SUFFIX)]
+            if name.endswith(OPEN_SUFFIX):
+                segment = name
+            else:
+                segment = next((name + s for s in CODEC_SUFFIXES.values() if (self.root / (name + s)).exists()), None)
+                if segment is None:
+                    continue
+            for entry in _read_index(index):
+                self.entries[(entry["user"], entry["window"], entry["request"])] = (segment, entry)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Key) -> bool:
+        return key in self.entries
+
+    def keys(self, user: Optional[str] = None, window: Optional[str] = None) -> List[Key]:
+        return sorted(k for k in self.entries if (user is None or k[0] == user) and (window is None or k[1] == window))
+
+    def get(self, user: str, window: str, request: str) -> bytes:
+        """The raw page body as captured."""
+        segment, entry = self.entries[(user, window, request)]
+        with open(self.root / segment, "rb") as f:
+            f.seek(entry["offset"])
+            return body_decode.decompress(f.read(entry["length"]))
+
+    def iter_pages(self, user: Optional[str] = None, window: Optional[str] = None) -> Iterator[Tuple[Key, bytes]]:
+        for key in self.keys(user, window):
+            yield key, self.get(*key)
+
+
+# -------------------- Conversion -------------------- #
+def convert_directory(source, archive: ResponseArchive, delete: bool = False) -> dict:
+    """
+    Pack a `tweet_responses/<user>/<window>/resp_*.json` tree into `archive`.
+    Pages already in the archive are skipped, so an interrupted conversion
+    can be rerun; with `delete` the files (and emptied directories) are removed
+    once the archive is sealed.
+    """
+    source = Path(source)
+    existing = ArchiveReader(archive.root)
+    stats = {"files": 0, "skipped": 0, "bytes": 0}
+    converted = []
+    for path in sorted(source.glob("*/*/resp_*.json")):
+        user, window, request = path.parent.parent.name, path.parent.name, path.stem
+        if (user, window, request) in existing:
+            stats["skipped"] += 1
+        else:
+            body = path.read_bytes()
+            archive.append(user, window, request, body)
+            stats["files"] += 1
+            stats["bytes"] += len(body)
+        converted.append(path)
+    archive.close()
+    if delete:
+        for path in converted:
+            path.unlink()
+        for window_dir in sorted({p.parent for p in converted}):
+            for d in (window_dir, window_dir.parent):
+                try:
+                    d.rmdir()
+                except OSError:
+                    pass
+    return stats
+
+
+def unpack(root, out_dir) -> int:
+    """Write every archived page back as `<out_dir>/<user>/<window>/<request>.json`."""
+    count = 0
+    for (user, window, request), body in ArchiveReader(root).iter_pages():
+        target = Path(out_dir) / user / window
+        target.mkdir(parents=True, exist_ok=True)
+        (target / f"{request}.json").write_bytes(body)
+        count += 1
+    return count
+
+
+def _disk_usage(root: Path) -> Tuple[int, int]:
+    files = [p for p in root.rglob("*") if p.is_file()]
+    return len(files), sum(p.stat().st_size for p in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack, list and read archived SearchTimeline responses.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("convert", help="pack a tweet_responses directory")
+    p.add_argument("source")
+    p.add_argument("archive")
+    p.add_argument("--delete", action="store_true", help="remove the converted files")
+    p.add_argument("--codec", choices=sorted(CODEC_SUFFIXES), help="default: zstd if installed, else gzip")
+    p = sub.add_parser("ls", help="list archived pages")
+    p.add_argument("archive")
+    p.add_argument("user", nargs="?")
+    p.add_argument("window", nargs="?")
+    p = sub.add_parser("cat", help="write one page to stdout")
+    p.add_argument("archive")
+    p.add_argument("user")
+    p.add_argument("window")
+    p.add_argument("request")
+    p = sub.add_parser("unpack", help="write the pages back as one file each")
+    p.add_argument("archive")
+    p.add_argument("out_dir")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        before = _disk_usage(Path(args.source))
+        stats = convert_directory(args.source, ResponseArchive(args.archive, codec=args.codec), delete=args.delete)
+        after = _disk_usage(Path(args.archive))
+        print(f"{stats}; source {before[0]} files / {before[1] / 1e6:.1f} MB, "
+              f"archive {after[0]} files / {after[1] / 1e6:.1f} MB")
+    elif args.command == "ls":
+        for key in ArchiveReader(args.archive).keys(args.user, args.window):
+            print("\t".join(key))
+    elif args.command == "cat":
+        sys.stdout.buffer.write(ArchiveReader(args.archive).get(args.user, args.window, args.request))
+    elif args.command == "unpack":
+        print(f"{unpack(args.archive, args.out_dir)} pages written")
+
+
+if __name__ == "__main__":
+    main()
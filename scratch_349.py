@@ -6,9 +6,11 @@ from seleniumbase import Driver
 import json
 import time
 from datetime import datetime
-import base64, gzip, zlib
 from threading import Event
 
+from body_decode import decode_cdp_body
+from timeline import TweetExtractor
+
 
 username = "ekrem_imamoglu" 
 
@@ -25,32 +27,18 @@ full_texts = []
 full_objects = []  # will store complete tweet dicts
 pending_ids = {}
 first_batch_ready = Event()  # set after first UserTweets batch
-
-def extract_full_texts(obj):
-    if isinstance(obj, dict):
-        
-        for k, v in obj.items():
-            if k == "full_text":
-                full_texts.append(v)
-            else:
-                extract_full_texts(v)
-    elif isinstance(obj, list):
-        for item in obj:
-            extract_full_texts(item)
+extractor = TweetExtractor()
 
 def extract_tweet_objects(obj):
     """
-    Recursively collect every dict that contains a 'full_text' key.
-    The entire dict (tweet object) is appended to `full_objects`.
+    Collect the `legacy` dict (the one holding 'full_text') of every tweet on
+    a timeline page, following the page schema via timeline.TweetExtractor.
     """
-    if isinstance(obj, dict):
-        if "full_text" in obj:
-            full_objects.append(obj)
-        for v in obj.values():
-            extract_tweet_objects(v)
-    elif isinstance(obj, list):
-        for item in obj:
-            extract_tweet_objects(item)
+    for tweet in extractor.extract(obj):
+        legacy = tweet.get("legacy", {})
+        if "full_text" in legacy:
+            full_objects.append(legacy)
+            full_texts.append(legacy["full_text"])
 
 def on_response(event):
     p = event.get("params")
@@ -77,30 +65,16 @@ def on_finished(event):
         print(f"getResponseBody error: {e}")
         return
 
-    body = body_obj.get("body", "")
-    if body_obj.get("base64Encoded"):
-        raw = base64.b64decode(body)
-        for decompress in (
-            lambda x: gzip.decompress(x),
-            lambda x: zlib.decompress(x, 16 + zlib.MAX_WBITS),
-            lambda x: x,
-        ):
-            try:
-                body = decompress(raw).decode("utf-8")
-                break
-            except Exception:
-                pass
-
-    try:
-        data = json.loads(body)
+    decoded = decode_cdp_body(body_obj.get("body", ""), body_obj.get("base64Encoded", False))
+    if decoded.ok:
+        data = decoded.data
         prev = len(full_texts)
-        extract_full_texts(data)
         extract_tweet_objects(data)
         new = len(full_texts) - prev
         print(f"✓ UserTweets ⇒ {new} new tweets (total {len(full_texts)} | objects {len(full_objects)})")
         if not first_batch_ready.is_set():
             first_batch_ready.set()
-    except json.JSONDecodeError:
+    else:
         print("JSON decode error")
 
     pending_ids.pop(rid, None)
@@ -1,9 +1,12 @@
 from seleniumbase import Driver
-import json, time, base64, gzip, zlib, urllib.parse, re
+import json, time, urllib.parse, re
 from threading import Event
 import datetime as dat
 import os
 
+from body_decode import decode_cdp_body
+from timeline import TweetExtractor
+
 # === PARAMETRELERİ BURADA DEĞİŞTİRİN ===
 username    = "ekrem_imamoglu"
 since_date  = "2024-01-01"
@@ -32,28 +35,16 @@ driver = Driver(
 full_texts, full_objects = [], []
 pending_ids              = {}
 first_batch_ready        = Event()
+extractor                = TweetExtractor()
 
 # ---------------------------------------------------------
-def extract_full_texts(obj):
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            if k == "full_text":          # 'legacy' içindeki de dâhil
-                full_texts.append(v)
-            else:
-                extract_full_texts(v)
-    elif isinstance(obj, list):
-        for item in obj:
-            extract_full_texts(item)
-
 def extract_tweet_objects(obj):
-    if isinstance(obj, dict):
-        if "full_text" in obj:
-            full_objects.append(obj)
-        for v in obj.values():
-            extract_tweet_objects(v)
-    elif isinstance(obj, list):
-        for item in obj:
-            extract_tweet_objects(item)
+    # sayfa şemasını takip eder; 'full_text' içeren legacy dict'leri toplar
+    for tweet in extractor.extract(obj):
+        legacy = tweet.get("legacy", {})
+        if "full_text" in legacy:
+            full_objects.append(legacy)
+            full_texts.append(legacy["full_text"])
 
 # ---------------------------------------------------------
 def on_response(event):
@@ -78,32 +69,16 @@ def on_finished(event):
         pending_ids.pop(rid, None)
         return
 
-    body = body_obj.get("body", "")
-    if body_obj.get("base64Encoded"):
-        raw = base64.b64decode(body)
-        for decompress in (
-            lambda x: gzip.decompress(x),
-            lambda x: zlib.decompress(x, 16 + zlib.MAX_WBITS),
-            lambda x: x,
-        ):
-            try:
-                body = decompress(raw).decode("utf-8")
-                break
-            except Exception:
-                pass
-
-    try:
-        data = json.loads(body)
+    decoded = decode_cdp_body(body_obj.get("body", ""), body_obj.get("base64Encoded", False))
+    if decoded.ok:
+        data = decoded.data
         prev = len(full_texts)
-        extract_full_texts(data)
         extract_tweet_objects(data)
         new  = len(full_texts) - prev
         src  = ("UserTweets" if "UserTweets" in pending_ids[rid]
                 else "SearchTl")
         print(f"✓ {src} ⇒ {new} yeni tweet (toplam {len(full_texts)})")
         first_batch_ready.set()
-    except json.JSONDecodeError:
-        pass
 
     pending_ids.pop(rid, None)
 
@@ -0,0 +1,168 @@
+"""
+Several capture tabs in one logged-in browser.
+
+A profile's browser normally runs one search at a time. `BrowserTabs` opens
+more tabs in the same browser (`Target.createTarget`, so the session, cookies
+and warm caches are shared) and hands out one `TabDriver` per tab. A
+`TabDriver` can be passed wherever the crawler takes a driver: each call
+switches the shared WebDriver to its tab first, under a lock, so scrolling,
+`Network.getResponseBody` and friends always reach the tab that issued the
+request. Navigation goes through `Page.navigate`, which returns once the
+navigation has started instead of blocking the other tabs until the page
+has loaded.
+
+Network events stay apart per tab: the events capture mode opens a DevTools
+session on the tab's own target (`current_window_handle`), and in poll mode
+`PerformanceLogRouter` drains chromedriver's single performance log and
+sorts the entries by their "webview" (the target that produced them), so a
+tab's saver only ever sees its own responses.
+
+Tabs are opened as separate windows by default: Chrome stops rendering
+background tabs, and a tab that does not render never loads the next page
+when it is scrolled.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger("tweet_crawler")
+
+
+class PerformanceLogRouter:
+    """Splits one driver's performance log into per-tab logs."""
+
+    def __init__(self, tabs: "BrowserTabs"):
+        self.tabs = tabs
+        self._entries: Dict[str, List[dict]] = defaultdict(list)
+
+    def get_log(self, handle: str) -> List[dict]:
+        with self.tabs.lock:
+            for entry in self.tabs.driver.get_log("performance"):
+                webview = _webview(entry.get("message", ""))
+                if webview in self.tabs.handles:
+                    self._entries[webview].append(entry)
+            return self._entries.pop(handle, [])
+
+    def discard(self, handle: str):
+        with self.tabs.lock:
+            self._entries.pop(handle, None)
+
+
+def _webview(message: str) -> Optional[str]:
+    # chromedriver appends "webview" after the event, so look from the end
+    i = message.rfind('"webview"')
+    if i < 0:
+        return None
+    start = message.find('"', message.find(":", i) + 1)
+    end = message.find('"', start + 1)
+    return message[start + 1:end] if start >= 0 and end > start else None
+
+
+class BrowserTabs:
+    """
+    `count` tabs of `driver` (the current one plus `count - 1` new ones);
+    `prepare(tab)` runs once per tab, e.g. to enable the Network domain.
+    """
+
+    def __init__(self, driver, count: int, prepare: Optional[Callable] = None, new_window: bool = True):
+        self.driver = driver
+        self.new_window = new_window
+        self.prepare = prepare
+        self.lock = threading.RLock()
+        self.router = PerformanceLogRouter(self)
+        self._active = driver.current_window_handle
+        self.handles = {self._active}
+        self.tabs = [TabDriver(self, self._active)]
+        for _ in range(count - 1):
+            self.tabs.append(TabDriver(self, self.open()))
+        if prepare:
+            for tab in self.tabs:
+                prepare(tab)
+        logger.info(f"Capturing in {len(self.tabs)} tabs of one browser")
+
+    def open(self) -> str:
+        target = self.driver.execute_cdp_cmd(
+            "Target.createTarget", {"url": "about:blank", "newWindow": self.new_window})["targetId"]
+        with self.lock:
+            self.handles.add(target)
+        return target
+
+    def close(self, handle: str):
+        with self.lock:
+            self.driver.execute_cdp_cmd("Target.closeTarget", {"targetId": handle})
+            self.handles.discard(handle)
+            if self._active == handle:
+                self._active = None
+        self.router.discard(handle)
+
+    def call(self, handle: str, fn: Callable, *args, **kwargs):
+        """Run `fn` on the shared driver with `handle` as its current tab."""
+        with self.lock:
+            if self._active != handle:
+                self.driver.switch_to.window(handle)
+                self._active = handle
+            return fn(*args, **kwargs)
+
+
+class _TabSwitchTo:
+    """`switch_to` of a TabDriver: only moves the tab it stands for (memory_watchdog.recycle_tab)."""
+
+    def __init__(self, tab: "TabDriver"):
+        self.tab = tab
+
+    def new_window(self, kind: str = "tab"):
+        self.tab.handle = self.tab.tabs.open()
+
+    def window(self, handle: str):
+        self.tab.handle = handle
+
+
+class TabDriver:
+    """One tab of a BrowserTabs browser, with the driver methods the crawlers use."""
+
+    def __init__(self, tabs: BrowserTabs, handle: str):
+        self.tabs = tabs
+        self.handle = handle
+        self.switch_to = _TabSwitchTo(self)
+
+    @property
+    def current_window_handle(self) -> str:
+        return self.handle
+
+    @property
+    def current_url(self) -> str:
+        return self.tabs.call(self.handle, lambda: self.tabs.driver.current_url)
+
+    def get(self, url: str):
+        self.tabs.call(self.handle, self.tabs.driver.execute_cdp_cmd, "Page.navigate", {"url": url})
+
+    def refresh(self):
+        self.tabs.call(self.handle, self.tabs.driver.execute_cdp_cmd, "Page.reload", {})
+
+    def execute_script(self, script: str, *args):
+        return self.tabs.call(self.handle, self.tabs.driver.execute_script, script, *args)
+
+    def execute_cdp_cmd(self, cmd: str, params: dict):
+        return self.tabs.call(self.handle, self.tabs.driver.execute_cdp_cmd, cmd, params)
+
+    def find_element(self, *args):
+        return self.tabs.call(self.handle, self.tabs.driver.find_element, *args)
+
+    def get_cookies(self):
+        return self.tabs.call(self.handle, self.tabs.driver.get_cookies)
+
+    def get_log(self, kind: str):
+        return self.tabs.router.get_log(self.handle)
+
+    def close(self):
+        self.tabs.close(self.handle)
+
+    def quit(self):
+        """The browser belongs to BrowserTabs' owner; a tab only closes itself."""
+        self.close()
+
+    def __getattr__(self, name):
+        # capabilities and other read-only attributes of the shared driver
+        return getattr(self.tabs.driver, name)
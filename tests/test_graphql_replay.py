@@ -0,0 +1,89 @@
+import json
+import urllib.parse
+
+import pytest
+
+from bench_extract import synthetic_page
+from graphql_replay import TimelineReplayer, serve_recorded_pages
+from timeline import bottom_cursor, top_level_tweet_ids
+
+PAGES = 4
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    """Four recorded pages chained by their bottom cursors; the last one has none."""
+    for i in range(PAGES):
+        page = synthetic_page(i)
+        if i == PAGES - 1:
+            entries = page["data"]["search_by_raw_query"]["search_timeline"]["timeline"]["instructions"][0]["entries"]
+            entries[:] = [e for e in entries if not e["entryId"].startswith("cursor-")]
+        (tmp_path / f"resp_{i:05d}.json").write_text(json.dumps(page))
+    return tmp_path
+
+
+def replayer(base_url: str) -> TimelineReplayer:
+    variables = json.dumps({"rawQuery": "from:alice since:2025-10-01 until:2025-10-02", "count": 20})
+    url = base_url + "?" + urllib.parse.urlencode({"variables": variables})
+    return TimelineReplayer(url, {"x-csrf-token": "t", "host": "x.com"})
+
+
+def test_pages_arrive_in_cursor_order_and_stop_at_the_last(recorded):
+    server, base_url = serve_recorded_pages(recorded)
+    try:
+        r = replayer(base_url)
+        pages = list(r.iter_pages(None, max_pages=10))
+        r.close()
+    finally:
+        server.shutdown()
+    assert [status for status, _ in pages] == [200] * PAGES
+    assert [top_level_tweet_ids(p.data)[0] for _, p in pages] == [
+        top_level_tweet_ids(synthetic_page(i))[0] for i in range(PAGES)]
+    assert server.served == [None, "c0", "c1", "c2"]
+    assert bottom_cursor(pages[-1][1].data) is None
+
+
+def test_replay_starts_from_a_cursor(recorded):
+    server, base_url = serve_recorded_pages(recorded)
+    try:
+        r = replayer(base_url)
+        pages = list(r.iter_pages("c1", max_pages=10))
+        r.close()
+    finally:
+        server.shutdown()
+    assert len(pages) == 2
+    assert server.served == ["c1", "c2"]
+
+
+def test_max_pages(recorded):
+    server, base_url = serve_recorded_pages(recorded)
+    try:
+        r = replayer(base_url)
+        assert len(list(r.iter_pages(None, max_pages=2))) == 2
+        r.close()
+    finally:
+        server.shutdown()
+
+
+def test_rate_limit_stops_the_replay(recorded):
+    server, base_url = serve_recorded_pages(recorded, rate_limit_after=2)
+    try:
+        r = replayer(base_url)
+        pages = list(r.iter_pages(None, max_pages=10))
+        r.close()
+    finally:
+        server.shutdown()
+    assert [status for status, _ in pages] == [200, 200, 429]
+    assert pages[-1][1].is_rate_limited()
+    assert r.last_headers["x-rate-limit-remaining"] == "0"
+
+
+def test_unknown_cursor_stops_the_replay(recorded):
+    server, base_url = serve_recorded_pages(recorded)
+    try:
+        r = replayer(base_url)
+        pages = list(r.iter_pages("no-such-cursor", max_pages=10))
+        r.close()
+    finally:
+        server.shutdown()
+    assert [status for status, _ in pages] == [404]
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from bench_extract import synthetic_page
+from id_index import BloomFilter, TweetIdIndex, drop_seen_entries
+from timeline import content_entry_count, top_level_tweet_ids
+
+
+@pytest.fixture
+def ids():
+    rng = random.Random(7)
+    return [rng.getrandbits(62) for _ in range(5000)]
+
+
+def test_add_reports_new_ids_only(tmp_path, ids):
+    index = TweetIdIndex(tmp_path, expected_ids=10_000)
+    assert index.add_many(ids[:100]) == ids[:100]
+    assert index.add_many(ids[50:150]) == ids[100:150]
+    assert not index.add(ids[0])
+    assert str(ids[0]) in index and "not an id" not in index
+    index.close()
+
+
+def test_compaction_keeps_every_id(tmp_path, ids):
+    index = TweetIdIndex(tmp_path, expected_ids=10_000, compact_every=1000)
+    for start in range(0, len(ids), 250):
+        index.add_many(ids[start:start + 250])
+    assert len(index) == len(ids)
+    assert len(index._recent) < 1000  # the log was merged into ids.u64
+    assert all(x in index for x in ids)
+    index.close()
+
+
+def test_reopen_uses_the_saved_bloom_filter(tmp_path, ids, monkeypatch):
+    index = TweetIdIndex(tmp_path, expected_ids=10_000, compact_every=1000)
+    index.add_many(ids[:3000])
+    index.compact()
+    index.add_many(ids[3000:])
+    index.close()
+
+    built = []
+    init = BloomFilter.__init__
+
+    def counting_init(self, *args, **kwargs):
+        built.append(args)
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(BloomFilter, "__init__", counting_init)
+    index = TweetIdIndex(tmp_path, expected_ids=10_000)
+    assert not built  # sized for 10_000 and saved with the current count: loaded, not rebuilt
+    assert len(index) == len(ids) and all(x in index for x in ids)
+    known = set(ids)
+    assert not any(x + 1 in index for x in ids if x + 1 not in known)
+    index.close()
+
+
+def test_filter_outgrowing_its_capacity_is_rebuilt(tmp_path, ids):
+    index = TweetIdIndex(tmp_path, expected_ids=1000, compact_every=10_000)
+    index.add_many(ids)
+    index.compact()
+    assert index._bloom.capacity >= len(ids)
+    index.close()
+    index = TweetIdIndex(tmp_path, expected_ids=1000)
+    assert all(x in index for x in ids)
+    index.close()
+
+
+def test_two_instances_share_a_directory(tmp_path, ids):
+    a = TweetIdIndex(tmp_path, expected_ids=10_000)
+    b = TweetIdIndex(tmp_path, expected_ids=10_000)
+    a.add_many(ids[:100])
+    assert b.add_many(ids[:200]) == ids[100:200]
+    a.compact()
+    assert b.add_many(ids[150:300]) == ids[200:300]
+    a.refresh()
+    assert all(x in a for x in ids[:300])
+    a.close()
+    b.close()
+
+
+def test_drop_seen_entries_keeps_pages_with_new_tweets(tmp_path):
+    index = TweetIdIndex(tmp_path, expected_ids=10_000)
+    page = synthetic_page(0)
+    top = top_level_tweet_ids(page)
+    index.add_many(top[:5])
+    entries = content_entry_count(page)
+    new_ids, dropped = drop_seen_entries(page, index)
+    assert dropped == 5
+    assert new_ids == top[5:]
+    assert content_entry_count(page) == entries - 5
+    index.close()
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+from job_queue import JobQueue
+
+WINDOWS = [("2025-10-01", "2025-10-02"), ("2025-10-02", "2025-10-03")]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "jobs.sqlite"
+
+
+def test_claims_newest_window_first_and_once(path):
+    jobs = JobQueue(path, owner="a")
+    assert jobs.add("alice", WINDOWS) == 2
+    assert jobs.add("alice", WINDOWS) == 0
+    first, second = jobs.claim(), jobs.claim()
+    assert (first.since, first.until) == WINDOWS[1]
+    assert (second.since, second.until) == WINDOWS[0]
+    assert jobs.claim() is None
+    jobs.close()
+
+
+def test_expired_lease_is_taken_over(path):
+    a = JobQueue(path, lease_seconds=0.2, owner="a")
+    b = JobQueue(path, owner="b")
+    a.add("alice", WINDOWS[:1])
+    job = a.claim()
+    assert b.claim() is None
+    time.sleep(0.3)
+    taken = b.claim()
+    assert taken.owner == "b" and taken.attempts == 2
+    # the old owner can neither checkpoint nor finish a window it lost
+    assert not a.checkpoint(job, 123, "cursor")
+    assert not a.finish(job, tweets=10, follow_up=[("2025-10-01", "2025-10-01_12-00-00")])
+    assert b.progress()["alice"] == {"pending": 0, "leased": 1, "done": 0, "failed": 0, "tweets": 0, "pages": 0}
+    assert b.finish(taken, tweets=5, pages=1)
+    assert b.done_windows("alice") == WINDOWS[:1]
+    assert b.remaining() == 0
+    a.close()
+    b.close()
+
+
+def test_checkpoint_extends_the_lease_and_resumes(path):
+    a = JobQueue(path, lease_seconds=1.0, owner="a")
+    b = JobQueue(path, owner="b")
+    a.add("alice", WINDOWS[:1])
+    job = a.claim()
+    time.sleep(0.6)
+    assert a.checkpoint(job, 456, "c1")
+    time.sleep(0.6)
+    assert b.claim() is None  # renewed by the checkpoint
+    time.sleep(0.6)
+    taken = b.claim()
+    assert taken.oldest_id == 456 and taken.cursor == "c1"
+    a.close()
+    b.close()
+
+
+def test_recover_returns_expired_leases(path):
+    jobs = JobQueue(path, lease_seconds=0.1, owner="a")
+    jobs.add("alice", WINDOWS)
+    jobs.claim()
+    time.sleep(0.2)
+    assert jobs.recover() == 1
+    assert jobs.progress()["alice"]["pending"] == 2
+    jobs.close()
+
+
+def test_finish_queues_follow_ups(path):
+    jobs = JobQueue(path, owner="a")
+    jobs.add("alice", WINDOWS[:1])
+    job = jobs.claim()
+    assert jobs.finish(job, tweets=400, pages=20, follow_up=[("2025-10-01", "2025-10-01_06-00-00")])
+    follow = jobs.claim()
+    assert (follow.since, follow.until) == ("2025-10-01", "2025-10-01_06-00-00")
+    jobs.close()
+
+
+def test_failed_windows_wait_for_retry(path):
+    jobs = JobQueue(path, owner="a")
+    jobs.add("alice", WINDOWS[:1])
+    jobs.fail(jobs.claim(), "no response")
+    assert jobs.claim() is None
+    assert jobs.remaining() == 0 and jobs.progress()["alice"]["failed"] == 1
+    assert jobs.retry_failed() == 1
+    assert jobs.claim() is not None
+    jobs.close()
+
+
+def test_profile_leases(path):
+    a = JobQueue(path, lease_seconds=0.2, owner="a")
+    b = JobQueue(path, owner="b")
+    assert a.lease_profile(["p1"]) == "p1"
+    assert b.lease_profile(["p1"]) is None
+    assert a.renew_profile("p1") and not b.renew_profile("p1")
+    a.release_profile("p1", ready_at=time.time() + 60)
+    assert b.lease_profile(["p1"]) is None  # resting until its rate-limit reset
+    assert b.profile_ready_at(["p1"]) > time.time() + 50
+    a.close()
+    b.close()
@@ -0,0 +1,52 @@
+import json
+
+from output_store import MANIFEST, TweetSink, iter_tweets, read_output
+
+
+def tweet(n: int) -> dict:
+    return {"rest_id": str(n), "legacy": {"id_str": str(n), "created_at": f"day {n}"}}
+
+
+def test_append_and_read_back(tmp_path):
+    sink = TweetSink(tmp_path, fsync=False)
+    sink.append([tweet(1), tweet(2)])
+    sink.append([tweet(3)])
+    assert [t["rest_id"] for t in iter_tweets(tmp_path)] == ["1", "2", "3"]
+    assert read_output(tmp_path)["last_saved_tweet_date"] == "day 3"
+    assert TweetSink(tmp_path, fsync=False).count == 3
+
+
+def test_segments_roll_over(tmp_path):
+    sink = TweetSink(tmp_path, segment_max_bytes=100, fsync=False)
+    for n in range(5):
+        sink.append([tweet(n)])
+    assert len(sink.manifest["segments"]) > 1
+    assert [t["rest_id"] for t in iter_tweets(tmp_path)] == [str(n) for n in range(5)]
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    sink = TweetSink(tmp_path, fsync=False)
+    sink.append([tweet(1)])
+    segment = tmp_path / sink.manifest["segments"][0]["name"]
+    with open(segment, "ab") as f:  # crash after writing, before the manifest
+        f.write(json.dumps(tweet(2)).encode() + b"\n{\"rest_id\": \"3")
+    sink = TweetSink(tmp_path, fsync=False)
+    sink.append([tweet(4)])
+    assert [t["rest_id"] for t in iter_tweets(tmp_path)] == ["1", "4"]
+
+
+def test_unlisted_segment_from_a_crash_is_discarded(tmp_path):
+    # The first batch of a new segment was written, then the process died
+    # before the manifest listed the segment.
+    (tmp_path / "segment-00001.ndjson").write_bytes(json.dumps(tweet(1)).encode() + b"\n{\"rest_id\": \"2")
+    assert not (tmp_path / MANIFEST).exists()
+    sink = TweetSink(tmp_path, fsync=False)
+    sink.append([tweet(3)])
+    assert [t["rest_id"] for t in iter_tweets(tmp_path)] == ["3"]
+
+    # Same after a rollover: segment 2 is not listed yet
+    sink = TweetSink(tmp_path, segment_max_bytes=1, fsync=False)
+    (tmp_path / "segment-00002.ndjson").write_bytes(json.dumps(tweet(4)).encode() + b"\n")
+    sink = TweetSink(tmp_path, segment_max_bytes=1, fsync=False)
+    sink.append([tweet(5)])
+    assert [t["rest_id"] for t in iter_tweets(tmp_path)] == ["3", "5"]
@@ -0,0 +1,159 @@
+import datetime
+
+from window_planner import (MAX_QUERY_LENGTH, WindowPlanner, format_bound, pack_accounts, parse_bound,
+                            search_query, snowflake_at, snowflake_time)
+
+
+def tweet_at(bound: str, seconds: float = 0) -> int:
+    """A tweet ID created `seconds` after `bound`."""
+    moment = parse_bound(bound) + datetime.timedelta(seconds=seconds)
+    return snowflake_at(moment) + 1
+
+
+def drain(planner: WindowPlanner):
+    windows = []
+    while True:
+        window = planner.next_window()
+        if window is None:
+            return windows
+        windows.append(window)
+        planner.report(window, tweets=100)
+
+
+# -------------------- Snowflake IDs -------------------- #
+def test_snowflake_round_trip():
+    moment = datetime.datetime(2025, 10, 1, 13, 45, 7)
+    assert snowflake_time(snowflake_at(moment)) == moment
+    assert snowflake_time(snowflake_at(moment) - 1) < moment
+
+
+def test_snowflake_before_epoch_is_zero():
+    assert snowflake_at(datetime.datetime(2000, 1, 1)) == 0
+
+
+# -------------------- Queries -------------------- #
+def test_day_bounds_use_since_until():
+    assert search_query("alice", "2025-10-01", "2025-10-02") == "from:alice since:2025-10-01 until:2025-10-02"
+
+
+def test_second_bounds_include_since_and_exclude_until():
+    since, until = "2025-10-01_06-00-00", "2025-10-01_12-00-00"
+    query = search_query("alice", since, until)
+    since_id = int(query.split("since_id:")[1].split()[0])
+    max_id = int(query.split("max_id:")[1])
+    # since_id is exclusive, max_id inclusive: [since, until) to the millisecond
+    assert tweet_at(since) > since_id
+    assert snowflake_at(parse_bound(since)) > since_id
+    assert tweet_at(until, -0.001) <= max_id
+    assert snowflake_at(parse_bound(until)) > max_id
+
+
+def test_mixed_bounds_switch_to_ids():
+    assert "since_id:" in search_query("alice", "2025-10-01", "2025-10-01_12-00-00")
+
+
+def test_several_accounts():
+    assert search_query(["a", "b"], "2025-10-01", "2025-10-02") == "(from:a OR from:b) since:2025-10-01 until:2025-10-02"
+    assert search_query(["a"], "2025-10-01", "2025-10-02") == "from:a since:2025-10-01 until:2025-10-02"
+
+
+def test_format_bound():
+    assert format_bound(datetime.datetime(2025, 10, 1)) == "2025-10-01"
+    assert format_bound(datetime.datetime(2025, 10, 1, 6)) == "2025-10-01_06-00-00"
+
+
+# -------------------- Batched queries -------------------- #
+def test_quiet_accounts_share_a_query():
+    volumes = {"a": 10, "b": 50, "c": 5, "d": 120, "e": 300}
+    groups = pack_accounts(volumes, max_volume=200)
+    assert sorted(map(sorted, groups)) == [["a", "b", "c", "d"], ["e"]]
+    assert all(sum(volumes[u] for u in g) <= 200 for g in groups if len(g) > 1)
+
+
+def test_loud_account_gets_a_group_of_its_own():
+    assert pack_accounts({"quiet": 1, "loud": 1000}, max_volume=100) == [["quiet"], ["loud"]]
+
+
+def test_groups_follow_the_input_order():
+    volumes = {"x": 90, "y": 1, "z": 90}
+    groups = pack_accounts(volumes, max_volume=100)
+    assert groups == [["y", "x"], ["z"]]
+
+
+def test_groups_respect_the_query_length():
+    volumes = {f"account_{i:03d}": 0.1 for i in range(100)}
+    groups = pack_accounts(volumes, max_volume=1000)
+    assert len(groups) > 1
+    assert sorted(u for g in groups for u in g) == sorted(volumes)
+    for g in groups:
+        query = search_query(g, "2025-10-01_06-00-00", "2025-10-01_12-00-00")
+        assert len(query) <= MAX_QUERY_LENGTH
+
+
+# -------------------- Planner -------------------- #
+def test_windows_cover_the_range_oldest_first():
+    windows = drain(WindowPlanner("2025-10-01", "2025-10-04", days=1))
+    assert windows == [("2025-10-01", "2025-10-02"), ("2025-10-02", "2025-10-03"), ("2025-10-03", "2025-10-04")]
+
+
+def test_sparse_windows_widen_the_span():
+    planner = WindowPlanner("2025-10-01", "2025-10-11", days=1, sparse_tweets=20)
+    window = planner.next_window()
+    planner.report(window, tweets=3)
+    assert planner.next_window() == ("2025-10-02", "2025-10-04")
+
+
+def test_done_windows_are_skipped():
+    planner = WindowPlanner("2025-10-01", "2025-10-04", days=1, done=[("2025-10-02", "2025-10-03")])
+    assert drain(planner) == [("2025-10-01", "2025-10-02"), ("2025-10-03", "2025-10-04")]
+
+
+def test_truncated_window_splits_at_the_oldest_tweet():
+    planner = WindowPlanner("2025-10-01", "2025-10-02", days=1)
+    window = planner.next_window()
+    oldest = tweet_at("2025-10-01_18-00-00")
+    covered = planner.report(window, tweets=400, truncated=True, oldest_id=oldest)
+    assert covered == ("2025-10-01_18-00-01", "2025-10-02")
+    rest = []
+    while planner.pending:
+        rest.append(planner.next_window())
+    # the rest comes in pieces of the size that fitted, newest first, and meets the covered part
+    assert rest[0][1] == covered[0]
+    assert rest[-1][0] == "2025-10-01"
+    assert all(parse_bound(u) - parse_bound(s) <= datetime.timedelta(hours=6, seconds=1) for s, u in rest)
+    assert planner.splits == 1
+
+
+def test_truncated_window_without_tweets_is_halved():
+    planner = WindowPlanner("2025-10-01", "2025-10-02", days=1)
+    window = planner.next_window()
+    assert planner.report(window, tweets=0, truncated=True) is None
+    assert sorted(planner.pending) == [("2025-10-01", "2025-10-01_12-00-00"), ("2025-10-01_12-00-00", "2025-10-02")]
+
+
+def test_short_truncated_window_is_given_up():
+    planner = WindowPlanner("2025-10-01", "2025-10-01_01-00-00", days=1,
+                            min_span=datetime.timedelta(hours=1))
+    window = planner.next_window()
+    assert planner.report(window, tweets=400, truncated=True) is None
+    assert planner.incomplete == [window]
+    assert planner.next_window() is None
+    assert planner.summary()["incomplete"] == 1
+
+
+def test_resume_queues_the_part_below_the_oldest_tweet():
+    planner = WindowPlanner("2025-10-01", "2025-10-03", days=1)
+    window = planner.next_window()
+    covered = planner.resume(window, oldest_id=tweet_at("2025-10-01_12-00-00"))
+    assert covered == ("2025-10-01_12-00-01", "2025-10-02")
+    assert planner.next_window() == ("2025-10-01", "2025-10-01_12-00-01")
+    assert planner.next_window() == ("2025-10-02", "2025-10-03")
+    assert planner.next_window() is None
+
+
+def test_resume_without_tweets_retries_the_whole_window():
+    planner = WindowPlanner("2025-10-01", "2025-10-02", days=1)
+    window = planner.next_window()
+    assert planner.resume(window) is None
+    assert planner.next_window() == window
+    assert planner.next_window() is None
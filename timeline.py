@@ -0,0 +1,221 @@
+"""
+Helpers for reading X GraphQL timeline pages (SearchTimeline, UserTweets).
+"""
+
+from collections import Counter
+from typing import Optional, Tuple
+
+
+def timeline_instructions(data: dict) -> list:
+    """
+    Return the `instructions` list of a timeline page, wherever the endpoint
+    nests it (`search_by_raw_query.search_timeline.timeline`,
+    `user.result.timeline_v2.timeline`, ...). Only dicts are descended.
+    """
+    level = [data.get("data", {})]
+    for _ in range(6):
+        next_level = []
+        for node in level:
+            if "instructions" in node:
+                return node["instructions"]
+            next_level.extend(v for v in node.values() if isinstance(v, dict))
+        level = next_level
+    return []
+
+
+def _instruction_entries(inst: dict) -> list:
+    if inst.get("type") == "TimelineAddEntries":
+        return inst.get("entries", [])
+    if inst.get("type") == "TimelineReplaceEntry":
+        return [inst.get("entry", {})]
+    return []
+
+
+def is_cursor_entry(entry: dict) -> bool:
+    return entry.get("entryId", "").startswith("cursor-") or "cursorType" in entry.get("content", {})
+
+
+def bottom_cursor(data: dict) -> Optional[str]:
+    """Return the `cursor-bottom` value of a timeline page, if any."""
+    for inst in timeline_instructions(data):
+        for entry in _instruction_entries(inst):
+            content = entry.get("content", {})
+            if entry.get("entryId", "").startswith("cursor-bottom") or content.get("cursorType") == "Bottom":
+                if content.get("value"):
+                    return content["value"]
+    return None
+
+
+def content_entry_count(data: dict) -> int:
+    """Number of non-cursor entries added by TimelineAddEntries on this page."""
+    return sum(
+        1
+        for inst in timeline_instructions(data)
+        if inst.get("type") == "TimelineAddEntries"
+        for entry in inst.get("entries", [])
+        if not is_cursor_entry(entry)
+    )
+
+
+def entry_tweet_ids(entry: dict) -> list:
+    """IDs of the tweets one entry is about (not their quoted or retweeted originals)."""
+    ids = []
+    content = entry.get("content", {})
+    items = [content.get("itemContent", {})]
+    items.extend(i.get("item", {}).get("itemContent", {}) for i in content.get("items", []))
+    for item in items:
+        result = (item.get("tweet_results") or {}).get("result") or {}
+        if result.get("__typename") == "TweetWithVisibilityResults":
+            result = result.get("tweet", {})
+        if result.get("rest_id"):
+            ids.append(result["rest_id"])
+    return ids
+
+
+def top_level_tweet_ids(data: dict) -> list:
+    """IDs of the tweets a page's entries are about (not their quoted or retweeted originals)."""
+    return [i for inst in timeline_instructions(data) for entry in _instruction_entries(inst)
+            for i in entry_tweet_ids(entry)]
+
+
+def entry_author(entry: dict) -> Optional[Tuple[str, str]]:
+    """
+    (author ID, screen name) of the tweet a timeline entry is about (the first
+    one of a module); None for cursors and entries without a tweet.
+    """
+    content = entry.get("content", {})
+    items = [content.get("itemContent", {})]
+    items.extend(i.get("item", {}).get("itemContent", {}) for i in content.get("items", []))
+    for item in items:
+        result = (item.get("tweet_results") or {}).get("result") or {}
+        if result.get("__typename") == "TweetWithVisibilityResults":
+            result = result.get("tweet", {})
+        user = ((result.get("core") or {}).get("user_results") or {}).get("result") or {}
+        if user.get("rest_id"):
+            screen_name = (user.get("core") or {}).get("screen_name") or user.get("legacy", {}).get("screen_name")
+            return user["rest_id"], screen_name or ""
+    return None
+
+
+def is_timeline_end(data: dict) -> bool:
+    """A page with no new content entries, or with no bottom cursor, ends the timeline."""
+    return content_entry_count(data) == 0 or bottom_cursor(data) is None
+
+
+# -------------------- Tweet extraction -------------------- #
+KNOWN_RESULT_TYPES = {"Tweet", "TweetWithVisibilityResults", "TweetTombstone", "TweetUnavailable"}
+KNOWN_ENTRY_TYPES = {"TimelineTimelineItem", "TimelineTimelineModule", "TimelineTimelineCursor"}
+
+
+def tweet_id(tweet: dict):
+    return tweet.get("rest_id") or tweet.get("id_str") or tweet.get("id")
+
+
+def walk_tweets(obj, out: list):
+    """
+    Generic fallback: visit every dict/list under `obj` and collect tweets,
+    i.e. `Tweet` results with `legacy.created_at` and the inner tweet of
+    `TweetWithVisibilityResults`.
+    """
+    if isinstance(obj, dict):
+        typename = obj.get("__typename")
+        if typename == "Tweet" and obj.get("legacy", {}).get("created_at"):
+            out.append(obj)
+        elif typename == "TweetWithVisibilityResults":
+            inner = obj.get("tweet", {})
+            if inner.get("legacy", {}).get("created_at"):
+                out.append(inner)
+        for v in obj.values():
+            walk_tweets(v, out)
+    elif isinstance(obj, list):
+        for item in obj:
+            walk_tweets(item, out)
+    return out
+
+
+class TweetExtractor:
+    """
+    Collects tweet objects from timeline pages by following the known paths
+
+        instructions → TimelineAddEntries/PinEntry/ReplaceEntry → entries
+          → content.itemContent.tweet_results.result               (items)
+          → content.items[].item.itemContent.tweet_results.result  (modules)
+
+    unwrapping `TweetWithVisibilityResults` and descending only into
+    `quoted_status_result` / `legacy.retweeted_status_result` for nested
+    tweets. Shapes it does not recognise go through `walk_tweets`, and
+    `stats` counts how often that happens.
+    """
+
+    def __init__(self):
+        self.stats = Counter()
+
+    def extract(self, data: dict) -> list:
+        self.stats["pages"] += 1
+        out = []
+        instructions = timeline_instructions(data)
+        if not instructions:
+            self.stats["fallback_pages"] += 1
+            return walk_tweets(data, out)
+        for inst in instructions:
+            kind = inst.get("type")
+            if kind == "TimelineAddEntries":
+                entries = inst.get("entries", [])
+            elif kind in ("TimelinePinEntry", "TimelineReplaceEntry"):
+                entries = [inst.get("entry", {})]
+            else:
+                continue
+            for entry in entries:
+                self._entry(entry.get("content", {}), out)
+        return out
+
+    def entry_tweets(self, entry: dict) -> list:
+        """Tweet objects (including nested quotes/retweets) of one timeline entry."""
+        out = []
+        self._entry(entry.get("content", {}), out)
+        return out
+
+    def _entry(self, content: dict, out: list):
+        entry_type = content.get("entryType") or content.get("__typename")
+        if entry_type == "TimelineTimelineItem":
+            self._item(content.get("itemContent", {}), out)
+        elif entry_type == "TimelineTimelineModule":
+            for item in content.get("items", []):
+                self._item(item.get("item", {}).get("itemContent", {}), out)
+        elif entry_type not in KNOWN_ENTRY_TYPES:
+            self.stats["fallback_entries"] += 1
+            walk_tweets(content, out)
+
+    def _item(self, item_content: dict, out: list):
+        if "tweet_results" in item_content:
+            self._result(item_content["tweet_results"].get("result"), out)
+        elif item_content.get("itemType") not in (None, "TimelineTweet"):
+            return  # users, topics, prompts etc. carry no tweets
+        elif item_content:
+            self.stats["fallback_entries"] += 1
+            walk_tweets(item_content, out)
+
+    def _result(self, result, out: list):
+        if not result:
+            return
+        typename = result.get("__typename")
+        if typename == "TweetWithVisibilityResults":
+            result = result.get("tweet", {})
+        elif typename not in KNOWN_RESULT_TYPES and typename is not None:
+            self.stats["fallback_entries"] += 1
+            walk_tweets(result, out)
+            return
+        legacy = result.get("legacy", {})
+        if not legacy.get("created_at"):
+            return
+        out.append(result)
+        self._result(legacy.get("retweeted_status_result", {}).get("result"), out)
+        self._result(result.get("quoted_status_result", {}).get("result"), out)
+
+
+_default_extractor = TweetExtractor()
+
+
+def extract_tweets(data: dict, extractor: Optional[TweetExtractor] = None) -> list:
+    """Tweet objects on one timeline page, in page order (may contain repeats)."""
+    return (extractor or _default_extractor).extract(data)
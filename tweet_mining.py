@@ -2,14 +2,23 @@
 ## Sat 5 July 2025 ##
 
 from seleniumbase import Driver
-import json, time, base64, gzip, zlib, urllib.parse
-from threading import Event
+import time, urllib.parse
+from threading import Event, Lock
 import datetime as dat
-from datetime import datetime, timedelta
 import os
-from itertools import cycle
 import random
 
+from browser_pool import WarmBrowserPool
+from capture_pipeline import CapturePipeline
+from id_index import TweetIdIndex
+from lean_browser import block_heavy_resources, chrome_args
+from memory_watchdog import MemoryWatchdog
+from metrics import metrics
+from normalized_store import NormalizedSink, TweetNormalizer
+from output_store import TweetSink
+from rate_budget import RateBudget
+from timeline import TweetExtractor, is_timeline_end, top_level_tweet_ids, tweet_id
+
 usernames = [ 
             "medreyata"  # Let's try a different user
             ]
@@ -18,9 +27,25 @@ usernames = [
 since_date  = "2024-12-01"
 until_date  = "2025-07-01"
 max_scrolls = 300 
-SCROLL_PAUSE_SEC = 1.2  # wait time after each scroll
+SCROLL_TIMEOUT_SEC = 8        # max wait for the next page after a scroll
+SCROLL_NUDGE_SEC   = 1.0      # re-scroll this often while waiting
+FIRST_PAGE_TIMEOUT_SEC = 15
+MAX_IDLE_SCROLLS = 3          # consecutive scroll timeouts before giving up
+CAPTURE_WORKERS  = 2          # threads that fetch/parse bodies off the CDP callback
+CAPTURE_QUEUE_SIZE = 64       # queued bodies before the callback has to wait
+WARM_NEXT_PROFILE = True      # start the next profile's browser while the current one scrapes
+RATE_LIMIT_RESERVE = 2        # stop a profile when this many search requests are left
+LEAN_BROWSER = False          # block media/image/font URLs, small window, no GPU/extensions/autoplay
+LEAN_HEADLESS = False         # lean browsers without a window (easier for X to detect)
+DOM_PRUNE_EVERY = 20          # scrolls between removing captured tweets from the DOM (0 disables)
+MEMORY_SAMPLE_EVERY = 10      # scrolls between Performance.getMetrics samples
+MEMORY_HEAP_LIMIT_MB = 512    # JS heap at which the session ends and resumes in a fresh browser
+MEMORY_NODE_LIMIT = 150_000   # same for DOM nodes
+NORMALIZE_OUTPUT = False      # store each user version and nested tweet once (normalized_store), not per tweet
 # =======================================
 
+extractor = TweetExtractor()   # counts pages and generic-walk fallbacks
+
 # Chrome profile directories that contain session cookies
 available_directories = [
     'twitter_data_dir_tophaneliomer',  
@@ -37,9 +62,14 @@ available_directories = [
 ###############################################################################
 #  Helper functions
 ###############################################################################
-def build_search_url(until_date: str) -> str:
-    """Generates search URL with given until_date."""
+def build_search_url(until_date: str, max_id: int | None = None) -> str:
+    """
+    Generates search URL with given until_date. With max_id (one below the
+    oldest tweet already collected) the search continues exactly below it.
+    """
     query = f"from:{username} since:{since_date} until:{until_date}"
+    if max_id is not None:
+        query += f" max_id:{max_id}"
     print(f"Search query: {query}")
     return (
         "https://x.com/search?q=" +
@@ -49,110 +79,122 @@ def build_search_url(until_date: str) -> str:
 
 def make_driver(profile_dir: str) -> Driver:
     """Creates new SeleniumBase Driver with given profile directory."""
+    lean = {}
+    if LEAN_BROWSER:
+        lean = dict(chromium_arg=",".join(chrome_args()), block_images=True, headless2=LEAN_HEADLESS)
     return Driver(
         browser="chrome",
         uc=True,
         user_data_dir=f"./{profile_dir}",
         log_cdp_events=True,
         uc_cdp_events=True,
+        **lean,
     )
 
-def save_output(tweets: list[dict]) -> None:
-    """Saves collected tweets to outputs/ folder as JSON."""
-    os.makedirs("control_group_outputs", exist_ok=True)
+def warm_driver(driver: Driver) -> None:
+    """Loads x.com so a pre-launched browser is ready to search."""
+    driver.get("https://x.com/home")
+
+def open_output() -> TweetSink | NormalizedSink:
+    """Opens a new append-only store in control_group_outputs/ for this user (normalized with NORMALIZE_OUTPUT)."""
     timestamp = dat.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename  = f"{username}_full_objects_{timestamp}.json"
-    filepath  = os.path.join("control_group_outputs", filename)
-
-    last_saved = tweets[-1]["legacy"]["created_at"]  # required; otherwise KeyError
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "last_saved_tweet_date": last_saved,
-                "tweets": tweets,
-            },
-            f,
-            ensure_ascii=False,
-            indent=2,
-        )
-    print(f"{len(tweets)} tweet objects saved → {filename}")
-    print(f"Last saved tweet date: {last_saved}")
+    if NORMALIZE_OUTPUT:
+        return NormalizedSink(os.path.join("control_group_outputs", f"{username}_normalized_{timestamp}"))
+    return TweetSink(os.path.join("control_group_outputs", f"{username}_full_objects_{timestamp}"))
+
+
+def save_output(sink: TweetSink | NormalizedSink, tweets: list[dict]) -> None:
+    """Appends one session's tweets to the store; earlier tweets are not rewritten."""
+    if not tweets:
+        return
+    with metrics.time("save", user=username):
+        sink.append(tweets)
+    print(f"{len(tweets)} tweet objects saved → {sink.root.name} (total {sink.count})")
+    print(f"Last saved tweet date: {sink.last_saved_tweet_date}")
 
 
 
-def append_output(filepath: str, tweets: list[dict]) -> None:
+def append_output(name: str, tweets: list[dict]) -> None:
     """
-    Appends new tweet objects to an existing JSON file.
-    If file doesn't exist, creates new one like save_output.
+    Appends new tweet objects to the store outputs/<name>.
+    A legacy outputs/<name>.json file is imported into the store once.
     """
-    filepath = os.path.join("outputs", filepath)
-    dirpath = os.path.dirname(filepath)
-    if os.path.exists(filepath):
-        # Load existing content
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        existing = data.get("tweets", [])
-        combined = existing + tweets
-    else:
-        # Act like new file
-        combined = tweets
-        data = {}
-
-    last_saved = combined[-1]["legacy"]["created_at"]  # required; otherwise KeyError
-    data.update({
-        "last_saved_tweet_date": last_saved,
-        "tweets": combined,
-    })
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"{len(tweets)} tweets added → {os.path.basename(filepath)}")
-    print(f"Current last tweet date: {last_saved}")
+    name = name[:-5] if name.endswith(".json") else name
+    sink = TweetSink(os.path.join("outputs", name))
+    legacy = os.path.join("outputs", name + ".json")
+    if sink.count == 0 and os.path.exists(legacy):
+        sink.import_json(legacy)
+    sink.append(tweets)
+    print(f"{len(tweets)} tweets added → {name}")
+    print(f"Current last tweet date: {sink.last_saved_tweet_date}")
 
 ###############################################################################
 #  Main scraping function (runs once per profile)
 ###############################################################################
-def scrape_with_driver(driver: Driver, search_url: str,
-                       seen_ids: set[str]) -> tuple[bool, list[dict]]:
+def make_watchdog(driver: Driver, profile_dir: str) -> MemoryWatchdog:
+    return MemoryWatchdog(driver, heap_limit_mb=MEMORY_HEAP_LIMIT_MB, node_limit=MEMORY_NODE_LIMIT,
+                          prune_every=DOM_PRUNE_EVERY, sample_every=MEMORY_SAMPLE_EVERY,
+                          labels={"profile": profile_dir})
+
+
+def scrape_with_driver(driver: Driver, search_url: str, seen_ids: TweetIdIndex, budget: RateBudget,
+                       profile_dir: str, watchdog: MemoryWatchdog | None = None,
+                       normalizer: TweetNormalizer | None = None) -> tuple[bool, list[dict], int | None]:
     """
     Performs maximum max_scrolls scrolling with given driver & search_url.
-    * blocked  : True  → rate-limit / "Something went wrong" occurred
-                 False → normal termination (all tweets received)
-    * session_objects : new tweet objects collected in this session
+    * blocked  : True  → rate-limit / "Something went wrong" occurred, or
+                         the profile is about to run out of requests
+                 False → normal termination (all tweets received), or the
+                         browser went over its memory limit
+                         (watchdog.needs_recycle: resume in a fresh one)
+    * session_objects : new tweet objects collected in this session; with a
+                        `normalizer`, its tweet records instead (authors and
+                        nested tweets as references, see normalized_store)
+    * oldest_id : oldest timeline tweet ID seen (quoted/retweeted originals
+                  not counted), the point to resume from
     """
     full_objects_session: list[dict] = []
+    session_ids   : set[str] = set()
+    session_lock  = Lock()        # workers append while the scroll loop reads
+    progress      = {"oldest_id": None, "already_saved": 0}
     pending_ids   : dict[str, str] = {}
     first_batch_ready = Event()
+    page_parsed       = Event()   # set after every parsed timeline page
+    timeline_end      = Event()   # page without bottom cursor / new entries
+    budget_low        = Event()   # x-rate-limit-remaining reached the reserve
+    labels = {"profile": profile_dir, "user": username}   # for metrics
+    watchdog = watchdog or make_watchdog(driver, profile_dir)   # DOM pruning + memory samples
 
     # -------------------------- Extract tweets from JSON ----------------- #
 
     def extract_tweet_objects(obj):
-        if isinstance(obj, dict):
-            typename = obj.get("__typename")
-            
-            # Check two different tweet structures
-            if typename == "Tweet" and obj.get("legacy", {}).get("created_at"):
-                tid = obj.get("rest_id") or obj.get("id_str") or obj.get("id")
-                if tid and tid not in seen_ids:
-                    seen_ids.add(tid)
-                    full_objects_session.append(obj)
-                   
-            
-            # Also check tweets inside TimelineTimelineItem wrapper
-            elif typename == "TweetWithVisibilityResults":
-                tweet_obj = obj.get("tweet", {})
-                legacy_data = tweet_obj.get("legacy", {})
-                # Tweet inside TweetWithVisibilityResults may not have __typename, check rest_id
-                tid = tweet_obj.get("rest_id") or tweet_obj.get("id_str") or tweet_obj.get("id")
-                if tid and legacy_data.get("created_at") and tid not in seen_ids:
-                    seen_ids.add(tid)
-                    full_objects_session.append(tweet_obj)
-
-            for v in obj.values():
-                extract_tweet_objects(v)
-
-        elif isinstance(obj, list):
-            for item in obj:
-                extract_tweet_objects(item)
+        # Schema-directed walk over the timeline entries (see timeline.TweetExtractor)
+        tweets = extractor.extract(obj)
+        page_ids = [int(i) for i in top_level_tweet_ids(obj)]
+        with session_lock:
+            if page_ids:
+                known = [progress["oldest_id"]] if progress["oldest_id"] else []
+                progress["oldest_id"] = min(page_ids + known)
+            before = len(full_objects_session)
+            for tweet in tweets:
+                tid = tweet_id(tweet)
+                if not tid or tid in session_ids:
+                    continue
+                if tid in seen_ids:
+                    progress["already_saved"] += 1
+                    continue
+                session_ids.add(tid)
+                if normalizer is None:
+                    full_objects_session.append(tweet)
+                    continue
+                for record in normalizer.normalize(tweet):
+                    session_ids.add(tweet_id(record))
+                    full_objects_session.append(record)
+            metrics.inc("tweets", len(full_objects_session) - before, **labels)
+
+    def session_count() -> int:
+        with session_lock:
+            return len(full_objects_session)
 
     # --------------------------- CDP Event listeners ------------------- #
     def on_response(event):
@@ -160,67 +202,80 @@ def scrape_with_driver(driver: Driver, search_url: str,
         url = p.get("response", {}).get("url", "")
         if "UserTweets" in url or "SearchTimeline" in url:
             pending_ids[p["requestId"]] = url
+            response = p.get("response", {})
+            if budget.update(profile_dir, response.get("status", 0), response.get("headers", {})):
+                budget_low.set()
 
     def on_finished(event):
+        # Only queue the request; body fetch + parse happen on pipeline workers
         p   = event.get("params", {})
         rid = p.get("requestId")
-        if rid not in pending_ids:
-            return
-        
-        try:
-            body_obj = driver.execute_cdp_cmd(
-                "Network.getResponseBody", {"requestId": rid}
-            )
-        except Exception:
-            pending_ids.pop(rid, None)
-            return
-
-        body = body_obj.get("body", "")
-        if body_obj.get("base64Encoded"):
-            raw = base64.b64decode(body)
-            for decompress in (
-                lambda x: gzip.decompress(x),
-                lambda x: zlib.decompress(x, 16 + zlib.MAX_WBITS),
-                lambda x: x,
-            ):
-                try:
-                    body = decompress(raw).decode("utf-8")
-                    break
-                except Exception:
-                    pass
+        url = pending_ids.pop(rid, None)
+        if url is not None:
+            pipeline.submit(url, request_id=rid)
 
+    def fetch_body(rid):
+        body_obj = driver.execute_cdp_cmd(
+            "Network.getResponseBody", {"requestId": rid}
+        )
+        return body_obj.get("body", ""), body_obj.get("base64Encoded", False)
+
+    def handle_body(url, decoded, finished_ts):
+        # Body was decompressed by magic bytes + parsed once (orjson/msgspec if installed)
         try:
-            prev_count = len(full_objects_session)
-            parsed_json = json.loads(body)
-            extract_tweet_objects(parsed_json)
-            new_count = len(full_objects_session) - prev_count
-            
-            first_batch_ready.set()
-        except json.JSONDecodeError:
-            print("JSON parse error")
-            pass
-
-        pending_ids.pop(rid, None)
+            if decoded.is_rate_limited():
+                # An error body has no entries either; it must not read as the timeline end
+                budget_low.set()
+            elif decoded.ok:
+                parsed_json = decoded.data
+                with metrics.time("extract", **labels):
+                    extract_tweet_objects(parsed_json)
+                metrics.inc("pages", **labels)
+                if is_timeline_end(parsed_json):
+                    timeline_end.set()
+                
+                first_batch_ready.set()
+            else:
+                print("JSON parse error")
+        finally:
+            page_parsed.set()
+
+    pipeline = CapturePipeline(handle_body, fetch=fetch_body, workers=CAPTURE_WORKERS,
+                               maxsize=CAPTURE_QUEUE_SIZE, name="tweet-capture", labels=labels)
+
+    def scroll_until_page() -> bool:
+        """Scroll, re-scrolling every SCROLL_NUDGE_SEC, until the next page is parsed."""
+        with metrics.time("scroll_wait", **labels):
+            deadline = time.monotonic() + SCROLL_TIMEOUT_SEC
+            while True:
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if page_parsed.wait(timeout=min(SCROLL_NUDGE_SEC, remaining)):
+                    return True
 
     # --------------------------- Driver preparation -------------------------- #
     driver.add_cdp_listener("Network.responseReceived", on_response)
     driver.add_cdp_listener("Network.loadingFinished", on_finished)
     driver.execute_cdp_cmd("Network.enable", {})
-    driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+    if LEAN_BROWSER:
+        block_heavy_resources(driver)   # the HTTP cache stays on, app bundles come from disk
+    else:
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
 
     print("Navigated to URL:", search_url)
-    driver.get(search_url)
-    time.sleep(10)  # Increased wait time
-    driver.refresh()  # Really refresh the 'Latest' tab
-    
-    # # Wait for first batch
-    # print("Waiting for first tweet batch...")
-    # if first_batch_ready.wait(timeout=10):  # wait 10 seconds
-    #     print(f"First batch arrived, {len(full_objects_session)} tweets loaded")
-    # else:
-    #     print("First batch timeout - continuing")
-    
-    # time.sleep(1)  # Extra wait for any remaining responses
+    with metrics.time("first_page", **labels):
+        with metrics.time("navigate", **labels):
+            driver.get(search_url)
+
+        # Wait for first batch; refresh the 'Latest' tab only if it never came
+        print("Waiting for first tweet batch...")
+        if not first_batch_ready.wait(timeout=FIRST_PAGE_TIMEOUT_SEC):
+            print("First batch timeout - refreshing once")
+            driver.refresh()
+            first_batch_ready.wait(timeout=FIRST_PAGE_TIMEOUT_SEC)
+    print(f"First batch arrived, {session_count()} tweets loaded")
 
     try:
         driver.find_element(
@@ -230,35 +285,47 @@ def scrape_with_driver(driver: Driver, search_url: str,
         )
         blocked = True
         print("Rate-limit: 'Something went wrong' detected in interface.")
-        return True, full_objects_session
+        pipeline.close()
+        return True, full_objects_session, progress["oldest_id"]
     except Exception:
     # If element doesn't exist, do nothing, continue
         pass
 
     # ---------------------------- Scroll loop --------------------------- #
-    no_new_scrolls = 0
-    blocked        = False
+    idle_scrolls = 0
+    blocked      = False
     
-    print(f"Tweet count before scroll: {len(full_objects_session)}")
+    print(f"Tweet count before scroll: {session_count()}")
 
     for scroll_num in range(max_scrolls):
-        prev_count = len(full_objects_session)
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);") 
-        time.sleep(SCROLL_PAUSE_SEC)
-        
-        # Wait a bit more for responses to arrive
-        time.sleep(0.5)
+        # End of timeline: last page had no bottom cursor or no new entries
+        if timeline_end.is_set():
+            print("Timeline end reached – range completed.")
+            break
+        # Stop before the profile's requests run out rather than after errors
+        if budget_low.is_set():
+            blocked = True
+            print(f"{profile_dir} has {budget.remaining(profile_dir)} requests left – switching profile.")
+            break
+        if watchdog.needs_recycle:
+            print(f"Browser over its memory limit ({watchdog.summary()}) – continuing in a fresh one.")
+            break
+
+        prev_count = session_count()
+        page_parsed.clear()
+        got_page = scroll_until_page()
+        watchdog.after_scroll()
 
         # How many new tweets came after scroll?
-        new_count = len(full_objects_session) - prev_count
+        new_count = session_count() - prev_count
         if new_count > 0:
-            print(f"✓ Scroll {scroll_num+1} ⇒ {new_count} new tweets (session total {len(full_objects_session)})")
+            print(f"✓ Scroll {scroll_num+1} ⇒ {new_count} new tweets (session total {session_count()})")
 
-        # Did new tweets arrive?
-        if len(full_objects_session) == prev_count:
-            no_new_scrolls += 1
-            if no_new_scrolls >= 3:
-                # No new tweets in 3 consecutive scrolls → check if blocked or finished
+        # Did a page arrive at all?
+        if not got_page:
+            idle_scrolls += 1
+            if idle_scrolls >= MAX_IDLE_SCROLLS:
+                # No response in consecutive scrolls → check if blocked or stalled
                 try:
                     driver.find_element(
                         "xpath",
@@ -268,87 +335,125 @@ def scrape_with_driver(driver: Driver, search_url: str,
                     blocked = True
                     print("Rate-limit: 'Something went wrong' detected in interface.")
                 except Exception:
-                    print("No new tweets in 3 consecutive scrolls – probably range completed.")
+                    print(f"No page in {MAX_IDLE_SCROLLS} consecutive scrolls – stopping.")
                 break
         else:
-            no_new_scrolls = 0
+            idle_scrolls = 0
 
-    print(f"New tweets collected in session: {len(full_objects_session)}")
-    return blocked, full_objects_session
+    # Let the workers finish pages still in flight while the driver is alive
+    pipeline.close()
+    print(f"New tweets collected in session: {session_count()}")
+    print(f"Extractor stats (pages / fallbacks): {dict(extractor.stats)}")
+    print(f"Capture pipeline: {pipeline.summary()}")
+    print(f"Tweets fetched again that were already saved: {progress['already_saved']}")
+    return blocked, full_objects_session, progress["oldest_id"]
 
 ###############################################################################
 #  Profile rotation & main flow
 ###############################################################################
-wait_sec = 3
-summary: list[dict] = []
-for username in usernames:
-    print(f"\n=== Starting process with user: {username} ===")
-    # Clean start
-    seen_ids: set[str] = set()
-    full_objects: list[dict] = []
-    # Initial settings for profile rotation
-    start_idx = random.randrange(len(available_directories))
-    profile_cycle = cycle(available_directories[start_idx:] + available_directories[:start_idx])
-    current_until = until_date
-    try:
-        while True:
-            profile_dir = next(profile_cycle)
-            print(f"\n=== Continuing with profile directory: {profile_dir} ===")
-
-            search_url = build_search_url(current_until)
-            driver     = make_driver(profile_dir)
-
-            try:
-                blocked, session_objs = scrape_with_driver(driver, search_url, seen_ids)
-            finally:
-                driver.quit()
-
-            full_objects.extend(session_objs)
-
-            # ── Completed? ───────────────────────────────────────────────────── #
-            if not blocked:
-                print("No block → Tweet scraping process completed.")
-                summary.append({
-                    'username': username,
-                    'count': len(full_objects),
-                    'status': 'success'
-                })
-                break
-
-            # ── Rate-limit: update until_date + wait + switch to other profile ─────── #
-            if session_objs:  # if we have data from session
-                raw_date = session_objs[-1]["legacy"]["created_at"]  # required; otherwise KeyError
-                # "created_at" example: "Thu Mar 13 09:59:29 +0000 2025"
-                last_dt  = datetime.strptime(raw_date, "%a %b %d %H:%M:%S %z %Y").replace(tzinfo=None)
-                current_until = (last_dt + timedelta(days=1)).date().isoformat()
-                print(f"Rate-limit → new until_date: {current_until}")
-
-            print(f"Waiting {wait_sec} seconds, then switching to other profile…")
-            time.sleep(wait_sec)
+if __name__ == "__main__":  # scrape_with_driver can be imported (e.g. by bench_crawl.py)
+    wait_sec = 3
+    summary: list[dict] = []
+    # IDs of every tweet saved so far, across users and runs (snowflake index on disk)
+    seen_ids = TweetIdIndex("tweet_id_index")
+    # x-rate-limit-* state per profile, so exhausted profiles are skipped until their reset
+    budget = RateBudget("rate_budget.json", reserve=RATE_LIMIT_RESERVE)
+    for username in usernames:
+        print(f"\n=== Starting process with user: {username} ===")
+        sink = open_output()
+        # Initial settings for profile rotation
+        start_idx = random.randrange(len(available_directories))
+        rotation = available_directories[start_idx:] + available_directories[:start_idx]
+        # Next profile with requests left (or the first to reset), in rotation order
+        next_idx = budget.next_profile(rotation, len(rotation) - 1)
+        browsers = WarmBrowserPool(make_driver, warm=warm_driver)
+        resume_max_id = None       # continue below the oldest tweet of the blocked session
+        try:
+            while True:
+                # The profile picked last round may have run out since: re-check from it on
+                profile_idx = budget.next_profile(rotation, next_idx - 1)
+                next_idx    = budget.next_profile(rotation, profile_idx)
+                profile_dir, next_dir = rotation[profile_idx], rotation[next_idx]
+                prewarmed = WARM_NEXT_PROFILE and next_dir != profile_dir
+                with metrics.time("rotation_wait", profile=profile_dir, user=username):
+                    budget.wait_until_ready(profile_dir)
+                print(f"\n=== Continuing with profile directory: {profile_dir} ===")
+
+                search_url = build_search_url(until_date, resume_max_id)
+                driver     = browsers.acquire(profile_dir)
+                watchdog   = make_watchdog(driver, profile_dir)
+                if prewarmed:
+                    browsers.prefetch(next_dir)   # launches while this profile scrapes
 
-        ###############################################################################
-        #  SAVE
-        ###############################################################################
+                try:
+                    with metrics.time("window", profile=profile_dir, user=username):
+                        blocked, session_objs, oldest_id = scrape_with_driver(
+                            driver, search_url, seen_ids, budget, profile_dir, watchdog,
+                            normalizer=sink.normalizer if NORMALIZE_OUTPUT else None)
+                finally:
+                    browsers.release(profile_dir, driver)
+
+                # Stream this session's tweets to disk right away, then mark them seen
+                save_output(sink, session_objs)
+                seen_ids.add_many(tweet_id(t) for t in session_objs)
+
+                # ── Memory limit: same profile, new browser, below the oldest tweet ── #
+                if not blocked and watchdog.needs_recycle and oldest_id:
+                    resume_max_id = oldest_id - 1
+                    next_idx = profile_idx
+                    print(f"Relaunching {profile_dir}, resuming below tweet {oldest_id}")
+                    continue
+
+                # ── Completed? ───────────────────────────────────────────────────── #
+                if not blocked:
+                    print("No block → Tweet scraping process completed.")
+                    summary.append({
+                        'username': username,
+                        'count': sink.count,
+                        'status': 'success'
+                    })
+                    break
 
-        if full_objects: 
-            #append_output("kilavuzyayin_full_objects_20250704_145846.json", full_objects)
-            save_output(full_objects)
-        else:
-            print("No tweets could be collected.")
-    except Exception as e:
-        print(f"Unexpected error occurred: {e}. Saving available data...")
-        summary.append({
-            'username': username,
-            'count': len(full_objects),
-            'status': 'error',
-            'error': str(e)
-        })
-        try:
-            save_output(full_objects)
-        except Exception as save_err:
-            print(f"❌ Error while saving data: {save_err}")
-
-    finally:
-            print("\n=== Summary for All Users ===")
-            for item in summary:
-                print(f"- {item['username']}: {item['status']} — {item['count']} tweet")
\ No newline at end of file
+                # ── Rate-limit: resume below the oldest tweet + switch to other profile ── #
+                if not budget.ready_at(profile_dir):
+                    budget.update(profile_dir, 429, {})   # blocked without warning from the headers
+                if oldest_id:  # if the session got any timeline page
+                    # max_id is inclusive, so one below the oldest tweet continues
+                    # exactly where this session stopped instead of a day later.
+                    resume_max_id = oldest_id - 1
+                    print(f"Rate-limit → resuming below tweet {oldest_id} (max_id:{resume_max_id})")
+
+                if prewarmed:
+                    print("Switching to the pre-warmed profile…")
+                else:
+                    print(f"Waiting {wait_sec} seconds, then switching to other profile…")
+                    with metrics.time("rotation_wait", profile=profile_dir, user=username):
+                        time.sleep(wait_sec)
+
+            ###############################################################################
+            #  SAVE
+            ###############################################################################
+
+            # Tweets were appended after every session; read back with
+            # output_store.read_output(sink.root) for the single-document shape
+            # (normalized_store.NormalizedReader(sink.root) rehydrates a normalized store).
+            if sink.count:
+                print(f"{sink.count} tweet objects in {sink.root}")
+            else:
+                print("No tweets could be collected.")
+        except Exception as e:
+            print(f"Unexpected error occurred: {e}. Tweets of finished sessions are already saved.")
+            summary.append({
+                'username': username,
+                'count': sink.count,
+                'status': 'error',
+                'error': str(e)
+            })
+
+        finally:
+                browsers.close()
+                print(f"Browser timings (startup / idle / switch): {browsers.summary()}")
+                print(f"Phase timings:\n{metrics.summary()}")
+                print("\n=== Summary for All Users ===")
+                for item in summary:
+                    print(f"- {item['username']}: {item['status']} — {item['count']} tweet")
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Capture X (Twitter) GraphQL responses containing 'SearchTimeline' using
-Chrome DevTools (performance logs + CDP) with undetected-chromedriver (UC).
+Chrome DevTools (CDP event stream or performance logs) with
+undetected-chromedriver (UC).
 
 Features:
 - Iterates through date windows (e.g., 15 days)
@@ -15,27 +16,101 @@ Features:
 import os
 import time
 import json
-import base64
+import statistics
 import threading
 import datetime
+import asyncio
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple, Union
 import undetected_chromedriver as uc
 
+import body_decode
+from body_decode import DecodedBody
+from browser_pool import WarmBrowserPool
+from capture_pipeline import CapturePipeline
+from cdp_async import get_hub
+from graphql_replay import TimelineReplayer, cookie_header
+from id_index import TweetIdIndex, drop_seen_entries
+from job_queue import Job, JobQueue
+from lean_browser import block_heavy_resources, chrome_args
+from memory_watchdog import MemoryWatchdog, recycle_tab
+from metrics import SamplingProfiler, metrics
+from monitor import MonitorState
+from rate_budget import RateBudget
+from response_archive import ResponseArchive
+from tab_pool import BrowserTabs
+from timeline import (TweetExtractor, bottom_cursor, content_entry_count, entry_author, entry_tweet_ids,
+                      timeline_instructions, top_level_tweet_ids)
+from window_planner import WindowPlanner, pack_accounts, parse_bound, search_query
+
 
 # -------------------- Configuration -------------------- #
 USERNAMES = ["realDonaldTrump", "elonmusk"]
 SINCE_DATE = "2025-10-01"
 UNTIL_DATE = "2025-10-07"
-DATE_WINDOW_DAYS = 1
+DATE_WINDOW_DAYS = 1  # starting span; adaptive windows grow/shrink it per user
+ADAPTIVE_WINDOWS = True  # split windows that hit SCROLLS, widen after sparse ones
+MIN_WINDOW_HOURS = 1  # never split below this
+MAX_WINDOW_DAYS = 31  # never widen above this
+SPARSE_WINDOW_TWEETS = 20  # fewer tweets than this widens the next window
+BATCH_QUERIES = False  # search quiet accounts together, (from:a OR from:b ...), and split the pages by author
+BATCH_TWEETS_PER_QUERY = 200  # expected tweets per window of one batched search; busier accounts search alone
+BATCH_DEFAULT_TWEETS_PER_DAY = 5  # expected volume of an account nothing is known about
+ACCOUNT_TWEETS_PER_DAY: Dict[str, float] = {}  # known volumes, e.g. {"elonmusk": 80}; else the monitor's rate
+UNROUTED_USER = "_unrouted"  # batched search results by none of its accounts are saved under this name
 
 SCROLLS = 100
-SCROLL_PAUSE = 1.2
+SCROLL_TIMEOUT = 8  # max seconds to wait for the next page after a scroll
+SCROLL_NUDGE = 1.0  # re-scroll this often while waiting, in case the DOM was not ready
+FIRST_PAGE_TIMEOUT = 15
+MAX_IDLE_SCROLLS = 3  # consecutive scroll timeouts before a window counts as done
+NO_RESPONSE_RETRIES = 2  # fresh-browser retries of a window that got no SearchTimeline response at all
 OUT_DIR = Path("tweet_responses")
-ROTATE_DELAY = 10  # seconds before trying next profile
+ARCHIVE_DIR = None  # e.g. Path("response_archive"): pack pages into compressed segments instead of one file per page in OUT_DIR
+ROTATE_DELAY = 10  # seconds before trying next profile (skipped when it was pre-warmed)
+WARM_NEXT_PROFILE = True  # launch the next profile in the background while the current one scrapes
+WARM_URL = "https://x.com/home"
+CAPTURE_MODE = "poll"  # "poll" (performance logs), "events" (CDP websocket push) or "async" (one asyncio loop for every tab)
+POLL_INTERVAL = 0.8  # seconds between performance-log reads in "poll" mode
+LEAN_BROWSER = False  # block media/image/font URLs, small window, no GPU/extensions/autoplay
+LEAN_HEADLESS = False  # lean browsers without a window (easier for X to detect)
+LEAN_WINDOW_SIZE = (800, 900)
+DOM_PRUNE_EVERY = 20  # scrolls between removing captured tweets from the DOM (0 disables)
+DOM_KEEP_SCREENS = 3  # screen heights of tweets kept above the viewport
+MEMORY_SAMPLE_EVERY = 10  # scrolls between Performance.getMetrics samples (0 disables)
+MEMORY_HEAP_LIMIT_MB = 512  # JS heap that makes the crawler recycle at the next window
+MEMORY_NODE_LIMIT = 150_000  # DOM nodes that do the same
+MEMORY_RECYCLE = "tab"  # "tab" (new tab, same browser) or "browser" (relaunch the profile)
+CAPTURE_URL_MARKER = "SearchTimeline"
+CAPTURE_WORKERS = 2  # threads that fetch, decode and save bodies off the CDP callback
+CAPTURE_QUEUE_SIZE = 64  # pending bodies before the callback has to wait (backpressure)
+REPLAY_PAGES = False  # fetch pages 2+ directly by cursor instead of scrolling
+PARALLEL_PROFILES = 0  # >0 runs that many profiles at once over a shared window queue
+PROFILE_COOLDOWN = 15 * 60  # seconds a rate-limited profile rests in parallel mode
+TABS_PER_PROFILE = 1  # parallel mode: windows one browser captures at once, one tab each (all spend its budget)
+JOB_QUEUE = None  # e.g. Path("crawl_jobs.sqlite"): parallel mode leases windows and profiles from it, shared by hosts
+JOB_LEASE_SECONDS = 10 * 60  # a window or profile not heard from for this long is taken over by another worker
+PROFILE_LEASE_POLL = 30  # max seconds between tries while other crawlers hold every profile
 LOG_DIR = Path("logs")
+ID_INDEX_DIR = None  # e.g. Path("tweet_id_index"): drop tweets captured before (see id_index.py)
+RATE_BUDGET_FILE = Path("rate_budget.json")  # per-profile x-rate-limit-* state, kept across runs
+RATE_LIMIT_RESERVE = 2  # stop a profile when this many SearchTimeline requests are left
+METRICS_PORT = 0  # >0 serves http://127.0.0.1:<port>/metrics (Prometheus) and /metrics.json
+METRICS_SNAPSHOT = LOG_DIR / "metrics.json"  # rewritten every METRICS_INTERVAL seconds; None disables
+METRICS_INTERVAL = 30
+MONITOR = False  # keep USERNAMES current (new tweets only) instead of backfilling SINCE_DATE..UNTIL_DATE
+MONITOR_STATE_FILE = Path("monitor_state.json")  # per-user high-water tweet ID and poll schedule
+MONITOR_TARGET_TWEETS = 20  # poll an account when about this many new tweets are expected
+MONITOR_MIN_INTERVAL = 5 * 60  # seconds between polls of the busiest accounts
+MONITOR_MAX_INTERVAL = 6 * 3600  # seconds between polls of accounts that never post
+MONITOR_BOOTSTRAP_DAYS = 1  # history fetched for an account without a high-water mark
+PROFILE_OUT = None  # e.g. LOG_DIR / "profile.folded": sample all threads' stacks for a flame graph
+PROFILE_INTERVAL = 0.005  # seconds between profiler samples
 LOG_DIR.mkdir(exist_ok=True)
 
 AVAILABLE_DIRECTORIES = [
@@ -66,8 +141,13 @@ def setup_logger():
     file_handler.setFormatter(formatter)
 
     if not logger.handlers:
-        logger.addHandler(console_handler)
-        logger.addHandler(file_handler)
+        # Callers only enqueue records; formatting and the rotating file write
+        # happen on the listener thread.
+        log_queue: "queue.Queue" = queue.Queue(-1)
+        listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(QueueHandler(log_queue))
     return logger
 
 
@@ -75,31 +155,182 @@ logger = setup_logger()
 
 
 # -------------------- Helpers -------------------- #
-def daterange_chunks(start_date: str, end_date: str, days: int):
-    start = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
-    end = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
-    while start < end:
-        until = min(start + datetime.timedelta(days=days), end)
-        yield (start.isoformat(), until.isoformat())
-        start = until
+Accounts = Union[str, List[str]]  # one username, or the accounts of a batched search
+
+
+def members(username: Accounts) -> List[str]:
+    return [username] if isinstance(username, str) else list(username)
+
+
+def label(username: Accounts) -> str:
+    """How logs and metrics name a username or a batch of them."""
+    return "+".join(members(username))
+
+
+def expected_tweets_per_day(usernames: List[str]) -> Dict[str, float]:
+    """ACCOUNT_TWEETS_PER_DAY, else the monitor's rate for the account, else BATCH_DEFAULT_TWEETS_PER_DAY."""
+    rates = make_monitor_state().users if MONITOR_STATE_FILE and MONITOR_STATE_FILE.exists() else {}
+    volumes = {}
+    for username in usernames:
+        rate = rates.get(username, {}).get("rate")
+        volumes[username] = ACCOUNT_TWEETS_PER_DAY.get(
+            username, rate * 24 if rate is not None else BATCH_DEFAULT_TWEETS_PER_DAY)
+    return volumes
+
 
+def plan_batches(usernames: List[str], volumes: Optional[Dict[str, float]] = None) -> List[Accounts]:
+    """
+    Pack `usernames` into batched searches of about BATCH_TWEETS_PER_QUERY tweets
+    each; `volumes` are the tweets expected per account (default: per date window).
+    """
+    if volumes is None:
+        volumes = {u: v * DATE_WINDOW_DAYS for u, v in expected_tweets_per_day(usernames).items()}
+    groups = pack_accounts(volumes, BATCH_TWEETS_PER_QUERY)
+    logger.info(f"{len(usernames)} accounts in {len(groups)} searches: "
+                f"{', '.join(label(g) for g in groups if len(g) > 1) or 'no batches'}")
+    return [g[0] if len(g) == 1 else g for g in groups]
 
-def build_search_url(username: str, since_date: str, until_date: str) -> str:
+
+def build_search_url(username: Accounts, since_date: str, until_date: str) -> str:
     import urllib.parse
-    q = f"from:{username} since:{since_date} until:{until_date}"
+    q = search_query(username, since_date, until_date)
     return "https://x.com/search?q=" + urllib.parse.quote(q, safe="") + "&src=typed_query&f=live"
 
 
+def make_planner(username: Accounts) -> WindowPlanner:
+    return WindowPlanner(
+        SINCE_DATE, UNTIL_DATE, DATE_WINDOW_DAYS,
+        done=completed_windows(username),
+        min_span=datetime.timedelta(hours=MIN_WINDOW_HOURS),
+        max_span=datetime.timedelta(days=MAX_WINDOW_DAYS if ADAPTIVE_WINDOWS else DATE_WINDOW_DAYS),
+        sparse_tweets=SPARSE_WINDOW_TWEETS if ADAPTIVE_WINDOWS else 0,
+    )
+
+
+_id_index: Optional[TweetIdIndex] = None
+_id_index_lock = threading.Lock()
+_archive: Optional[ResponseArchive] = None
+_archive_lock = threading.Lock()
+rate_budget = RateBudget(RATE_BUDGET_FILE, reserve=RATE_LIMIT_RESERVE)
+_author_ids: Dict[str, str] = {}  # author ID -> username, learned by batched searches
+
+
+def get_id_index() -> Optional[TweetIdIndex]:
+    """The process-wide tweet ID index shared by every crawler and window."""
+    global _id_index
+    if ID_INDEX_DIR is None:
+        return None
+    with _id_index_lock:
+        if _id_index is None:
+            _id_index = TweetIdIndex(ID_INDEX_DIR)
+            logger.info(f"Loaded tweet ID index {ID_INDEX_DIR} ({len(_id_index)} ids)")
+        return _id_index
+
+
+def get_archive() -> Optional[ResponseArchive]:
+    """The process-wide response archive, or None when pages are written as files."""
+    global _archive
+    if ARCHIVE_DIR is None:
+        return None
+    with _archive_lock:
+        if _archive is None:
+            _archive = ResponseArchive(ARCHIVE_DIR)
+        return _archive
+
+
+def close_archive():
+    """Seal the archive's active segment (pages stay readable if this never runs)."""
+    if _archive is not None:
+        _archive.close()
+        logger.info(f"Response archive {ARCHIVE_DIR}: {_archive.stats}")
+
+
 # -------------------- State Management -------------------- #
+_state_lock = threading.Lock()
+
+
 def state_file(username: str) -> Path:
     return Path(f"crawl_state_{username}.json")
 
 
-def save_state(username: str, profile_idx: int, since: str, until: str):
-    data = {"last_profile_idx": profile_idx, "last_since": since, "last_until": until}
-    with open(state_file(username), "w") as f:
+def _write_state(username: str, data: dict):
+    path = state_file(username)
+    tmp = path.with_suffix(".json.tmp")
+    with open(tmp, "w") as f:
         json.dump(data, f)
-    logger.info(f"Progress saved for {username}: profile={profile_idx}, {since}->{until}")
+    os.replace(tmp, path)
+
+
+def save_state(username: Accounts, profile_idx: int, since: str, until: str):
+    with _state_lock:
+        for user in members(username):
+            data = load_state(user) or {}
+            data.update({"last_profile_idx": profile_idx, "last_since": since, "last_until": until})
+            _write_state(user, data)
+    logger.info(f"Progress saved for {label(username)}: profile={profile_idx}, {since}->{until}")
+
+
+def save_checkpoint(username: Accounts, since: str, until: str, oldest_id: Optional[int], cursor: Optional[str]):
+    """Record how far an unfinished window got: oldest tweet captured and last bottom cursor."""
+    with _state_lock:
+        for user in members(username):
+            data = load_state(user) or {}
+            data.setdefault("checkpoints", {})[f"{since}|{until}"] = {
+                "oldest_id": str(oldest_id) if oldest_id else None, "cursor": cursor,
+            }
+            _write_state(user, data)
+
+
+def pop_checkpoints(username: Accounts) -> List[Tuple[str, str, Optional[int], Optional[str]]]:
+    """
+    Remove and return (since, until, oldest_id, cursor) of windows left
+    unfinished. For a batch, a window checkpointed by several of its accounts
+    resumes from the least progress any of them made.
+    """
+    checkpoints: Dict[str, dict] = {}
+    with _state_lock:
+        for user in members(username):
+            data = load_state(user) or {}
+            found = data.pop("checkpoints", {})
+            if found:
+                _write_state(user, data)
+            for key, cp in found.items():
+                known = checkpoints.get(key)
+                if known is None or not cp.get("oldest_id") or (
+                        known.get("oldest_id") and int(cp["oldest_id"]) > int(known["oldest_id"])):
+                    checkpoints[key] = cp
+    out = []
+    for key, cp in checkpoints.items():
+        since, until = key.split("|")
+        oldest_id = int(cp["oldest_id"]) if cp.get("oldest_id") else None
+        out.append((since, until, oldest_id, cp.get("cursor")))
+    return out
+
+
+def mark_window_done(username: Accounts, since: str, until: str, checkpoint: Optional[Tuple[str, str]] = None):
+    """
+    Record a finished window (and drop the checkpoint of the window it came
+    from); safe to call from several crawler threads.
+    """
+    since_cp, until_cp = checkpoint or (since, until)
+    with _state_lock:
+        for user in members(username):
+            data = load_state(user) or {}
+            done = {tuple(w) for w in data.get("done_windows", [])}
+            done.add((since, until))
+            data["done_windows"] = sorted(done)
+            data.get("checkpoints", {}).pop(f"{since_cp}|{until_cp}", None)
+            _write_state(user, data)
+
+
+def completed_windows(username: Accounts) -> Set[Tuple[str, str]]:
+    """Windows done for the account (for a batch: done for every account in it)."""
+    done = None
+    for user in members(username):
+        state = load_state(user) or {}
+        windows = {tuple(w) for w in state.get("done_windows", [])}
+        done = windows if done is None else done & windows
+    return done or set()
 
 
 def load_state(username: str):
@@ -114,30 +345,78 @@ def load_state(username: str):
         return None
 
 
-def clear_state(username: str):
-    path = state_file(username)
-    if path.exists():
-        path.unlink()
-        logger.info(f"Cleared saved state for {username}")
+def clear_state(username: Accounts):
+    for user in members(username):
+        path = state_file(user)
+        if path.exists():
+            path.unlink()
+            logger.info(f"Cleared saved state for {user}")
 
 
 # -------------------- Browser / CDP Classes -------------------- #
+def start_chrome(profile_dir: str, capture_mode: str = CAPTURE_MODE):
+    """Start UC Chrome on `profile_dir` with the Network domain enabled (lean with LEAN_BROWSER)."""
+    profile_dir = os.path.abspath(profile_dir)
+    options = uc.ChromeOptions()
+    options.add_argument(f"--user-data-dir={profile_dir}")
+    if LEAN_BROWSER:
+        for arg in chrome_args(LEAN_WINDOW_SIZE):
+            options.add_argument(arg)
+    else:
+        options.add_argument("--start-maximized")
+    options.add_argument("--ignore-certificate-errors")
+    if TABS_PER_PROFILE > 1:
+        # Tabs in the background must keep rendering and running timers, or scrolls load nothing.
+        options.add_argument("--disable-background-timer-throttling")
+        options.add_argument("--disable-backgrounding-occluded-windows")
+        options.add_argument("--disable-renderer-backgrounding")
+    if capture_mode == "poll":
+        # Only the polling listener reads these; left unread they pile up in chromedriver.
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    options.set_capability("browserName", "chrome")
+
+    logger.info(f"Starting {'lean ' if LEAN_BROWSER else ''}Chrome with profile: {profile_dir}")
+    driver = uc.Chrome(options=options, headless=LEAN_BROWSER and LEAN_HEADLESS)
+    prepare_tab(driver)
+    return driver
+
+
+def prepare_tab(driver):
+    """Per-tab CDP setup: the Network domain, and media blocking in lean mode."""
+    driver.execute_cdp_cmd("Network.enable", {})
+    if LEAN_BROWSER:
+        block_heavy_resources(driver)
+
+
+def make_watchdog(driver, profile_dir: Optional[str]) -> MemoryWatchdog:
+    return MemoryWatchdog(
+        driver, heap_limit_mb=MEMORY_HEAP_LIMIT_MB, node_limit=MEMORY_NODE_LIMIT,
+        prune_every=DOM_PRUNE_EVERY, keep_screens=DOM_KEEP_SCREENS, sample_every=MEMORY_SAMPLE_EVERY,
+        labels={"profile": profile_dir},
+    )
+
+
+def fresh_tab(driver, watchdog: MemoryWatchdog) -> MemoryWatchdog:
+    """Swap the tab of a browser over its memory limit; returns the watchdog for the new tab."""
+    logger.info(f"Recycling the tab of {watchdog.labels.get('profile')}: {watchdog.summary()}")
+    recycle_tab(driver, prepare_tab)
+    return make_watchdog(driver, watchdog.labels.get("profile"))
+
+
+def warm_browser(driver):
+    """Load x.com so session cookies and the app shell are in place before a search."""
+    driver.get(WARM_URL)
+
+
 class UCSession:
-    def __init__(self, profile_dir: str):
+    def __init__(self, profile_dir: str, capture_mode: str = CAPTURE_MODE):
         self.profile_dir = os.path.abspath(profile_dir)
+        self.capture_mode = capture_mode
         self.driver = None
 
     def __enter__(self):
-        options = uc.ChromeOptions()
-        options.add_argument(f"--user-data-dir={self.profile_dir}")
-        options.add_argument("--start-maximized")
-        options.add_argument("--ignore-certificate-errors")
-        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
-        options.set_capability("browserName", "chrome")
-
-        logger.info(f"Starting Chrome with profile: {self.profile_dir}")
-        self.driver = uc.Chrome(options=options)
-        self.driver.execute_cdp_cmd("Network.enable", {})
+        with metrics.time("browser_start", profile=self.profile_dir):
+            self.driver = start_chrome(self.profile_dir, self.capture_mode)
         return self.driver
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -149,21 +428,131 @@ class UCSession:
         logger.info(f"Closed browser for {self.profile_dir}")
 
 
+ENCODED_LENGTH = re.compile(r'"encodedDataLength":\s*([\d.]+)')
+
+
 class CDPResponseSaver(threading.Thread):
-    def __init__(self, driver, out_dir, poll_interval=0.8):
+    """
+    Saves SearchTimeline response bodies for one date window.
+
+    mode="events" subscribes to the Network events below over the browser's
+    DevTools websocket and reacts as they arrive; mode="poll" drains the
+    chromedriver performance log every `poll_interval` seconds. mode="async"
+    runs no thread of its own: `start()` attaches a session for the tab to
+    the process-wide cdp_async hub, whose single event loop serves every
+    saver and pipelines `Network.getResponseBody` calls. All modes only
+    read a body after `Network.loadingFinished` for a request whose URL
+    matched, and record the finished -> persisted latency of every page.
+
+    The first matching request (URL + headers) and the latest bottom cursor
+    are kept so the rest of the timeline can be replayed without scrolling.
+    With an `id_index`, entries whose tweets were captured before (in any
+    window or run) are dropped from a page before it is written. The oldest
+    tweet ID seen and the last cursor are handed to `on_page` after every
+    page, so an interrupted window can be resumed where it stopped. With a
+    `budget`, the x-rate-limit headers of every SearchTimeline response are
+    recorded for `profile` and the window stops before the budget runs out.
+    With an `archive`, pages are appended to it under `archive_key`
+    (user, window) instead of being written to `out_dir` one file each.
+    `newest_id` is the newest tweet seen and `new_tweets` counts tweets newer
+    than `high_water` (all of them without one), for the monitor; for a
+    multi-account search `user_newest` / `user_new_tweets` hold the same per
+    user, against that user's mark in `high_waters`.
+    With `users`, the window is a multi-account search: every page is split
+    by the author of each entry and saved once per user, under
+    (user, window) in the archive or `out_dir/<user>/<window>`.
+    `author_ids` (author ID -> username) routes accounts that no longer go
+    by the screen name they were searched under; new IDs are added to it.
+    Entries of unknown authors go to UNROUTED_USER.
+    Phase timings and counters go to `metrics`, labelled with `profile` and `user`,
+    including the bytes the page received and the requests lean mode blocked.
+
+    Event handling only queues finished requests; a CapturePipeline fetches,
+    decodes and saves them on worker threads, so `process_body` holds a lock.
+    """
+
+    NETWORK_EVENTS = (
+        "Network.requestWillBeSent",
+        "Network.responseReceived",
+        "Network.loadingFinished",
+        "Network.loadingFailed",
+    )
+
+    def __init__(self, driver, out_dir, poll_interval=POLL_INTERVAL, mode=CAPTURE_MODE, id_index=None, on_page=None,
+                 budget: Optional[RateBudget] = None, profile: Optional[str] = None,
+                 archive: Optional[ResponseArchive] = None, archive_key: Optional[Tuple[str, str]] = None,
+                 user: Optional[str] = None, high_water: Optional[int] = None,
+                 users: Optional[List[str]] = None, author_ids: Optional[Dict[str, str]] = None,
+                 high_waters: Optional[Dict[str, int]] = None):
         super().__init__(daemon=True)
         self.driver = driver
         self.out_dir = out_dir
+        self.archive = archive
+        self.archive_key = archive_key
+        self.id_index = id_index
+        self.on_page = on_page  # called with the saver after each page with content
+        self.budget = budget
+        self.profile = profile
+        self.labels = {"profile": profile, "user": user}
+        self.budget_exhausted = False  # stop after the page in flight: no requests left
+        self.extractor = TweetExtractor()
         self.poll_interval = poll_interval
+        self.mode = mode
         self.running = False
+        self.ready = threading.Event()
+        self.listener_error: Optional[Exception] = None  # events / async: the listener could not attach or died
         self.seen_request_ids = set()
+        self.pending: Dict[str, str] = {}  # request_id -> url, until loadingFinished
+        self.clock_offset: Optional[float] = None  # wall clock minus CDP monotonic clock
+        self.capture_latencies: List[float] = []
+        self.bootstrap_request: Optional[Tuple[str, Dict[str, str]]] = None  # (url, headers)
+        self.last_cursor: Optional[str] = None
         self.counter = 0
+        self.content_pages = 0
+        self.tweets_seen = 0  # top-level tweets on captured pages, duplicates included
+        self.oldest_id: Optional[int] = None  # the window is covered from here up to `until`
+        self.newest_id: Optional[int] = None
+        self.high_water = high_water
+        self.new_tweets = 0
+        self.users = list(users or [])
+        self._users_by_name = {u.lower(): u for u in self.users}
+        self.author_ids = author_ids if author_ids is not None else {}
+        self.user_tweets: Dict[str, int] = {}  # multi-account search: top-level tweets per user
+        self.high_waters = high_waters or {}
+        self.user_newest: Dict[str, int] = {}
+        self.user_new_tweets: Dict[str, int] = {}
+        self.duplicates_dropped = 0
         self.last_response_time = 0
+        self.done = False  # rate limit or end of window: ignore further bodies
         self.rate_limited = False
-        self.no_more_tweets = False
+        self.no_more_tweets = False  # window has no tweets at all
+        self.timeline_end = False  # last page of a non-empty window was captured
+        self.page_parsed = threading.Event()  # set after every processed body
+        self._lock = threading.Lock()
+        self._session = None  # async mode: cdp_async.CDPSession of the tab
+        self._fetches = set()  # async mode: getResponseBody calls in flight
+        self._detached = None  # async mode: future of the session's detach
+        self.pipeline = CapturePipeline(
+            self.process_body, fetch=self._read_body,
+            workers=CAPTURE_WORKERS, maxsize=CAPTURE_QUEUE_SIZE, name="capture", labels=self.labels,
+            ordered=True,  # an empty or last page ends the window; pages above it must be saved first
+        )
 
     def run(self):
         self.running = True
+        if self.mode == "events":
+            try:
+                import trio
+                trio.run(self._listen_events)
+            except Exception as e:
+                self.listener_error = e
+                logger.exception(f"CDP event listener failed: {e}")
+            finally:
+                self.ready.set()
+                self.running = False
+            return
+
+        self.ready.set()
         while self.running:
             try:
                 for msg in self._get_perf_messages():
@@ -172,169 +561,1244 @@ class CDPResponseSaver(threading.Thread):
                 logger.error(f"CDP listener error: {e}")
             time.sleep(self.poll_interval)
 
+    def start(self):
+        if self.mode != "async":
+            return super().start()
+        self.running = True
+        try:
+            get_hub().run(self._attach_async(), timeout=15)
+            logger.info("Subscribed to CDP Network events (async hub)")
+        except Exception as e:
+            self.listener_error = e
+            logger.exception(f"CDP session failed: {e}")
+            self.running = False
+        finally:
+            self.ready.set()
+
     def stop(self):
         self.running = False
+        if self._session is not None and self._detached is None:
+            self._detached = get_hub().submit(self._detach_async())
 
+    def finish(self, timeout: float = 30):
+        """Stop listening, then let the pipeline save whatever is still queued."""
+        self.stop()
+        if self.is_alive():
+            self.join(timeout=5)
+        if self._detached is not None:
+            try:
+                self._detached.result(timeout=timeout)
+            except Exception as e:
+                logger.warning(f"CDP session did not detach cleanly: {e}")
+        self.pipeline.close(timeout=timeout)
+
+    def _end_window(self):
+        self.done = True
+        self.stop()
+
+    def latency_stats(self) -> dict:
+        """Summary of finished -> persisted latencies (seconds) for saved pages."""
+        lat = sorted(self.capture_latencies)
+        if not lat:
+            return {"count": 0}
+        return {
+            "count": len(lat),
+            "mean": round(statistics.fmean(lat), 4),
+            "p50": round(lat[len(lat) // 2], 4),
+            "p95": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 4),
+            "max": round(lat[-1], 4),
+        }
+
+    # ---- push mode: CDP websocket ---- #
+    def _devtools_endpoint(self):
+        import urllib.request
+
+        address = self.driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        with urllib.request.urlopen(f"http://{address}/json/version", timeout=10) as resp:
+            info = json.loads(resp.read())
+        version = re.search(r"/(\d+)\.", info["Browser"]).group(1)
+        return version, info["webSocketDebuggerUrl"]
+
+    async def _listen_events(self):
+        import trio
+        from selenium.webdriver.common.bidi import cdp
+
+        version, ws_url = self._devtools_endpoint()
+        devtools = cdp.import_devtools(version)
+        network = devtools.network
+
+        async with cdp.open_cdp(ws_url) as conn:
+            targets = await conn.execute(devtools.target.get_targets())
+            page_ids = [t.target_id for t in targets if t.type_ == "page"]
+            target_id = self.driver.current_window_handle
+            if target_id not in page_ids:
+                target_id = page_ids[0]
+            async with conn.open_session(target_id) as session:
+                events = session.listen(
+                    network.RequestWillBeSent,
+                    network.ResponseReceived,
+                    network.LoadingFinished,
+                    network.LoadingFailed,
+                    buffer_size=1000,
+                )
+                await session.execute(network.enable())
+                self.ready.set()
+                logger.info("Subscribed to CDP Network events")
+
+                async with trio.open_nursery() as nursery:
+                    nursery.start_soon(self._watch_stop, nursery.cancel_scope)
+                    async for event in events:
+                        if isinstance(event, network.RequestWillBeSent):
+                            if CAPTURE_URL_MARKER in event.request.url:
+                                self.clock_offset = float(event.wall_time) - float(event.timestamp)
+                                self._track_request(event.request.url, dict(event.request.headers))
+                        elif isinstance(event, network.ResponseReceived):
+                            self._track_response(
+                                str(event.request_id), event.response.url,
+                                event.response.status, event.response.headers,
+                            )
+                        elif isinstance(event, network.LoadingFinished):
+                            metrics.inc("network_bytes", float(event.encoded_data_length), **self.labels)
+                            url = self.pending.pop(str(event.request_id), None)
+                            if url:
+                                nursery.start_soon(
+                                    self._fetch_event_body, session, network,
+                                    event.request_id, url, float(event.timestamp),
+                                )
+                        elif isinstance(event, network.LoadingFailed):
+                            if event.blocked_reason is not None:
+                                metrics.inc("blocked_requests", **self.labels)
+                            self.pending.pop(str(event.request_id), None)
+
+    async def _watch_stop(self, cancel_scope):
+        import trio
+
+        while self.running:
+            await trio.sleep(0.1)
+        cancel_scope.cancel()
+
+    async def _fetch_event_body(self, session, network, request_id, url, finished_ts):
+        try:
+            started = time.perf_counter()
+            body, base64_encoded = await session.execute(network.get_response_body(request_id))
+            metrics.observe("get_body", time.perf_counter() - started, **self.labels)
+        except Exception as e:
+            logger.warning(f"Failed to read response body for {url}: {e}")
+            return
+        self.pipeline.submit(url, body=body, base64_encoded=base64_encoded, finished_ts=finished_ts)
+
+    # ---- async mode: shared cdp_async hub ---- #
+    async def _attach_async(self):
+        conn = await get_hub().connection(self.driver.capabilities["goog:chromeOptions"]["debuggerAddress"])
+        target_id = self.driver.current_window_handle
+        try:
+            session = await conn.attach(target_id)
+        except Exception:
+            targets = (await conn.send("Target.getTargets"))["targetInfos"]
+            session = await conn.attach(next(t["targetId"] for t in targets if t["type"] == "page"))
+        self._session = session
+        for method in ("Network.requestWillBeSent", "Network.responseReceived"):
+            session.on(method, lambda params, method=method: self._on_async_event(method, params))
+        session.on("Network.loadingFinished", self._on_async_finished)
+        session.on("Network.loadingFailed", self._on_async_failed)
+        await session.execute("Network.enable")
+        return session
+
+    def _on_async_event(self, method, params):
+        if self.running:
+            self._handle_message({"method": method, "params": params})
+
+    def _on_async_finished(self, params):
+        metrics.inc("network_bytes", float(params.get("encodedDataLength", 0)), **self.labels)
+        url = self.pending.pop(params.get("requestId"), None)
+        if url and self.running:
+            task = asyncio.ensure_future(self._fetch_async(params["requestId"], url, params.get("timestamp")))
+            self._fetches.add(task)
+            task.add_done_callback(self._fetches.discard)
+
+    def _on_async_failed(self, params):
+        if params.get("blockedReason") is not None:
+            metrics.inc("blocked_requests", **self.labels)
+        self.pending.pop(params.get("requestId"), None)
+
+    async def _fetch_async(self, request_id, url, finished_ts):
+        try:
+            started = time.perf_counter()
+            result = await self._session.execute("Network.getResponseBody", {"requestId": request_id})
+            metrics.observe("get_body", time.perf_counter() - started, **self.labels)
+        except Exception as e:
+            logger.warning(f"Failed to read response body for {url}: {e}")
+            return
+        # submit() blocks while the pipeline queue is full; keep the loop free for the other tabs
+        await asyncio.get_running_loop().run_in_executor(None, lambda: self.pipeline.submit(
+            url, body=result.get("body", ""), base64_encoded=result.get("base64Encoded", False),
+            finished_ts=finished_ts))
+
+    async def _detach_async(self):
+        if self._fetches:
+            await asyncio.gather(*self._fetches, return_exceptions=True)
+        await self._session.detach()
+
+    # ---- poll mode: performance log ---- #
     def _get_perf_messages(self):
+        """
+        Yield decoded Network messages worth handling. This is a generator so
+        `pending` is already updated by the time a loadingFinished entry for
+        the same request is filtered.
+        """
         try:
             entries = self.driver.get_log("performance")
         except Exception:
-            return []
-        msgs = []
+            return
+        received, blocked = 0.0, 0
         for e in entries:
+            raw = e.get("message", "")
+            # Cheap substring checks first so image/script/XHR traffic is never decoded.
+            if not any(name in raw for name in self.NETWORK_EVENTS):
+                continue
+            if "Network.loadingFinished" in raw:
+                size = ENCODED_LENGTH.search(raw)
+                received += float(size.group(1)) if size else 0.0
+            elif "blockedReason" in raw:
+                blocked += 1
+            if CAPTURE_URL_MARKER not in raw and not any(rid in raw for rid in self.pending):
+                continue
             try:
-                msg = json.loads(e["message"])["message"]
-                msgs.append(msg)
+                yield body_decode.loads(raw)["message"]
             except Exception:
                 continue
-        return msgs
+        metrics.inc("network_bytes", received, **self.labels)
+        if blocked:
+            metrics.inc("blocked_requests", blocked, **self.labels)
 
     def _handle_message(self, msg):
-        if msg.get("method") != "Network.responseReceived":
-            return
+        method = msg.get("method")
         params = msg.get("params", {})
-        response = params.get("response", {})
         request_id = params.get("requestId")
-        url = response.get("url", "")
 
-        if "SearchTimeline" not in url or not request_id or request_id in self.seen_request_ids:
-            return
+        if method == "Network.requestWillBeSent":
+            request = params.get("request", {})
+            if CAPTURE_URL_MARKER in request.get("url", ""):
+                if "wallTime" in params:
+                    self.clock_offset = params["wallTime"] - params["timestamp"]
+                self._track_request(request["url"], request.get("headers", {}))
+        elif method == "Network.responseReceived":
+            response = params.get("response", {})
+            self._track_response(request_id, response.get("url", ""), response.get("status"), response.get("headers"))
+        elif method == "Network.loadingFinished":
+            url = self.pending.pop(request_id, None)
+            if url:
+                self.pipeline.submit(url, request_id=request_id, finished_ts=params.get("timestamp"))
+        elif method == "Network.loadingFailed":
+            self.pending.pop(request_id, None)
+
+    def _read_body(self, request_id):
+        body_resp = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        return body_resp.get("body", ""), body_resp.get("base64Encoded", False)
 
+    # ---- shared ---- #
+    def _track_request(self, url, headers):
+        if self.bootstrap_request is None:
+            self.bootstrap_request = (url, headers)
+
+    def _track_response(self, request_id, url, status=None, headers=None):
+        if CAPTURE_URL_MARKER not in url or not request_id or request_id in self.seen_request_ids:
+            return
         self.seen_request_ids.add(request_id)
+        self.pending[request_id] = url
+        if self.budget is not None and headers:
+            self.track_budget(status or 0, headers)
+
+    def track_budget(self, status: int, headers):
+        if self.budget.update(self.profile, status, headers) and not self.budget_exhausted:
+            self.budget_exhausted = True
+            logger.info(f"{self.profile} has {self.budget.remaining(self.profile)} requests left, "
+                        f"stopping it after this page")
+
+    def _finished_wall_time(self, finished_ts) -> float:
+        if finished_ts is None or self.clock_offset is None:
+            return time.time()
+        return finished_ts + self.clock_offset
+
+    def process_body(self, url, body: DecodedBody, finished_ts=None):
+        """Rate-limit check, end-of-timeline check and save for one decoded SearchTimeline body."""
         try:
-            body_resp = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
-            body = body_resp.get("body", "")
-            if body_resp.get("base64Encoded", False):
-                body_bytes = base64.b64decode(body)
-            else:
-                body_bytes = body.encode("utf-8", errors="ignore")
-        except Exception as e:
-            logger.warning(f"Failed to read response body for {url}: {e}")
+            with self._lock:
+                self._process_body(url, body, finished_ts)
+        finally:
+            self.page_parsed.set()
+
+    def _process_body(self, url, body: DecodedBody, finished_ts):
+        if self.done:
             return
+        finished_at = self._finished_wall_time(finished_ts)
 
-        text_preview = body_bytes[:1000].decode("utf-8", errors="ignore").lower()
-        if "rate limit exceeded" in text_preview:
+        if body.is_rate_limited():
             logger.warning("Rate limit detected, stopping this profile.")
+            metrics.inc("rate_limits", **self.labels)
             self.rate_limited = True
-            self.stop()
+            self._end_window()
             return
 
+        body_bytes = body.raw
+        last_page = False
+        ids, new_ids = [], []
+        data = body.data
+        if not body.ok:
+            logger.warning(f"Could not parse SearchTimeline body ({body.error}), saving it raw.")
+        extract_started = time.perf_counter()
         try:
-            data = json.loads(body_bytes.decode("utf-8", errors="ignore"))
-            instructions = (
-                data.get("data", {})
-                .get("search_by_raw_query", {})
-                .get("search_timeline", {})
-                .get("timeline", {})
-                .get("instructions", [])
-            )
-            entries = []
-            for inst in instructions:
-                if inst.get("type") == "TimelineAddEntries":
-                    entries.extend(inst.get("entries", []))
-            if not entries:
-                logger.info("No tweets found for this date window.")
-                self.no_more_tweets = True
-                self.stop()
-                return
-        except Exception:
-            pass
+            if body.ok:
+                cursor = bottom_cursor(data)
+                self.last_cursor = cursor or self.last_cursor
+                if not content_entry_count(data):
+                    if self.content_pages == 0:
+                        logger.info("No tweets found for this date window.")
+                        self.no_more_tweets = True
+                    else:
+                        logger.info("Reached the end of the timeline for this date window.")
+                        self.timeline_end = True
+                    self._end_window()
+                    return
+                self.content_pages += 1
+                last_page = cursor is None
+                ids = [int(i) for i in top_level_tweet_ids(data)]
+                if ids:
+                    self.tweets_seen += len(ids)
+                    self.oldest_id = min(ids + ([self.oldest_id] if self.oldest_id else []))
+                    self.newest_id = max(ids + ([self.newest_id] if self.newest_id else []))
+                    self.new_tweets += sum(i > self.high_water for i in ids) if self.high_water else len(ids)
+                if self.users:
+                    for user, entries in self._route_entries(data).items():
+                        self.user_tweets[user] = self.user_tweets.get(user, 0) + len(entries)
+                        user_ids = [int(i) for entry in entries for i in entry_tweet_ids(entry)]
+                        if user_ids:
+                            self.user_newest[user] = max(user_ids + [self.user_newest.get(user, 0)])
+                            mark = self.high_waters.get(user)
+                            self.user_new_tweets[user] = self.user_new_tweets.get(user, 0) + (
+                                sum(i > mark for i in user_ids) if mark else len(user_ids))
+                if self.id_index is not None:
+                    new_ids, dropped = drop_seen_entries(data, self.id_index)
+                    if dropped:
+                        self.duplicates_dropped += dropped
+                        if not content_entry_count(data):
+                            logger.info(f"All {dropped} entries on this page were captured before, not saving it.")
+                            body_bytes = None
+                        else:
+                            body_bytes = body_decode.dumps(data)
+        except Exception as e:
+            logger.exception(f"Could not extract SearchTimeline page, saving it as received: {e}")
+            metrics.inc("page_errors", **self.labels)
+        metrics.observe("extract", time.perf_counter() - extract_started, **self.labels)
+        metrics.inc("pages", **self.labels)
+        metrics.inc("tweets", len(ids), **self.labels)
+
+        if body_bytes is not None and self.users and body.ok:
+            self._save_routed(data, finished_at, new_ids)
+        elif body_bytes is not None:
+            self._save_page(body_bytes, finished_at, new_ids, user=UNROUTED_USER if self.users else None)
+        if self.on_page and self.oldest_id:
+            try:
+                self.on_page(self)
+            except Exception as e:
+                logger.warning(f"Checkpoint failed: {e}")
 
-        filename = f"resp_{int(time.time())}_{self.counter}.json"
-        out_path = self.out_dir / filename
+        if last_page:
+            logger.info("Page has no bottom cursor, end of the timeline for this date window.")
+            self.timeline_end = True
+            self._end_window()
+        elif self.budget_exhausted:
+            self.rate_limited = True
+            self._end_window()
+
+    def _route(self, entry: dict) -> Optional[str]:
+        author = entry_author(entry)
+        if author is None:
+            return None
+        author_id, screen_name = author
+        user = self.author_ids.get(author_id)
+        if user is None:
+            user = self._users_by_name.get(screen_name.lower())
+            if user is None:
+                return UNROUTED_USER
+            self.author_ids[author_id] = user
+        return user
+
+    def _route_entries(self, data: dict) -> Dict[str, List[dict]]:
+        """TimelineAddEntries content entries of a page by user (cursors and the like are left out)."""
+        routed: Dict[str, List[dict]] = {}
+        for inst in timeline_instructions(data):
+            if inst.get("type") == "TimelineAddEntries":
+                for entry in inst.get("entries", []):
+                    user = self._route(entry)
+                    if user is not None:
+                        routed.setdefault(user, []).append(entry)
+        return routed
+
+    def _save_routed(self, data: dict, finished_at, new_ids):
+        """Save one copy of a multi-account page per user, with only that user's entries (and every cursor)."""
+        instructions = [i for i in timeline_instructions(data) if i.get("type") == "TimelineAddEntries"]
+        originals = [i.get("entries", []) for i in instructions]
+        routed = {}
+        for n, entries in enumerate(originals):
+            for entry in entries:
+                routed.setdefault(self._route(entry), []).append((n, entry))
+        shared = routed.pop(None, [])
+        if routed.get(UNROUTED_USER):
+            logger.warning(f"{len(routed[UNROUTED_USER])} entries by none of {self.users}, "
+                           f"saving them under {UNROUTED_USER}")
+        saved = True
         try:
-            with open(out_path, "wb") as f:
-                f.write(body_bytes)
-            logger.info(f"Saved SearchTimeline response: {out_path}")
+            for user, entries in routed.items():
+                for n, inst in enumerate(instructions):
+                    inst["entries"] = [e for m, e in entries + shared if m == n]
+                saved &= self._save_page(body_decode.dumps(data), finished_at, [], user=user)
+        finally:
+            for inst, entries in zip(instructions, originals):
+                inst["entries"] = entries
+        if saved and new_ids and self.id_index is not None:
+            self.id_index.add_many(new_ids)
+
+    def _save_page(self, body_bytes, finished_at, new_ids, user: Optional[str] = None) -> bool:
+        """Write one page (for `user` of a multi-account search); True if it was stored."""
+        request = f"resp_{int(time.time())}_{self.counter}"
+        if self.archive is not None:
+            key_user, window = self.archive_key
+            user = user or key_user
+            out_path = f"{self.archive.root}[{user}/{window}/{request}]"
+        elif user is not None:
+            out_dir = self.out_dir / user / self.archive_key[1]
+            out_dir.mkdir(parents=True, exist_ok=True)
+            out_path = out_dir / f"{request}.json"
+        else:
+            out_path = self.out_dir / f"{request}.json"
+        try:
+            with metrics.time("save", **self.labels):
+                if self.archive is not None:
+                    self.archive.append(user, window, request, body_bytes)
+                else:
+                    with open(out_path, "wb") as f:
+                        f.write(body_bytes)
             self.last_response_time = time.time()
+            latency = max(0.0, self.last_response_time - finished_at)
+            self.capture_latencies.append(latency)
+            logger.info(f"Saved SearchTimeline response: {out_path} (capture latency {latency * 1000:.0f} ms)")
             self.counter += 1
         except Exception as e:
-            logger.error(f"Error saving file {out_path}: {e}")
+            logger.error(f"Error saving page {out_path}: {e}")
+            return False
+        if new_ids and self.id_index is not None:
+            self.id_index.add_many(new_ids)
+        return True
 
 
 # -------------------- Core Logic -------------------- #
-def scroll_and_capture(driver, saver: CDPResponseSaver, username: str, since: str, until: str):
+def _window_status(saver: CDPResponseSaver) -> Optional[str]:
+    if saver.rate_limited:
+        return "rate_limited"
+    if saver.no_more_tweets:
+        return "no_more_tweets"
+    if saver.timeline_end:
+        return "ok"
+    return None
+
+
+def scroll_until_page(driver, saver: CDPResponseSaver, timeout: float = SCROLL_TIMEOUT) -> bool:
+    """
+    Scroll to the bottom and return as soon as the next page has been processed.
+    The scroll is repeated every SCROLL_NUDGE seconds in case the new tweets were
+    not rendered yet; False means no page arrived within `timeout`.
+    """
+    with metrics.time("scroll_wait", **saver.labels):
+        deadline = time.monotonic() + timeout
+        while True:
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if saver.page_parsed.wait(timeout=min(SCROLL_NUDGE, remaining)):
+                return True
+
+
+def scroll_and_capture(driver, saver: CDPResponseSaver, username: str, since: str, until: str,
+                       resume_cursor: Optional[str] = None, watchdog: Optional[MemoryWatchdog] = None):
     url = build_search_url(username, since, until)
     logger.info(f"Navigating to {url}")
-    driver.get(url)
-    time.sleep(2)
+    with metrics.time("first_page", **saver.labels):
+        with metrics.time("navigate", **saver.labels):
+            driver.get(url)
+        if not saver.page_parsed.wait(timeout=FIRST_PAGE_TIMEOUT):
+            logger.warning("First SearchTimeline page did not arrive, reloading once.")
+            driver.refresh()
+            saver.page_parsed.wait(timeout=FIRST_PAGE_TIMEOUT)
 
+    if REPLAY_PAGES:
+        status = replay_timeline(driver, saver, resume_cursor=resume_cursor)
+        if status:
+            return status
+
+    idle_scrolls = 0
     for i in range(SCROLLS):
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(SCROLL_PAUSE)
-        if saver.rate_limited:
-            return "rate_limited"
-        if saver.no_more_tweets:
-            return "no_more_tweets"
-    return "ok"
+        status = _window_status(saver)
+        if status:
+            return status
+        saver.page_parsed.clear()
+        got_page = scroll_until_page(driver, saver)
+        if watchdog is not None:
+            watchdog.after_scroll()
+        if got_page:
+            idle_scrolls = 0
+            continue
+        idle_scrolls += 1
+        if idle_scrolls >= MAX_IDLE_SCROLLS:
+            logger.info(f"No new page after {idle_scrolls} scrolls ({SCROLL_TIMEOUT}s each), leaving window.")
+            break
+    status = _window_status(saver)
+    if status:
+        return status
+    # Pages came but the timeline never ended: the rest of the window is missing.
+    # No page and no end marker at all: nothing is known about the window.
+    return "truncated" if saver.content_pages else "no_response"
+
+
+def replay_timeline(driver, saver: CDPResponseSaver, first_page_timeout: float = 15,
+                    resume_cursor: Optional[str] = None):
+    """
+    Fetch the remaining pages of the current search directly, starting from the
+    bottom cursor of the page the browser loaded (or from `resume_cursor`, the
+    checkpoint of an interrupted run of the same window). Returns None when
+    there is nothing to replay from, so the caller can fall back to scrolling.
+    """
+    deadline = time.time() + first_page_timeout
+    while saver.last_cursor is None and time.time() < deadline:
+        status = _window_status(saver)
+        if status:
+            return status
+        time.sleep(0.1)
+    if not (saver.bootstrap_request and saver.last_cursor):
+        logger.warning("No SearchTimeline request to replay, falling back to scrolling.")
+        return None
 
+    url, headers = saver.bootstrap_request
+    replayer = TimelineReplayer(url, headers, cookie_header(driver.get_cookies()))
+    if resume_cursor:
+        logger.info("Continuing the window from its checkpoint cursor")
+    pages = 0
+    try:
+        for status, page in replayer.iter_pages(resume_cursor or saver.last_cursor, SCROLLS):
+            if saver.budget is not None:
+                saver.track_budget(status, replayer.last_headers)
+            if status == 429:
+                logger.warning("Rate limit (HTTP 429) during replay, stopping this profile.")
+                saver.rate_limited = True
+                return "rate_limited"
+            if status != 200:
+                logger.warning(f"Replay got HTTP {status} after {pages} pages, falling back to scrolling.")
+                return None
+            saver.process_body(url, page)
+            pages += 1
+            status = _window_status(saver)
+            if status:
+                return status
+    except Exception as e:
+        logger.warning(f"Replay failed after {pages} pages, falling back to scrolling: {e}")
+        return None
+    finally:
+        replayer.close()
+    logger.info(f"Replayed {pages} SearchTimeline pages without scrolling")
+    return _window_status(saver) or "truncated"
 
-def run_with_rotation(directories: List[str], username: str):
-    date_chunks = list(daterange_chunks(SINCE_DATE, UNTIL_DATE, DATE_WINDOW_DAYS))
-    logger.info(f"Processing {len(date_chunks)} windows for {username} ({DATE_WINDOW_DAYS} days each)")
 
-    state = load_state(username)
+def capture_window(driver, username: Accounts, since: str, until: str, resume_cursor: Optional[str] = None,
+                   profile_dir: Optional[str] = None, watchdog: Optional[MemoryWatchdog] = None,
+                   job: Optional[Job] = None, jobs: Optional[JobQueue] = None,
+                   high_water: Union[int, Dict[str, int], None] = None):
+    """
+    Capture one (username, since, until) window with `driver`, logged in as
+    `profile_dir`; returns (status, saver). `watchdog` prunes and samples the
+    tab while it scrolls. Checkpoints go to the state file, or to `jobs` when
+    the window is a leased `job`. `high_water` is the monitor's mark for the user
+    (for a batch: marks by user).
+    With a list of usernames the window is one batched search for all of them,
+    whose pages the saver splits up by author.
+    """
+    users = members(username)
+    batch = len(users) > 1
+    window = f"{since}_{until}"
+    sub_out_dir = OUT_DIR if batch else OUT_DIR / username / window
+    archive = get_archive()
+    if archive is None and not batch:
+        sub_out_dir.mkdir(parents=True, exist_ok=True)
+
+    def checkpoint(s: CDPResponseSaver):
+        if job is not None:
+            # Every page renews both leases, so a long window does not lose them to another host.
+            if profile_dir:
+                jobs.renew_profile(profile_dir)
+            if not jobs.checkpoint(job, s.oldest_id, s.last_cursor):
+                s._end_window()  # another worker owns the window now
+        else:
+            save_checkpoint(username, since, until, s.oldest_id, s.last_cursor)
+
+    saver = CDPResponseSaver(
+        driver, sub_out_dir, poll_interval=POLL_INTERVAL, mode=CAPTURE_MODE, id_index=get_id_index(), on_page=checkpoint,
+        budget=rate_budget if profile_dir else None, profile=profile_dir,
+        archive=archive, archive_key=(None if batch else username, window), user=label(username),
+        high_water=None if batch else high_water, high_waters=high_water if batch else None,
+        users=users if batch else None, author_ids=_author_ids,
+    )
+    with metrics.time("window", **saver.labels):
+        saver.start()
+        saver.ready.wait(timeout=15)
+        if saver.listener_error is None:
+            status = scroll_and_capture(driver, saver, username, since, until, resume_cursor, watchdog)
+        saver.finish()
+    if saver.listener_error is not None:
+        # Whatever was captured is saved, but the window is neither done nor split on partial pages.
+        metrics.inc("listener_errors", **saver.labels)
+        raise RuntimeError(f"{CAPTURE_MODE} listener failed for {label(username)} {since} → {until} "
+                           f"(CAPTURE_MODE = \"poll\" does not need a DevTools connection)") from saver.listener_error
+    status = _window_status(saver) or status
+    metrics.inc("windows", **saver.labels)
+    metrics.inc(f"windows_{status}", **saver.labels)
+    logger.info(f"Capture latency for {label(username)} {since} → {until}: {saver.latency_stats()}")
+    pipeline = saver.pipeline.summary()
+    if pipeline.get("backpressure"):
+        logger.warning(f"Capture pipeline for {label(username)} {since} → {until} was saturated: {pipeline}")
+    if batch:
+        logger.info(f"Batched search {since} → {until}: {saver.tweets_seen} tweets, {saver.user_tweets} by account")
+    if saver.duplicates_dropped:
+        logger.info(f"Dropped {saver.duplicates_dropped} already-captured entries for {label(username)} {since} → {until}")
+    return status, saver
+
+
+def record_window(planner: WindowPlanner, username: Accounts, since: str, until: str,
+                  status: str, saver: CDPResponseSaver):
+    """Report a captured window to the planner and mark what it covered as done."""
+    if status == "truncated" and not ADAPTIVE_WINDOWS:
+        logger.warning(f"{label(username)} {since} → {until} hit the page cap; older tweets in it were not captured")
+    planner.duplicates += saver.duplicates_dropped
+    covered = planner.report(
+        (since, until), saver.tweets_seen,
+        truncated=status == "truncated" and ADAPTIVE_WINDOWS, oldest_id=saver.oldest_id,
+    )
+    if covered:
+        mark_window_done(username, *covered, checkpoint=(since, until))
+
+
+def resume_window(planner: WindowPlanner, username: Accounts, since: str, until: str,
+                  oldest_id: Optional[int], cursor: Optional[str], cursors: Dict[Tuple[str, str], str]):
+    """
+    Queue an interrupted window to continue where it stopped. With replay the
+    same window is continued from its last cursor; otherwise only the part
+    older than the oldest captured tweet is searched again (max_id bound).
+    """
+    if REPLAY_PAGES and cursor:
+        planner.retry((since, until))
+        cursors[(since, until)] = cursor
+        logger.info(f"Will continue {label(username)} {since} → {until} from its last cursor")
+        return
+    covered = planner.resume((since, until), oldest_id)
+    if covered:
+        mark_window_done(username, *covered, checkpoint=(since, until))
+        logger.info(f"Will continue {label(username)} {since} → {until} below tweet {oldest_id}; "
+                    f"{covered[0]} → {covered[1]} is not fetched again")
+
+
+def run_with_rotation(directories: List[str], username: Accounts):
+    """Crawl SINCE_DATE..UNTIL_DATE for `username`, or for a list of them as one batched search per window."""
+    planner = make_planner(username)
+    logger.info(f"Processing {label(username)} from {SINCE_DATE} to {UNTIL_DATE} ({DATE_WINDOW_DAYS} days per window to start)")
+
+    state = next(filter(None, map(load_state, members(username))), None)
     profile_idx = 0
-    start_chunk = 0
 
+    cursors: Dict[Tuple[str, str], str] = {}
     if state:
         profile_idx = min(state.get("last_profile_idx", 0), len(directories) - 1)
-        last_since = state.get("last_since")
-        for i, (s, _) in enumerate(date_chunks):
-            if s == last_since:
-                start_chunk = i
-                break
-        logger.info(f"Resuming {username} from profile {directories[profile_idx]}, chunk {start_chunk + 1}")
+        logger.info(f"Resuming {label(username)} from profile {directories[profile_idx]}, "
+                    f"{len(planner.covered)} windows already done")
+        for since, until, oldest_id, cursor in pop_checkpoints(username):
+            resume_window(planner, username, since, until, oldest_id, cursor, cursors)
     else:
-        logger.info(f"Starting new crawl for {username}")
+        logger.info(f"Starting new crawl for {label(username)}")
+
+    browsers = WarmBrowserPool(lambda d: start_chrome(d, CAPTURE_MODE), warm=warm_browser)
+    try:
+        _rotate(browsers, directories, username, planner, profile_idx, cursors)
+    finally:
+        browsers.close()
+        logger.info(f"Browser timings for {label(username)}: {browsers.summary()}")
+        logger.info(f"Windows for {label(username)}: {planner.summary()}")
+
 
+def _rotate(browsers: WarmBrowserPool, directories: List[str], username: Accounts,
+            planner: WindowPlanner, profile_idx: int, cursors: Dict[Tuple[str, str], str]):
+    no_response: Dict[Tuple[str, str], int] = {}
     while True:
+        if rate_budget.ready_at(directories[profile_idx]):
+            profile_idx = rate_budget.next_profile(directories, profile_idx)
+            with metrics.time("rotation_wait", profile=directories[profile_idx], user=label(username)):
+                rate_budget.wait_until_ready(directories[profile_idx])
         profile_dir = directories[profile_idx]
-        logger.info(f"Using profile {profile_dir} ({profile_idx + 1}/{len(directories)})")
+        next_dir = directories[rate_budget.next_profile(directories, profile_idx)]
+        logger.info(f"Using profile {profile_dir} ({profile_idx + 1}/{len(directories)}, "
+                    f"{rate_budget.remaining(profile_dir)} requests left)")
 
-        with UCSession(profile_dir) as driver:
-            for i in range(start_chunk, len(date_chunks)):
-                since, until = date_chunks[i]
-                sub_out_dir = OUT_DIR / username / f"{since}_{until}"
-                sub_out_dir.mkdir(parents=True, exist_ok=True)
-
-                saver = CDPResponseSaver(driver, sub_out_dir)
-                saver.start()
-                status = scroll_and_capture(driver, saver, username, since, until)
-                saver.stop()
-                time.sleep(3)
+        driver = browsers.acquire(profile_dir)
+        watchdog = make_watchdog(driver, profile_dir)
+        if WARM_NEXT_PROFILE and next_dir != profile_dir:
+            browsers.prefetch(next_dir)
+        try:
+            for since, until in iter(planner.next_window, None):
+                if watchdog.needs_recycle:
+                    # Window boundary: planner, cursors and checkpoints carry over as they are.
+                    if MEMORY_RECYCLE == "browser":
+                        logger.info(f"Relaunching {profile_dir} after {watchdog.summary()}")
+                        browsers.release(profile_dir, driver)
+                        driver = browsers.acquire(profile_dir)
+                        watchdog = make_watchdog(driver, profile_dir)
+                    else:
+                        watchdog = fresh_tab(driver, watchdog)
+                resume_cursor = cursors.pop((since, until), None)
+                status, saver = capture_window(driver, username, since, until, resume_cursor, profile_dir, watchdog)
 
                 save_state(username, profile_idx, since, until)
 
                 if status == "rate_limited":
-                    profile_idx = (profile_idx + 1) % len(directories)
-                    logger.warning(f"{profile_dir} hit a rate limit, switching to next profile.")
-                    time.sleep(ROTATE_DELAY)
+                    planner.duplicates += saver.duplicates_dropped
+                    resume_window(planner, username, since, until, saver.oldest_id, saver.last_cursor, cursors)
+                    if not saver.budget_exhausted:
+                        # Limited without warning from the headers: rest for a full window.
+                        rate_budget.update(profile_dir, 429, {})
+                    profile_idx = rate_budget.next_profile(directories, profile_idx)
+                    logger.warning(f"{profile_dir} is out of requests, switching to next profile.")
+                    if directories[profile_idx] != next_dir or not WARM_NEXT_PROFILE:
+                        with metrics.time("rotation_wait", profile=directories[profile_idx], user=label(username)):
+                            time.sleep(ROTATE_DELAY)
                     break
 
+                if status == "no_response":
+                    window = (since, until)
+                    if resume_cursor:
+                        cursors[window] = resume_cursor
+                    no_response[window] = no_response.get(window, 0) + 1
+                    if no_response[window] > NO_RESPONSE_RETRIES:
+                        planner.give_up(window, f"got no SearchTimeline response in {no_response[window]} tries")
+                        continue
+                    logger.warning(f"No SearchTimeline responses for {label(username)} {since} → {until}, "
+                                   f"retrying it with a fresh browser")
+                    planner.retry(window)
+                    browsers.release(profile_dir, driver)
+                    driver = browsers.acquire(profile_dir)
+                    watchdog = make_watchdog(driver, profile_dir)
+                    continue
+
+                record_window(planner, username, since, until, status, saver)
+
                 if status == "no_more_tweets":
-                    logger.info(f"No tweets for {username} in {since} → {until}")
+                    logger.info(f"No tweets for {label(username)} in {since} → {until}")
                     continue
 
-                if status == "ok" and saver.last_response_time > 0:
-                    logger.info(f"Captured tweets for {username} {since} → {until}")
-                else:
-                    logger.warning(f"No SearchTimeline responses for {username} {since} → {until}")
+                logger.info(f"Captured tweets for {label(username)} {since} → {until}")
 
             else:
-                logger.info(f"Completed all date windows for {username}")
+                if planner.incomplete:
+                    # State stays, so the next run plans these windows again.
+                    logger.warning(f"Finished {label(username)} without {len(planner.incomplete)} windows: "
+                                   f"{planner.incomplete}")
+                    return
+                logger.info(f"Completed all date windows for {label(username)}")
                 clear_state(username)
                 return
+        finally:
+            browsers.release(profile_dir, driver)
+
+
+# -------------------- Monitoring -------------------- #
+def make_monitor_state() -> MonitorState:
+    return MonitorState(
+        MONITOR_STATE_FILE, min_interval=MONITOR_MIN_INTERVAL, max_interval=MONITOR_MAX_INTERVAL,
+        target_tweets=MONITOR_TARGET_TWEETS, bootstrap_days=MONITOR_BOOTSTRAP_DAYS,
+    )
+
+
+def plan_polls(state: MonitorState, due: List[str]) -> List[Accounts]:
+    """
+    Due accounts as searches: with BATCH_QUERIES, quiet ones are packed into
+    batched searches by the tweets expected since their last poll. An account
+    filling a gap below a cut-short poll is searched on its own (its window
+    ends at the gap's ceiling).
+    """
+    if not BATCH_QUERIES:
+        return list(due)
+    alone = [u for u in due if state.users[u].get("ceiling")]
+    rest = [u for u in due if u not in alone]
+    defaults = expected_tweets_per_day(rest)
+    volumes = {}
+    for username in rest:
+        expected = state.expected_tweets(username)
+        volumes[username] = expected if expected is not None else defaults[username] * MONITOR_BOOTSTRAP_DAYS
+    return alone + plan_batches(rest, volumes) if rest else alone
+
+
+def poll_user(driver, state: MonitorState, username: Accounts, profile_dir: str,
+              watchdog: Optional[MemoryWatchdog] = None) -> str:
+    """
+    Capture the tweets of `username` above its high-water mark and feed the
+    result back to `state`. A batch is searched from its lowest mark, and each
+    member is recorded with its own newest tweet and new-tweet count.
+    """
+    users = members(username)
+    windows = [state.window(u) for u in users]
+    since = min((w[0] for w in windows), key=parse_bound)
+    until = max((w[1] for w in windows), key=parse_bound)
+    marks = {u: int(state.users[u]["high_water"]) for u in users if state.users[u]["high_water"]}
+    high_water = marks.get(username) if isinstance(username, str) else marks
+    status, saver = capture_window(driver, username, since, until, profile_dir=profile_dir, watchdog=watchdog,
+                                   high_water=high_water)
+    complete = status in ("ok", "no_more_tweets")
+    for user in users:
+        if isinstance(username, str):
+            new_tweets, newest = saver.new_tweets, saver.newest_id
+        else:
+            new_tweets, newest = saver.user_new_tweets.get(user, 0), saver.user_newest.get(user)
+        # Cut short, a batch is complete for every member down to its oldest tweet.
+        entry = state.record(user, complete, new_tweets, saver.oldest_id, newest)
+        metrics.inc("monitor_polls", user=user)
+        metrics.inc("monitor_new_tweets", new_tweets, user=user)
+        if entry.get("ceiling"):
+            logger.info(f"{user}: poll {status} after {new_tweets} new tweets, "
+                        f"filling the gap below {entry['ceiling']} next")
+        else:
+            logger.info(f"{user}: {new_tweets} new tweets ({status}), {entry.get('rate')} tweets/hour, "
+                        f"next poll in {entry['next_poll'] - time.time():.0f}s")
+    return status
+
+
+def run_monitor(directories: List[str], usernames: List[str], stop: Optional[threading.Event] = None):
+    """
+    Keep `usernames` current until `stop` is set: poll every account that is
+    due (in batched searches with BATCH_QUERIES), on one browser, switching
+    profiles like `run_with_rotation` when one runs out of requests. The
+    high-water marks are never cleared.
+    """
+    stop = stop or threading.Event()
+    state = make_monitor_state()
+    state.track(usernames)
+    logger.info(f"Monitoring {len(usernames)} accounts: {state.summary()}")
+    browsers = WarmBrowserPool(lambda d: start_chrome(d, CAPTURE_MODE), warm=warm_browser)
+    profile_idx, driver, watchdog = 0, None, None
+    try:
+        while not stop.is_set():
+            due = state.due(usernames)
+            if not due:
+                stop.wait(min(max(1.0, state.next_due(usernames) - time.time()), 60))
+                continue
+            if rate_budget.ready_at(directories[profile_idx]):
+                if driver is not None:
+                    browsers.release(directories[profile_idx], driver)
+                    driver = None
+                profile_idx = rate_budget.next_profile(directories, profile_idx)
+                with metrics.time("rotation_wait", profile=directories[profile_idx]):
+                    rate_budget.wait_until_ready(directories[profile_idx], stop)
+                if stop.is_set():
+                    break
+            profile_dir = directories[profile_idx]
+            if driver is None:
+                driver = browsers.acquire(profile_dir)
+                watchdog = make_watchdog(driver, profile_dir)
+            for username in plan_polls(state, due):
+                if stop.is_set():
+                    break
+                if watchdog.needs_recycle:
+                    watchdog = fresh_tab(driver, watchdog)
+                status = poll_user(driver, state, username, profile_dir, watchdog)
+                if status == "rate_limited":
+                    if not rate_budget.ready_at(profile_dir):
+                        rate_budget.update(profile_dir, 429, {})
+                    logger.warning(f"{profile_dir} is out of requests, switching to next profile.")
+                    break
+    finally:
+        if driver is not None:
+            browsers.release(directories[profile_idx], driver)
+        browsers.close()
+        logger.info(f"Monitor state: {state.summary()}")
+
+
+# -------------------- Parallel Scheduler -------------------- #
+class ProfilePool:
+    """
+    Hands out profile directories. A rate-limited profile rests until its
+    rate-limit reset (from `budget`) or, if that is unknown, for `cooldown` seconds.
+    With `jobs`, a profile is also leased there, so crawlers on other hosts
+    neither use it at the same time nor before its rest is over.
+    """
+
+    def __init__(self, directories: List[str], cooldown: float = PROFILE_COOLDOWN,
+                 budget: Optional[RateBudget] = None, jobs: Optional[JobQueue] = None):
+        self.cooldown = cooldown
+        self.budget = budget
+        self.jobs = jobs
+        self._cond = threading.Condition()
+        self._ready_at = {d: budget.ready_at(d) if budget else 0.0 for d in directories}
+
+    def acquire(self, stop: threading.Event) -> Optional[str]:
+        with self._cond:
+            while not stop.is_set():
+                now = time.time()
+                ready = sorted((d for d, t in self._ready_at.items() if t <= now), key=self._ready_at.get)
+                if ready and self.jobs is not None:
+                    leased = self.jobs.lease_profile(ready)
+                    if leased is None:
+                        # Other crawlers hold them all: wait for the first lease to end or rest to pass,
+                        # instead of a write transaction per tenth of a second.
+                        wait = self.jobs.profile_ready_at(ready) - now
+                        self._cond.wait(timeout=max(1.0, min(wait, PROFILE_LEASE_POLL)))
+                        continue
+                    ready = [leased]
+                if ready:
+                    profile_dir = ready[0]
+                    del self._ready_at[profile_dir]
+                    return profile_dir
+                wait = min(self._ready_at.values(), default=now + 1) - now
+                self._cond.wait(timeout=max(0.1, min(wait, 1.0)))
+        return None
+
+    def release(self, profile_dir: str, rate_limited: bool = False):
+        ready_at = self.budget.ready_at(profile_dir) if self.budget else 0.0
+        if not ready_at:
+            ready_at = time.time() + (self.cooldown if rate_limited else 0)
+        if self.jobs is not None:
+            self.jobs.release_profile(profile_dir, ready_at)
+        with self._cond:
+            self._ready_at[profile_dir] = ready_at
+            self._cond.notify_all()
+
+
+class ParallelCrawler:
+    """
+    Runs `workers` UCSession browsers at once. Each worker holds one profile and
+    pulls (username, since, until) windows off a shared queue, in
+    TABS_PER_PROFILE tabs of its browser; a rate-limited worker puts its
+    window back and swaps its profile into the cool-down pool.
+    Finished windows go to the per-user state file, so a restart skips them.
+
+    With a `jobs` queue (JOB_QUEUE) the windows and profiles are leased from
+    it instead, and any number of crawler processes on any number of hosts
+    can work through the same users: windows are planned once per user, and
+    a window whose worker disappeared is resumed below its checkpoint after
+    its lease expires.
+    """
+
+    def __init__(self, directories: List[str], usernames: List[str], workers: int = 0,
+                 jobs: Optional[JobQueue] = None):
+        self.directories = directories
+        self.usernames = usernames
+        self.workers = min(workers or len(directories), len(directories))
+        self.jobs = jobs
+        self.pool = ProfilePool(directories, budget=rate_budget, jobs=jobs)
+        self.work: "queue.Queue[Tuple[str, str, str]]" = queue.Queue()
+        self.stop_event = threading.Event()
+        self.remaining: Dict[str, int] = {}
+        self.windows_done: Dict[str, int] = {}
+        self.tweets: Dict[str, int] = {}
+        self.no_response: Dict[Tuple[str, str, str], int] = {}  # tries per window without any response
+        self.incomplete: Dict[str, List[Tuple[str, str]]] = {}  # windows given up on, per user
+        self._lock = threading.Lock()
+
+    def plan(self):
+        for username in self.usernames:
+            if self.jobs is not None and self.jobs.has_user(username):
+                logger.info(f"{username} is already planned in {self.jobs.path}: {self.jobs.progress([username])}")
+                continue
+            planner = make_planner(username)
+            for since, until, oldest_id, _ in pop_checkpoints(username):
+                covered = planner.resume((since, until), oldest_id)
+                if covered:
+                    mark_window_done(username, *covered)
+            todo = list(iter(planner.next_window, None))
+            self.remaining[username] = len(todo)
+            if self.jobs is not None:
+                self.jobs.add(username, todo)
+                logger.info(f"Queued {len(todo)} windows for {username} in {self.jobs.path}")
+                continue
+            logger.info(f"Queued {len(todo)} windows for {username}")
+            for since, until in todo:
+                self.work.put((username, since, until))
+
+    def run(self):
+        self.plan()
+        started = time.time()
+        threads = [
+            threading.Thread(target=self._worker, name=f"crawler-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+        try:
+            if self.jobs is not None:
+                # Other hosts may still hold leases; wait until every window of our users is done.
+                while self.jobs.remaining(self.usernames) and not self.stop_event.wait(1):
+                    pass
+            else:
+                self.work.join()
+        finally:
+            self.stop_event.set()
+            for t in threads:
+                t.join(timeout=30)
+
+        elapsed = max(time.time() - started, 1e-9)
+        total = sum(self.windows_done.values())
+        tweets = sum(self.tweets.values())
+        logger.info(f"Parallel crawl finished: {total} windows in {elapsed:.0f}s ({total * 3600 / elapsed:.1f} windows/hour, "
+                    f"{tweets * 3600 / elapsed:.0f} tweets/hour)")
+        for profile_dir, n in sorted(self.windows_done.items()):
+            logger.info(f"  {profile_dir}: {n} windows, {self.tweets.get(profile_dir, 0)} tweets")
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            with metrics.time("rotation_wait"):
+                profile_dir = self.pool.acquire(self.stop_event)
+            if profile_dir is None:
+                return
+            cool_down = False
+            try:
+                with UCSession(profile_dir, CAPTURE_MODE) as driver:
+                    if TABS_PER_PROFILE > 1:
+                        cool_down = self._drain_tabs(driver, profile_dir)
+                    else:
+                        cool_down = self._drain(driver, profile_dir)
+            except Exception as e:
+                logger.exception(f"Worker on {profile_dir} failed: {e}")
+                cool_down = True
+            finally:
+                self.pool.release(profile_dir, cool_down)
+
+    def _drain_tabs(self, driver, profile_dir: str) -> bool:
+        """
+        `_drain` in TABS_PER_PROFILE tabs of one browser at once. When one tab
+        stops (rate limit, browser recycle) the others finish their window and
+        stop too; returns whether the profile has to cool down.
+        """
+        tabs = BrowserTabs(driver, TABS_PER_PROFILE, prepare=prepare_tab)
+        session_stop = threading.Event()
+        cool_down = []
+
+        def run(tab):
+            try:
+                cool_down.append(self._drain(tab, profile_dir, session_stop))
+            except Exception as e:
+                logger.exception(f"Tab {tab.handle} of {profile_dir} failed: {e}")
+                cool_down.append(True)
+            finally:
+                session_stop.set()
+
+        name = threading.current_thread().name
+        threads = [threading.Thread(target=run, args=(tab,), name=f"{name}-tab{i}", daemon=True)
+                   for i, tab in enumerate(tabs.tabs)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return any(cool_down)
+
+    def _drain(self, driver, profile_dir: str, session_stop: Optional[threading.Event] = None) -> bool:
+        """
+        Capture windows until the queue is finished, the profile is rate limited
+        or (MEMORY_RECYCLE = "browser") the browser is over its memory limit.
+        `session_stop` ends it early, after the window in progress.
+        """
+        profile_idx = self.directories.index(profile_dir)
+        watchdog = make_watchdog(driver, profile_dir)
+        while not self.stop_event.is_set() and not (session_stop and session_stop.is_set()):
+            if watchdog.needs_recycle:
+                if MEMORY_RECYCLE == "browser":
+                    logger.info(f"Relaunching {profile_dir} after {watchdog.summary()}")
+                    return False  # the worker starts a new session
+                watchdog = fresh_tab(driver, watchdog)
+            if self.jobs is not None:
+                status = self._capture_job(driver, profile_dir, watchdog)
+                if status == "rate_limited":
+                    return True
+                if status == "no_response":
+                    return False  # a new session for whatever comes next
+                continue
+            try:
+                username, since, until = self.work.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                status, saver = capture_window(driver, username, since, until, profile_dir=profile_dir,
+                                               watchdog=watchdog)
+                with self._lock:
+                    self.tweets[profile_dir] = self.tweets.get(profile_dir, 0) + saver.tweets_seen
+                save_state(username, profile_idx, since, until)
+                if status == "rate_limited":
+                    logger.warning(f"{profile_dir} hit a rate limit, re-queueing {username} {since} → {until}")
+                    self._requeue(username, since, until, saver)
+                    return True
+                if status == "no_response":
+                    if self._retry_no_response(username, since, until):
+                        return False  # the worker starts a new session for the retry
+                elif status == "truncated" and ADAPTIVE_WINDOWS:
+                    self._split(username, since, until, saver)
+                else:
+                    mark_window_done(username, since, until)
+                self._window_finished(profile_dir, username)
+            except Exception:
+                self.work.put((username, since, until))
+                raise
+            finally:
+                self.work.task_done()
+        return False
+
+    def _capture_job(self, driver, profile_dir: str, watchdog: MemoryWatchdog) -> Optional[str]:
+        """Claim and capture one window from `jobs`; returns its status, None if there was none to claim."""
+        job = self.jobs.claim(self.usernames)
+        if job is None:
+            time.sleep(1)
+            return None
+        self.jobs.renew_profile(profile_dir)
+        username, since, until = job.user, job.since, job.until
+        try:
+            if job.oldest_id and not (REPLAY_PAGES and job.cursor):
+                # An earlier lease got this far: only search below its oldest tweet.
+                planner = make_planner(username)
+                if planner.resume(job.window, job.oldest_id):
+                    logger.info(f"Resuming {username} {since} → {until} below tweet {job.oldest_id}")
+                    self.jobs.finish(job, follow_up=planner.pending)
+                    return "resumed"
+            resume_cursor = job.cursor if REPLAY_PAGES else None
+            status, saver = capture_window(driver, username, since, until, resume_cursor, profile_dir=profile_dir,
+                                           watchdog=watchdog, job=job, jobs=self.jobs)
+            with self._lock:
+                self.tweets[profile_dir] = self.tweets.get(profile_dir, 0) + saver.tweets_seen
+            if status == "rate_limited":
+                logger.warning(f"{profile_dir} hit a rate limit, re-queueing {username} {since} → {until}")
+                planner = make_planner(username)
+                if planner.resume(job.window, saver.oldest_id):
+                    self.jobs.finish(job, saver.tweets_seen, saver.content_pages, follow_up=planner.pending)
+                else:
+                    self.jobs.release(job)
+                return status
+            if status == "no_response":
+                if job.attempts <= NO_RESPONSE_RETRIES:
+                    logger.warning(f"No SearchTimeline responses for {job}, giving it back")
+                    self.jobs.release(job)
+                else:
+                    self.jobs.fail(job, f"no SearchTimeline response in {job.attempts} tries")
+                return status
+            follow_up = []
+            if status == "truncated" and ADAPTIVE_WINDOWS:
+                planner = make_planner(username)
+                planner.report(job.window, saver.tweets_seen, truncated=True, oldest_id=saver.oldest_id)
+                if planner.incomplete:
+                    self.jobs.fail(job, "hit the page cap and is too short to split")
+                    return status
+                follow_up = planner.pending
+            if self.jobs.finish(job, saver.tweets_seen, saver.content_pages, follow_up=follow_up):
+                self._window_finished(profile_dir, username)
+        except Exception:
+            self.jobs.release(job)
+            raise
+        return status
+
+    def _requeue(self, username: str, since: str, until: str, saver: CDPResponseSaver):
+        """Put back the part of a rate-limited window below its oldest captured tweet."""
+        planner = make_planner(username)
+        covered = planner.resume((since, until), saver.oldest_id)
+        if covered:
+            mark_window_done(username, *covered, checkpoint=(since, until))
+        for window in planner.pending:
+            self.work.put((username, *window))
+
+    def _split(self, username: str, since: str, until: str, saver: CDPResponseSaver):
+        """Queue the part of a truncated window that was not captured."""
+        planner = make_planner(username)
+        covered = planner.report((since, until), saver.tweets_seen, truncated=True, oldest_id=saver.oldest_id)
+        if covered:
+            mark_window_done(username, *covered)
+        with self._lock:
+            self.remaining[username] += len(planner.pending)
+            self.incomplete.setdefault(username, []).extend(planner.incomplete)
+        for window in planner.pending:
+            self.work.put((username, *window))
+
+    def _retry_no_response(self, username: str, since: str, until: str) -> bool:
+        """Re-queue a window that got no response at all; False once it is out of retries (left not done)."""
+        key = (username, since, until)
+        with self._lock:
+            tries = self.no_response[key] = self.no_response.get(key, 0) + 1
+            if tries > NO_RESPONSE_RETRIES:
+                self.incomplete.setdefault(username, []).append((since, until))
+        if tries > NO_RESPONSE_RETRIES:
+            logger.warning(f"{username} {since} → {until} got no SearchTimeline response in {tries} tries; "
+                           f"leaving it not done")
+            return False
+        logger.warning(f"No SearchTimeline responses for {username} {since} → {until}, re-queueing it")
+        self.work.put(key)
+        return True
+
+    def _window_finished(self, profile_dir: str, username: str):
+        with self._lock:
+            self.windows_done[profile_dir] = self.windows_done.get(profile_dir, 0) + 1
+            if self.jobs is not None:
+                user_done = not self.jobs.remaining([username])
+            else:
+                self.remaining[username] -= 1
+                user_done = self.remaining[username] == 0
+            incomplete = self.incomplete.get(username)
+        if user_done and incomplete:
+            # State stays, so the next run plans these windows again.
+            logger.warning(f"Finished {username} without {len(incomplete)} windows: {incomplete}")
+        elif user_done:
+            logger.info(f"Completed all date windows for {username}")
+            clear_state(username)
+
+
+def start_metrics():
+    """Start the metrics endpoint, snapshot writer and profiler configured above; returns a stop callback."""
+    server = metrics.serve(METRICS_PORT) if METRICS_PORT else None
+    snapshots = metrics.start_snapshots(METRICS_SNAPSHOT, METRICS_INTERVAL) if METRICS_SNAPSHOT else None
+    profiler = None
+    if PROFILE_OUT:
+        profiler = SamplingProfiler(PROFILE_INTERVAL)
+        profiler.start()
+
+    def stop():
+        if profiler:
+            profiler.stop()
+            profiler.write(PROFILE_OUT)
+        if snapshots:
+            snapshots.set()
+            metrics.write_snapshot(METRICS_SNAPSHOT)
+        if server:
+            server.shutdown()
+        logger.info(f"Phase timings:\n{metrics.summary()}")
+
+    return stop
 
 
 def main():
+    stop_metrics = start_metrics()
     try:
-        for username in USERNAMES:
+        if MONITOR:
+            run_monitor(AVAILABLE_DIRECTORIES, USERNAMES)
+            return
+        if PARALLEL_PROFILES or JOB_QUEUE:
+            jobs = JobQueue(JOB_QUEUE, JOB_LEASE_SECONDS) if JOB_QUEUE else None
+            ParallelCrawler(AVAILABLE_DIRECTORIES, USERNAMES, PARALLEL_PROFILES, jobs=jobs).run()
+            return
+        for username in plan_batches(USERNAMES) if BATCH_QUERIES else USERNAMES:
             run_with_rotation(AVAILABLE_DIRECTORIES, username)
     except KeyboardInterrupt:
         logger.info("Interrupted by user.")
     except Exception as e:
         logger.exception(f"Fatal error: {e}")
+    finally:
+        close_archive()
+        stop_metrics()
 
 
 if __name__ == "__main__":
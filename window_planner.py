@@ -0,0 +1,255 @@
+"""
+Density-adaptive date windows for SearchTimeline crawls.
+
+Tweet IDs are snowflakes: `(id >> 22) + TWITTER_EPOCH_MS` is the creation time
+in milliseconds. That lets a window be bounded to the second with
+`since_id:`/`max_id:` search operators instead of whole days.
+
+A window bound is either a day ("2025-10-01") or a UTC second
+("2025-10-01_13-45-00", filename-safe). Windows made only of days are
+searched with `since:`/`until:` as before; any sub-day bound switches the
+query to `since_id:`/`max_id:`.
+
+A query can also name several accounts, `(from:a OR from:b) since:… until:…`:
+`pack_accounts` groups quiet accounts by their expected volume so a long
+tail of them costs one navigation per window instead of one per account.
+
+`WindowPlanner` hands out windows oldest first and adapts their span:
+
+- a window that hit the scroll/page cap is split at the creation time of the
+  oldest tweet it captured; the part that was captured is done, the rest is
+  queued in pieces the size of what fitted into one session, and later
+  windows use that span too
+- a sparse window (fewer than `sparse_tweets` tweets) doubles the span of the
+  next ones, up to `max_span`, so quiet stretches cost one navigation; after
+  a split, windows well below the cap widen the span again more gently
+"""
+
+import datetime
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger("tweet_crawler")
+
+TWITTER_EPOCH_MS = 1288834974657
+DAY_FORMAT = "%Y-%m-%d"
+SECOND_FORMAT = "%Y-%m-%d_%H-%M-%S"
+MAX_QUERY_LENGTH = 500  # X answers longer search queries with an error page
+
+Window = Tuple[str, str]
+
+
+# -------------------- Snowflake IDs -------------------- #
+def snowflake_time(tweet_id) -> datetime.datetime:
+    """UTC creation time (naive) encoded in a tweet ID."""
+    ms = (int(tweet_id) >> 22) + TWITTER_EPOCH_MS
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=ms)
+
+
+def snowflake_at(moment: datetime.datetime) -> int:
+    """Smallest tweet ID created at or after `moment` (naive UTC)."""
+    ms = (moment - datetime.datetime(1970, 1, 1)) // datetime.timedelta(milliseconds=1)
+    return max(0, ms - TWITTER_EPOCH_MS) << 22
+
+
+# -------------------- Window bounds -------------------- #
+def parse_bound(bound: str) -> datetime.datetime:
+    fmt = DAY_FORMAT if len(bound) == 10 else SECOND_FORMAT
+    return datetime.datetime.strptime(bound, fmt)
+
+
+def format_bound(moment: datetime.datetime) -> str:
+    if moment == datetime.datetime.combine(moment.date(), datetime.time()):
+        return moment.strftime(DAY_FORMAT)
+    return moment.strftime(SECOND_FORMAT)
+
+
+def from_clause(usernames: Union[str, Sequence[str]]) -> str:
+    """`from:a`, or `(from:a OR from:b …)` for several accounts."""
+    if isinstance(usernames, str):
+        return f"from:{usernames}"
+    if len(usernames) == 1:
+        return f"from:{usernames[0]}"
+    return "(" + " OR ".join(f"from:{u}" for u in usernames) + ")"
+
+
+def search_query(username: Union[str, Sequence[str]], since: str, until: str) -> str:
+    """X search query for tweets of `username` (or of any of several usernames) in [since, until)."""
+    accounts = from_clause(username)
+    if len(since) == 10 and len(until) == 10:
+        return f"{accounts} since:{since} until:{until}"
+    since_id = snowflake_at(parse_bound(since)) - 1
+    max_id = snowflake_at(parse_bound(until)) - 1
+    return f"{accounts} since_id:{since_id} max_id:{max_id}"
+
+
+# -------------------- Batched queries -------------------- #
+_BOUNDS_LENGTH = len(" since_id: max_id:") + 2 * 19  # the longest bounds a query gets: 19-digit tweet IDs
+
+
+def pack_accounts(volumes: Dict[str, float], max_volume: float,
+                  max_length: int = MAX_QUERY_LENGTH) -> List[List[str]]:
+    """
+    Group accounts into multi-account queries. `volumes` are the tweets each
+    account is expected to have per window; quietest first, an account joins
+    the current group while the group's expected tweets stay within
+    `max_volume` and its query within `max_length` characters. Accounts that
+    fill `max_volume` on their own get a group of one. Groups come out in the
+    order of their first account in `volumes`.
+    """
+    groups: List[List[str]] = []
+    group: List[str] = []
+    volume = 0.0
+    for username in sorted(volumes, key=lambda u: volumes[u]):
+        candidate = group + [username]
+        if group and (volume + volumes[username] > max_volume
+                      or len(from_clause(candidate)) + _BOUNDS_LENGTH > max_length):
+            groups.append(group)
+            group, volume = [], 0.0
+        group.append(username)
+        volume += volumes[username]
+    if group:
+        groups.append(group)
+    order = {u: i for i, u in enumerate(volumes)}
+    return sorted(groups, key=lambda g: min(order[u] for u in g))
+
+
+# -------------------- Planner -------------------- #
+class WindowPlanner:
+    def __init__(
+        self,
+        since: str,
+        until: str,
+        days: float,
+        done: Iterable[Window] = (),
+        min_span: datetime.timedelta = datetime.timedelta(hours=1),
+        max_span: datetime.timedelta = datetime.timedelta(days=31),
+        sparse_tweets: int = 20,
+    ):
+        self.next_start = parse_bound(since)
+        self.end = parse_bound(until)
+        self.span = datetime.timedelta(days=days)
+        self.min_span = min_span
+        self.max_span = max(max_span, self.span)
+        self.sparse_tweets = sparse_tweets
+        self.covered = sorted((parse_bound(s), parse_bound(u)) for s, u in done)
+        self.pending: List[Window] = []  # split remainders, newest piece last
+        self.incomplete: List[Window] = []  # windows given up on; not done, so the next run tries them again
+        self.navigations = 0
+        self.tweets = 0
+        self.splits = 0
+        self.capacity = 0  # most tweets one truncated window delivered
+        self.duplicates = 0  # already-captured entries fetched again, fed in by the caller
+
+    def next_window(self) -> Optional[Window]:
+        """The next window to capture, or None when the range is covered."""
+        if self.pending:
+            return self.pending.pop()
+        start = self.next_start
+        for s, u in self.covered:
+            if s <= start < u:
+                start = u
+        if start >= self.end:
+            return None
+        stop = min(start + self.span, self.end)
+        for s, _ in self.covered:
+            if start < s < stop:
+                stop = s
+                break
+        self.next_start = stop
+        return format_bound(start), format_bound(stop)
+
+    def retry(self, window: Window):
+        """Put a window back to be captured next (e.g. after a rate limit)."""
+        self.pending.append(window)
+        self.covered.append((parse_bound(window[0]), parse_bound(window[1])))
+        self.covered.sort()
+
+    def give_up(self, window: Window, reason: str):
+        """Leave a window not done for this run; it is planned again next time."""
+        self.incomplete.append(window)
+        logger.warning(f"Window {window[0]} → {window[1]} {reason}; leaving it not done")
+
+    def resume(self, window: Window, oldest_id=None) -> Optional[Window]:
+        """
+        Queue only the part of an interrupted window older than `oldest_id`,
+        the oldest tweet captured so far, to be captured next. Returns the part
+        that is already covered, or None if the whole window has to be redone.
+        """
+        since, until = parse_bound(window[0]), parse_bound(window[1])
+        boundary = _boundary(oldest_id, since, until)
+        if boundary is None:
+            self.retry(window)
+            return None
+        self.retry((window[0], format_bound(boundary)))
+        self.covered.append((boundary, until))
+        self.covered.sort()
+        return format_bound(boundary), window[1]
+
+    def report(self, window: Window, tweets: int, truncated: bool = False,
+               oldest_id=None) -> Optional[Window]:
+        """
+        Feed back the result of a captured window. For a truncated window the
+        uncaptured remainder is queued and the captured part is returned (the
+        caller marks that part done); otherwise the window itself is returned.
+        None means the window was truncated and nothing of it is done: it was
+        either split in halves or, too short to split, added to `incomplete`.
+        """
+        self.navigations += 1
+        self.tweets += tweets
+        since, until = parse_bound(window[0]), parse_bound(window[1])
+        if not truncated:
+            if tweets < self.sparse_tweets:
+                self.span = min(self.span * 2, self.max_span)
+            elif self.capacity and tweets < self.capacity / 2:
+                self.span = min(self.span * 3 / 2, self.max_span)
+            return window
+
+        self.capacity = max(self.capacity, tweets)
+
+        boundary = _boundary(oldest_id, since, until)
+        if boundary is None:
+            if until - since <= self.min_span:
+                self.give_up(window, "hit the page cap and is too short to split")
+                return None
+            boundary = since + (until - since) / 2
+            boundary = boundary.replace(microsecond=0)
+            self.pending.extend([(format_bound(since), format_bound(boundary)),
+                                 (format_bound(boundary), format_bound(until))])
+            self.splits += 1
+            logger.info(f"Window {window[0]} → {window[1]} hit the page cap, retrying it in halves")
+            return None
+
+        piece = max(self.min_span, until - boundary)
+        self.span = max(self.min_span, min(self.span, piece))
+        pieces, stop = [], boundary
+        while stop > since:
+            start = max(since, stop - piece)
+            pieces.append((format_bound(start), format_bound(stop)))
+            stop = start
+        self.pending.extend(reversed(pieces))
+        self.splits += 1
+        logger.info(
+            f"Window {window[0]} → {window[1]} hit the page cap at {format_bound(boundary)}, "
+            f"{len(pieces)} more window(s) queued for the rest"
+        )
+        return format_bound(boundary), window[1]
+
+    def summary(self) -> dict:
+        per_nav = self.tweets / self.navigations if self.navigations else 0.0
+        return {"navigations": self.navigations, "tweets": self.tweets, "splits": self.splits,
+                "tweets_per_navigation": round(per_nav, 1), "duplicates_dropped": self.duplicates,
+                "incomplete": len(self.incomplete)}
+
+
+def _boundary(oldest_id, since: datetime.datetime, until: datetime.datetime) -> Optional[datetime.datetime]:
+    """
+    Where the uncaptured part of [since, until) ends, given the oldest tweet
+    captured: everything from that tweet's second up to `until` is in.
+    """
+    if oldest_id is None:
+        return None
+    boundary = snowflake_time(oldest_id).replace(microsecond=0) + datetime.timedelta(seconds=1)
+    if boundary >= until or boundary <= since:
+        return None
+    return boundary